@@ -1,9 +1,27 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from flask_cors import CORS
 from db_config import get_db_connection
+from migrations import migrate
+from po_balance import apply_supplier_change, refresh_ordered_qty, supplier_row_change
+from sequences import allocate_ids, format_inward_no
+import dashboard_stats
+import log_partitions
+import stock_ledger
+import supplier_outbox
+import vehicle_matching
+import video_jobs
+from response_stream import (
+    COMPRESS_MIN_SIZE, closing_stream, compress_bytes, dumps, encode_stream, iter_cursor,
+    json_array, json_default, loads, negotiate_encoding
+)
+from row_format import row_formatter, to_bool, to_float, to_hms
+from weighbridge_timestamps import parse_timestamp
+from weighbridge_filters import like_prefix, parse_date_param, vehicle_number_key, weighbridge_data_query
 import mysql.connector
 from datetime import datetime
+from decimal import Decimal
 import json
 import pyodbc
 import pandas_access as mdb
@@ -20,9 +38,45 @@ import base64
 from io import BytesIO
 from PIL import Image
 
+def jsonify_default(value):
+    # jsonify() has always sent DECIMAL columns (money, quantities) as exact strings
+    if isinstance(value, Decimal):
+        return str(value)
+    return json_default(value)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify() through response_stream.dumps: orjson, with Decimal as str and dates as ISO 8601."""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, default=jsonify_default).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
+def stream_json(chunks, *resources):
+    """Stream JSON chunks as a (compressed) response, closing resources when done."""
+    body, headers = encode_stream(chunks, request.headers.get('Accept-Encoding'))
+    return Response(stream_with_context(closing_stream(body, *resources)),
+                    mimetype='application/json', headers=headers)
+
+@app.after_request
+def compress_response(response):
+    # Streamed responses are compressed by stream_json as they are generated.
+    if (response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or response.mimetype != 'application/json'):
+        return response
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None or response.content_length is None or response.content_length < COMPRESS_MIN_SIZE:
+        return response
+    response.set_data(compress_bytes(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
 # Configure upload folder
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -34,6 +88,19 @@ app.config['MAX_CONTENT_LENGTH'] = 200 * 1024 * 1024  # 200MB max file size
 # Extractor service URL
 EXTRACTOR_SERVICE_URL = "http://localhost:8001"
 
+# /grn/ responses cached by the extractor are dropped when supplier rows change
+GRN_INVALIDATE_TIMEOUT = 2
+
+def invalidate_grn_cache(po_number):
+    """Best-effort notice to the extractor service that a PO's supplier rows changed."""
+    if not po_number:
+        return
+    try:
+        requests.post(f"{EXTRACTOR_SERVICE_URL}/grn/cache/invalidate",
+                      params={'vch_no': po_number}, timeout=GRN_INVALIDATE_TIMEOUT)
+    except requests.RequestException as e:
+        print(f"Could not invalidate GRN cache for {po_number}: {str(e)}")
+
 # License plate processing service URL
 LICENSE_PLATE_SERVICE_URL = "http://127.0.0.1:8000"
 
@@ -61,728 +128,97 @@ def log_system_activity(branch_name, module_name, action_performed, action_by, a
 
 # Initialize database tables
 def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Create employees table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS employees (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            full_name VARCHAR(255) NOT NULL,
-            date_of_birth DATE,
-            gender ENUM('Male', 'Female', 'Other'),
-            phone_number VARCHAR(15),
-            email_id VARCHAR(255) UNIQUE,
-            address TEXT,
-            aadhar_number VARCHAR(12),
-            pan_number VARCHAR(10),
-            joining_date DATE,
-            designation VARCHAR(100),
-            department VARCHAR(100),
-            emergency_contact VARCHAR(15),
-            status ENUM('Active', 'Inactive') DEFAULT 'Active',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        )
-    ''')
-        # Create user_signin table
-    cursor.execute('''
-   CREATE TABLE IF NOT EXISTS user_signin (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    username VARCHAR(50) UNIQUE NOT NULL,
-    password VARCHAR(255) NOT NULL,
-    email VARCHAR(255) UNIQUE NOT NULL,
-    phone_number VARCHAR(15),
-    status ENUM('Active', 'Inactive') DEFAULT 'Active',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-)
-''')
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS purchase_orders (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    voucher_number VARCHAR(50) NOT NULL,
-    date DATE NOT NULL,
-    effective_date DATE,
-    narration TEXT,
-    state_buyer VARCHAR(100),
-    refund_status VARCHAR(20),
-    total_amount DECIMAL(15,2) DEFAULT 0.00,
-    sales_tally_id VARCHAR(50),
-    cancel_status VARCHAR(20),
-    customer_name VARCHAR(100),
-    customer_web_id VARCHAR(50),
-    customer_tally_id VARCHAR(50),
-    billing_address TEXT,
-    consignee_name VARCHAR(100),
-    shipping_address TEXT,
-    billing_pin_code VARCHAR(20),
-    shipping_pin_code VARCHAR(20),
-    billing_phone_no VARCHAR(20),
-    shipping_phone_no VARCHAR(20),
-    web_id VARCHAR(50),
-    action VARCHAR(50),
-    vehicle_number VARCHAR(20),
-    empty_weight DECIMAL(10,2),
-    loaded_weight DECIMAL(10,2),
-    net_weight DECIMAL(10,2),
-    empty_weight_date DATETIME,
-    empty_weight_time TIME,
-    load_weight_date DATETIME,
-    load_weight_time TIME,
-    pending BOOLEAN DEFAULT FALSE,
-    closed BOOLEAN DEFAULT FALSE,
-    exported BOOLEAN DEFAULT FALSE,
-    shift VARCHAR(5),
-    inventory_entries JSON,
-    ledger_details JSON,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-''')
-    # Create branches table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS branches (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            branch_name VARCHAR(255) NOT NULL,
-            address TEXT,
-            contact_number VARCHAR(15),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create roles table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS roles (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            role_name VARCHAR(100) NOT NULL,
-            permissions JSON,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create employee_login table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS employee_login (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            employee_id INT,
-            branch_id INT,
-            login_id VARCHAR(50) UNIQUE,
-            password VARCHAR(255),
-            role_id INT,
-            status ENUM('Active', 'Inactive') DEFAULT 'Active',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (employee_id) REFERENCES employees(id),
-            FOREIGN KEY (branch_id) REFERENCES branches(id),
-            FOREIGN KEY (role_id) REFERENCES roles(id)
-        )
-    ''')
-    
-    # Create login table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS login (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            employee_id INT,
-            username VARCHAR(50) UNIQUE NOT NULL,
-            password VARCHAR(255) NOT NULL,
-            role VARCHAR(50) NOT NULL,
-            branch_id INT,
-            status ENUM('Active', 'Inactive') DEFAULT 'Active',
-            last_login DATETIME,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create projects table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS projects (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            project_name VARCHAR(255) NOT NULL,
-            address TEXT,
-            latitude DECIMAL(10, 8),
-            longitude DECIMAL(11, 8),
-            status ENUM('Active', 'Inactive', 'Completed') DEFAULT 'Active',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create po_details table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS po_details (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            poNumber VARCHAR(50) NOT NULL,
-            material VARCHAR(100) NOT NULL,
-            supplier VARCHAR(100) NOT NULL,
-            quantity DECIMAL(10,2) NOT NULL,
-            rate DECIMAL(10,2) NOT NULL,
-            totalAmount DECIMAL(15,2) NOT NULL,
-            poType VARCHAR(50) NOT NULL,
-            deliveryDate DATE NOT NULL,
-            narration TEXT,
-            status VARCHAR(20) DEFAULT 'Active',
-            createdAt DATETIME NOT NULL,
-            updatedAt DATETIME NOT NULL
-        )
-    ''')
-        # Create vouchers table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS vouchers (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            sal_time VARCHAR(255),
-            voucher_type_name VARCHAR(255),
-            vch_no VARCHAR(255),
-            date DATE,
-            effective_date DATE,
-            narration TEXT,
-            state_buyer VARCHAR(255),
-            cancel VARCHAR(255),
-            refund VARCHAR(255),
-            customer_name VARCHAR(255),
-            mailing_name VARCHAR(255),
-            customer_web_id VARCHAR(255),
-            customer_tally_id VARCHAR(255),
-            billing_address TEXT,
-            consignee_name VARCHAR(255),
-            shipping_address TEXT,
-            billing_pin_code VARCHAR(50),
-            shipping_pin_code VARCHAR(50),
-            billing_phone_no VARCHAR(50),
-            shipping_phone_no VARCHAR(50),
-            total_amount DECIMAL(15,2),
-            sales_tally_id VARCHAR(255),
-            web_id VARCHAR(255),
-            action VARCHAR(255),
-            billing_state VARCHAR(255),
-            billing_country VARCHAR(255),
-            shipping_state VARCHAR(255),
-            shipping_country VARCHAR(255),
-            created_at DATETIME,
-            updated_at DATETIME
-        )
-    ''')
-
-    # Create inventory_entries table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS inventory_entries (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    voucher_id INT NOT NULL,
-    vch_no VARCHAR(50) NOT NULL,
-    stock_item VARCHAR(255),
-    debitor_credit VARCHAR(50),
-    billed_qty DECIMAL(15,3),
-    actual_qty DECIMAL(15,3),
-    rate DECIMAL(15,2),
-    discount DECIMAL(15,2),
-    amount DECIMAL(15,2),
-    FOREIGN KEY (voucher_id) REFERENCES vouchers(id)
-)
-''')
+    migrate()
 
-    # Create batch_allocations table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS batch_allocations (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            inventory_id INT,
-            batch_name VARCHAR(255),
-            godown_name VARCHAR(255),
-            batch_billed_qty DECIMAL(15,3),
-            batch_actual_qty DECIMAL(15,3),
-            batch_rate DECIMAL(15,2),
-            batch_discount DECIMAL(15,2),
-            amount DECIMAL(15,2),
-            FOREIGN KEY (inventory_id) REFERENCES inventory_entries(id)
-        )
-    ''')
-
-    # Create accounting_allocations table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS accounting_allocations (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            inventory_id INT,
-            ledger_name VARCHAR(255),
-            amount DECIMAL(15,2),
-            FOREIGN KEY (inventory_id) REFERENCES inventory_entries(id)
-        )
-    ''')
-
-    # Create ledger_details table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ledger_details (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            voucher_id INT,
-            ledger_name VARCHAR(255),
-            debitor_credit VARCHAR(50),
-            amount DECIMAL(15,2),
-            FOREIGN KEY (voucher_id) REFERENCES vouchers(id)
-        )
-    ''')
-
-    # Create bill_wise_details table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS bill_wise_details (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            ledger_id INT,
-            bill_type VARCHAR(255),
-            bill_amount DECIMAL(15,2),
-            FOREIGN KEY (ledger_id) REFERENCES ledger_details(id)
-        )
-    ''')
-
-    # Create system_logs table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS system_logs (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            branch_name VARCHAR(255),
-            module_name VARCHAR(255),
-            action_performed VARCHAR(255),
-            action_by VARCHAR(255),
-            action_on TEXT,
-            ip_address VARCHAR(50),
-            timestamp DATETIME
-        )
-    ''')
-    # Create ticket_details table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ticket_details (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        TicketNumber VARCHAR(50) NOT NULL,
-        VehicleNumber VARCHAR(50) NOT NULL,
-        `Date` DATE NOT NULL,
-        `Time` TIME NOT NULL,
-        LoadedWeight DECIMAL(10,2) NOT NULL,
-        EmptyWeight DECIMAL(10,2) NOT NULL,
-        LoadWeightDate DATE,
-        LoadWeightTime TIME,
-        EmptyWeightDate DATE,
-        EmptyWeightTime TIME,
-        NetWeight DECIMAL(10,2) NOT NULL,
-        Pending VARCHAR(20),
-        `Shift` VARCHAR(20),
-        Materialname VARCHAR(100),
-        SupplierName VARCHAR(100),
-        `State` VARCHAR(50),
-        Closed VARCHAR(20),
-        createdAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-        updatedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-    )
-    ''')
-    
-#Creating or updating the invoice_items table
-    cursor.execute('''
-CREATE TABLE IF NOT EXISTS invoice_items (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    vehicle_number VARCHAR(255),
-    description TEXT,
-    quantity DECIMAL(10,2),
-    rate DECIMAL(10,2),
-    amount DECIMAL(10,2),
-    supplier_name VARCHAR(255),
-    invoice_number VARCHAR(100),
-    invoice_date DATE,
-    gstin VARCHAR(20),
-    address TEXT,
-    empty_weight DECIMAL(10,2),
-    load_weight DECIMAL(10,2),
-    net_weight DECIMAL(10,2),
-    tax DECIMAL(10,2),
-    cgst DECIMAL(10,2),
-    sgst DECIMAL(10,2),
-    round_off DECIMAL(10,2),
-    total DECIMAL(10,2),
-    amount_in_words TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-);
-''')
-    
-    # Create weighbridge_data table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS weighbridge_data (
-                   id INT AUTO_INCREMENT PRIMARY KEY,
-    TicketNumber INT,
-    VehicleNumber VARCHAR(20),
-    Date DATETIME,
-    Time DATETIME,
-    EmptyWeight DECIMAL(10,2),
-    LoadedWeight DECIMAL(10,2),
-    EmptyWeightDate DATETIME,
-    EmptyWeightTime DATETIME,
-    LoadWeightDate DATETIME,
-    LoadWeightTime DATETIME,
-    NetWeight DECIMAL(10,2),
-    Pending BOOLEAN,
-    Closed BOOLEAN,
-    Exported BOOLEAN,
-    Shift VARCHAR(5),
-    MaterialName VARCHAR(100),
-    SupplierName VARCHAR(100),
-    State VARCHAR(100),
-    Blank VARCHAR(100),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS supplier (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    poNumber VARCHAR(50) NOT NULL,
-    poBalanceQty DECIMAL(10,2) NOT NULL,
-    inwardNo VARCHAR(50) NOT NULL,
-    vehicleNo VARCHAR(50) NOT NULL,
-    dateTime DATETIME NOT NULL,
-    supplierName VARCHAR(255) NOT NULL,
-    material VARCHAR(255) NOT NULL,
-    uom VARCHAR(50) DEFAULT 'tons',
-    orderedQty DECIMAL(10,2) NOT NULL DEFAULT 0.00,
-    receivedQty DECIMAL(10,2),
-    receivedBy VARCHAR(255),
-    supplierBillQty DECIMAL(10,2),
-    poRate DECIMAL(10,2) NOT NULL,
-    supplierBillRate DECIMAL(10,2),
-    supplierBillFile VARCHAR(255),
-    difference DECIMAL(10,2),
-    status ENUM('Pending', 'Approved', 'Rejected') DEFAULT 'Pending',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-);
-                   ''')
-
-    # Create supplier table
-    # cursor.execute('''
-    #     CREATE TABLE IF NOT EXISTS supplier (
-    #         id INT AUTO_INCREMENT PRIMARY KEY,
-    #         poNumber VARCHAR(50) NOT NULL,
-    #         poBalanceQty DECIMAL(10,2) NOT NULL,
-    #         inwardNo VARCHAR(50) NOT NULL,
-    #         vehicleNo VARCHAR(50) NOT NULL,
-    #         dateTime DATETIME NOT NULL,
-    #         supplierName VARCHAR(255) NOT NULL,
-    #         material VARCHAR(255) NOT NULL,
-    #         uom VARCHAR(50) DEFAULT 'tons',
-    #         receivedQty DECIMAL(10,2),
-    #         receivedBy VARCHAR(255),
-    #         supplierBillQty DECIMAL(10,2),
-    #         poRate DECIMAL(10,2) NOT NULL,
-    #         supplierBillRate DECIMAL(10,2),
-    #         supplierBillFile VARCHAR(255),
-    #         difference DECIMAL(10,2),
-    #         status ENUM('Pending', 'Approved', 'Rejected') DEFAULT 'Pending',
-    #         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    #         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-    #     )
-    # ''')
-    
-    # Create vehicles table with updated structure
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS vehicles (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            sno INT,
-            inward_no VARCHAR(50),
-            vehicle_number VARCHAR(50) NOT NULL,
-            supplier_name VARCHAR(255),
-            material VARCHAR(255),
-            entry_time DATETIME DEFAULT CURRENT_TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-            INDEX(sno),
-            INDEX(vehicle_number)
-        )
-    ''')
-    
-    # Create system_logs table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS system_logs (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            sno INT,
-            branch_name VARCHAR(255),
-            module_name VARCHAR(255),
-            action_performed VARCHAR(100),
-            action_by VARCHAR(255),
-            action_on VARCHAR(255),
-            timestamp DATETIME,
-            ip_address VARCHAR(45),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            INDEX(sno)
-        )
-    ''')
-    
-    # Create batch_slips table
+# Create the supplier detail for a vehicle entry; runs on the supplier outbox worker.
+# Uses the worker's transaction and returns the PO number written, or None if the
+# entry already has a supplier detail.
+def create_supplier_detail(cursor, vehicle_data):
+    print("Creating supplier detail...")
+    # Get PO data based on supplier and material; billed totals come from po_balance
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS batch_slips (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            plant_serial_number VARCHAR(50),
-            batch_date DATE,
-            batch_start_time TIME,
-            batch_end_time TIME,
-            batch_number VARCHAR(50) UNIQUE,
-            customer VARCHAR(255),
-            site VARCHAR(255),
-            recipe_code VARCHAR(50),
-            recipe_name VARCHAR(255),
-            truck_number VARCHAR(50),
-            truck_driver VARCHAR(255),
-            order_number VARCHAR(50),
-            batcher_name VARCHAR(255),
-            ordered_quantity DECIMAL(10, 2),
-            production_quantity DECIMAL(10, 2),
-            adj_manual_quantity DECIMAL(10, 2),
-            with_this_load DECIMAL(10, 2),
-            mixer_capacity DECIMAL(10, 2),
-            batch_size DECIMAL(10, 2),
-            client_name VARCHAR(255),
-            client_address TEXT,
-            client_email VARCHAR(255),
-            client_gstin VARCHAR(50),
-            description VARCHAR(255),
-            hsn_code VARCHAR(20),
-            quantity DECIMAL(10, 2),
-            rate DECIMAL(10, 2),
-            unit VARCHAR(20),
-            status ENUM('Active', 'Completed', 'Cancelled') DEFAULT 'Active',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        )
-    ''')
+        SELECT p.poNumber, p.supplier, p.material, p.quantity, p.rate,
+               (p.quantity - COALESCE(pb.billed_qty, 0)) as balance_qty
+        FROM po_details p
+        LEFT JOIN po_balance pb ON pb.poNumber = p.poNumber
+        WHERE p.supplier = %s AND p.material = %s AND p.status = 'Active'
+        ORDER BY p.createdAt DESC LIMIT 1
+    ''', (vehicle_data['supplier_name'], vehicle_data['material']))
+    po_data = cursor.fetchone()
     
-    # Create invoices table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS invoices (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            invoice_number VARCHAR(50) UNIQUE,
-            batch_slip_id INT,
-            client_name VARCHAR(255),
-            client_address TEXT,
-            client_email VARCHAR(255),
-            client_gstin VARCHAR(50),
-            description VARCHAR(255),
-            hsn_code VARCHAR(20),
-            quantity DECIMAL(10, 2),
-            rate DECIMAL(10, 2),
-            unit VARCHAR(20),
-            total_amount DECIMAL(12, 2),
-            cgst DECIMAL(12, 2),
-            sgst DECIMAL(12, 2),
-            grand_total DECIMAL(12, 2),
-            amount_in_words TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (batch_slip_id) REFERENCES batch_slips(id)
-        )
-    ''')
+    if not po_data:
+        print(f"No PO found for supplier: {vehicle_data['supplier_name']}, material: {vehicle_data['material']}")
+        # Create a default supplier detail even without PO
+        supplier_detail = {
+            'poNumber': 'AUTO-' + vehicle_data.get('inward_no', 'TEMP'),
+            'poBalanceQty': 0,
+            'inwardNo': vehicle_data['inward_no'],
+            'vehicleNo': vehicle_data['vehicle_number'],
+            'dateTime': vehicle_data['entry_time'],
+            'supplierName': vehicle_data['supplier_name'],
+            'material': vehicle_data['material'],
+            'uom': 'tons',
+            'receivedQty': 0,
+            'receivedBy': 'System Auto',
+            'poRate': 0,
+            'status': 'Pending'
+        }
+    else:
+        # Create supplier detail with PO data
+        supplier_detail = {
+            'poNumber': po_data['poNumber'],
+            'poBalanceQty': float(po_data['balance_qty']) if po_data['balance_qty'] else float(po_data['quantity']),
+            'inwardNo': vehicle_data['inward_no'],
+            'vehicleNo': vehicle_data['vehicle_number'],
+            'dateTime': vehicle_data['entry_time'],
+            'supplierName': vehicle_data['supplier_name'],
+            'material': vehicle_data['material'],
+            'uom': 'tons',
+            'receivedQty': 1,
+            'receivedBy': 'System Auto',
+            'poRate': float(po_data['rate']) if po_data['rate'] else 0,
+            'status': 'Pending'
+        }
     
-    # Create grn table
+    # Check if supplier detail already exists for this vehicle
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS grn (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            grnNumber VARCHAR(50),
-            poNumber VARCHAR(50),
-            supplier VARCHAR(255),
-            material VARCHAR(255),
-            orderedQty DECIMAL(10, 2),
-            receivedQty DECIMAL(10, 2),
-            rate DECIMAL(10, 2),
-            totalAmount DECIMAL(15, 2),
-            receivedDate DATE,
-            status VARCHAR(50) DEFAULT 'Received',
-            remarks TEXT,
-            grn_number VARCHAR(50) UNIQUE,
-            linked_po_number VARCHAR(50),
-            supplier_name VARCHAR(255),
-            project VARCHAR(255),
-            received_quantity DECIMAL(10, 2),
-            received_date DATE,
-            material_condition ENUM('Good', 'Damaged', 'Partially Damaged', 'Rejected'),
-            supporting_document VARCHAR(255),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        )
-    ''')
+        SELECT id FROM supplier WHERE vehicleNo = %s AND inwardNo = %s
+    ''', (vehicle_data['vehicle_number'], vehicle_data['inward_no']))
+    existing = cursor.fetchone()
     
-    # Create intents table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS intents (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            intentNumber VARCHAR(50) NOT NULL,
-            supplier VARCHAR(100) NOT NULL,
-            material VARCHAR(100) NOT NULL,
-            quantity DECIMAL(10,2) NOT NULL,
-            rate DECIMAL(10,2) NOT NULL,
-            totalAmount DECIMAL(15,2) NOT NULL,
-            deliveryDate DATE NOT NULL,
-            narration TEXT,
-            status VARCHAR(20) DEFAULT 'Active',
-            createdAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            updatedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create po_payments table for tracking PO payments
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS po_payments (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            po_id INT,
-            po_number VARCHAR(50),
-            payment_amount DECIMAL(15, 2),
-            payment_date DATE,
-            payment_method VARCHAR(50),
-            reference_number VARCHAR(100),
-            remarks TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (po_id) REFERENCES po_details(id)
-        )
-    ''')
+    if existing:
+        print(f"Supplier detail already exists for vehicle: {vehicle_data['vehicle_number']}")
+        return None
     
-    # Create invoice_payments table for tracking invoice payments
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS invoice_payments (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            invoice_id INT,
-            invoice_number VARCHAR(50),
-            payment_amount DECIMAL(15, 2),
-            payment_date DATE,
-            payment_method VARCHAR(50),
-            reference_number VARCHAR(100),
-            remarks TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (invoice_id) REFERENCES invoices(id)
-        )
-    ''')
+    query = '''
+        INSERT INTO supplier (poNumber, poBalanceQty, inwardNo, vehicleNo, dateTime,
+        supplierName, material, uom, receivedQty, receivedBy, poRate, status)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    '''
     
-    # Create supplier_payment_details table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS supplier_payment_details (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            po_number VARCHAR(50) NOT NULL,
-            supplier_name VARCHAR(255) NOT NULL,
-            material VARCHAR(255) NOT NULL,
-            quantity_ordered DECIMAL(10,2) NOT NULL,
-            total_amount DECIMAL(15,2) NOT NULL,
-            paid_amount DECIMAL(15,2) NOT NULL,
-            pending_amount DECIMAL(15,2) NOT NULL,
-            payment_status VARCHAR(50) DEFAULT 'Pending',
-            payment_date DATE,
-            payment_method VARCHAR(50),
-            remarks TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        )
-    ''')
+    values = (
+        supplier_detail['poNumber'], supplier_detail['poBalanceQty'], 
+        supplier_detail['inwardNo'], supplier_detail['vehicleNo'],
+        supplier_detail['dateTime'], supplier_detail['supplierName'], 
+        supplier_detail['material'], supplier_detail['uom'],
+        supplier_detail['receivedQty'], supplier_detail['receivedBy'], 
+        supplier_detail['poRate'], supplier_detail['status']
+    )
     
-    # Create invoice_payment_details table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS invoice_payment_details (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            invoice_number VARCHAR(50) NOT NULL,
-            client_name VARCHAR(255) NOT NULL,
-            material VARCHAR(255) NOT NULL,
-            quantity_ordered DECIMAL(10,2) NOT NULL,
-            total_amount DECIMAL(15,2) NOT NULL,
-            received_amount DECIMAL(15,2) NOT NULL,
-            pending_amount DECIMAL(15,2) NOT NULL,
-            payment_date DATE,
-            payment_method VARCHAR(50),
-            remarks TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        )
-    ''')
+    cursor.execute(query, values)
+    apply_supplier_change(cursor, supplier_detail['poNumber'], received_delta=supplier_detail['receivedQty'])
+    stock_ledger.adjust(cursor, supplier_detail['material'], supplier_detail['uom'],
+                        received_qty=supplier_detail['receivedQty'])
     
-    conn.commit()
-    cursor.close()
-    conn.close()
+    print(f"Auto-created supplier detail for vehicle: {vehicle_data['vehicle_number']}")
+    return supplier_detail['poNumber']
 
-# Function to automatically create supplier details when vehicle is added
-def auto_create_supplier_detail(vehicle_data):
-    print("Creating supplier detail...")
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Get PO data based on supplier and material
-        cursor.execute('''
-            SELECT poNumber, supplier, material, quantity, rate, 
-                   (quantity - COALESCE((SELECT SUM(supplierBillQty) FROM supplier 
-                                       WHERE poNumber = po_details.poNumber AND supplierBillQty IS NOT NULL), 0)) as balance_qty
-            FROM po_details 
-            WHERE supplier = %s AND material = %s AND status = 'Active'
-            ORDER BY createdAt DESC LIMIT 1
-        ''', (vehicle_data['supplier_name'], vehicle_data['material']))
-        po_data = cursor.fetchone()
-        
-        if not po_data:
-            print(f"No PO found for supplier: {vehicle_data['supplier_name']}, material: {vehicle_data['material']}")
-            # Create a default supplier detail even without PO
-            supplier_detail = {
-                'poNumber': 'AUTO-' + vehicle_data.get('inward_no', 'TEMP'),
-                'poBalanceQty': 0,
-                'inwardNo': vehicle_data['inward_no'],
-                'vehicleNo': vehicle_data['vehicle_number'],
-                'dateTime': vehicle_data['entry_time'],
-                'supplierName': vehicle_data['supplier_name'],
-                'material': vehicle_data['material'],
-                'uom': 'tons',
-                'receivedQty': 0,
-                'receivedBy': 'System Auto',
-                'poRate': 0,
-                'status': 'Pending'
-            }
-        else:
-            # Create supplier detail with PO data
-            supplier_detail = {
-                'poNumber': po_data['poNumber'],
-                'poBalanceQty': float(po_data['balance_qty']) if po_data['balance_qty'] else float(po_data['quantity']),
-                'inwardNo': vehicle_data['inward_no'],
-                'vehicleNo': vehicle_data['vehicle_number'],
-                'dateTime': vehicle_data['entry_time'],
-                'supplierName': vehicle_data['supplier_name'],
-                'material': vehicle_data['material'],
-                'uom': 'tons',
-                'receivedQty': 1,
-                'receivedBy': 'System Auto',
-                'poRate': float(po_data['rate']) if po_data['rate'] else 0,
-                'status': 'Pending'
-            }
-        
-        # Check if supplier detail already exists for this vehicle
-        cursor.execute('''
-            SELECT id FROM supplier WHERE vehicleNo = %s AND inwardNo = %s
-        ''', (vehicle_data['vehicle_number'], vehicle_data['inward_no']))
-        existing = cursor.fetchone()
-        
-        if existing:
-            print(f"Supplier detail already exists for vehicle: {vehicle_data['vehicle_number']}")
-            cursor.close()
-            conn.close()
-            return
-        
-        query = '''
-            INSERT INTO supplier (poNumber, poBalanceQty, inwardNo, vehicleNo, dateTime,
-            supplierName, material, uom, receivedQty, receivedBy, poRate, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        '''
-        
-        values = (
-            supplier_detail['poNumber'], supplier_detail['poBalanceQty'], 
-            supplier_detail['inwardNo'], supplier_detail['vehicleNo'],
-            supplier_detail['dateTime'], supplier_detail['supplierName'], 
-            supplier_detail['material'], supplier_detail['uom'],
-            supplier_detail['receivedQty'], supplier_detail['receivedBy'], 
-            supplier_detail['poRate'], supplier_detail['status']
-        )
-        
-        cursor.execute(query, values)
-        conn.commit()
-        
-        print(f"Auto-created supplier detail for vehicle: {vehicle_data['vehicle_number']}")
-        
-    except Exception as e:
-        print(f"Error auto-creating supplier detail: {str(e)}")
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
+def invalidate_created_supplier_details(po_numbers):
+    for po_number in set(po_numbers):
+        invalidate_grn_cache(po_number)
+
+def start_supplier_outbox_worker():
+    supplier_outbox.start_worker(get_db_connection, create_supplier_detail, invalidate_created_supplier_details)
 
 @app.route('/batch-slips', methods=['POST'])
 def create_batch_slip():
@@ -816,6 +252,9 @@ def create_batch_slip():
         )
 
         cursor.execute(query, values)
+        # New slips start as 'Active' (column default)
+        dashboard_stats.adjust_client_orders(cursor, 'Active', 1)
+        stock_ledger.adjust(cursor, data['description'], data['unit'], consumed_qty=data['quantity'])
         conn.commit()
         
         return jsonify({"message": "Batch slip created successfully!"}), 201
@@ -887,87 +326,38 @@ def create_batch_slip():
     #     if 'conn' in locals():
     #         conn.close()
 # New route to fetch weighbridge_data
+WEIGHBRIDGE_FIELDS = [
+    ('id', 'id'), ('ticketNumber', 'TicketNumber'), ('vehicleNumber', 'VehicleNumber'),
+    ('date', 'Date'), ('time', 'Time'), ('emptyWeight', 'EmptyWeight'), ('loadedWeight', 'LoadedWeight'),
+    ('emptyWeightDate', 'EmptyWeightDate'), ('emptyWeightTime', 'EmptyWeightTime'),
+    ('loadWeightDate', 'LoadWeightDate'), ('loadWeightTime', 'LoadWeightTime'), ('netWeight', 'NetWeight'),
+    ('pending', 'Pending'), ('closed', 'Closed'), ('exported', 'Exported'), ('shift', 'Shift'),
+    ('materialName', 'Materialname'),  # Use exact column name
+    ('supplierName', 'SupplierName'), ('state', 'State'), ('blank', 'Blank'),
+    ('eventTimestamp', 'event_ts'), ('createdAt', 'created_at')
+]
+# The *Time columns are DATETIME but only the clock part is shown; BOOLEAN arrives as TINYINT;
+# the weights have always been sent as numbers.
+WEIGHBRIDGE_OVERRIDES = {
+    'Time': to_hms, 'EmptyWeightTime': to_hms, 'LoadWeightTime': to_hms,
+    'Pending': to_bool, 'Closed': to_bool, 'Exported': to_bool,
+    'EmptyWeight': to_float, 'LoadedWeight': to_float, 'NetWeight': to_float
+}
+
 @app.route('/weighbridge-data', methods=['GET'])
 def get_weighbridge_data():
+    conn = None
+    cursor = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        # Get query parameters for filtering (optional)
-        date_from = request.args.get('dateFrom')
-        date_to = request.args.get('dateTo')
-        vehicle_number = request.args.get('vehicleNumber')
-        material_name = request.args.get('materialName')
-        supplier_name = request.args.get('supplierName')
-        shift = request.args.get('shift')
-        
-        # Build query with filters, using exact column names from DESCRIBE
-        query = '''
-            SELECT id, TicketNumber, VehicleNumber, Date, Time, EmptyWeight, LoadedWeight,
-                   EmptyWeightDate, EmptyWeightTime, LoadWeightDate, LoadWeightTime,
-                   NetWeight, Pending, Closed, Exported, Shift, Materialname, SupplierName,
-                   State, Blank, created_at
-            FROM weighbridge_data
-            WHERE 1=1
-        '''
-        params = []
-        
-        if date_from:
-            query += ' AND DATE(Date) >= %s'
-            params.append(date_from)
-        
-        if date_to:
-            query += ' AND DATE(Date) <= %s'
-            params.append(date_to)
-        
-        if vehicle_number:
-            query += ' AND VehicleNumber LIKE %s'
-            params.append(f'%{vehicle_number}%')
-        
-        if material_name:
-            query += ' AND Materialname LIKE %s'
-            params.append(f'%{material_name}%')
-        
-        if supplier_name:
-            query += ' AND SupplierName LIKE %s'
-            params.append(f'%{supplier_name}%')
-        
-        if shift:
-            query += ' AND Shift = %s'
-            params.append(shift)
-        
-        query += ' ORDER BY created_at DESC'
+        try:
+            query, params = weighbridge_data_query(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         cursor.execute(query, params)
-        weighbridge_data = cursor.fetchall()
-        
-        # Format the data for JSON response
-        formatted_data = []
-        for record in weighbridge_data:
-            formatted_record = {
-                'id': record['id'],
-                'ticketNumber': record['TicketNumber'],
-                'vehicleNumber': record['VehicleNumber'],
-                'date': record['Date'].isoformat() if record['Date'] else None,
-                'time': record['Time'].strftime('%H:%M:%S') if record['Time'] else None,
-                'emptyWeight': float(record['EmptyWeight']) if record['EmptyWeight'] is not None else None,
-                'loadedWeight': float(record['LoadedWeight']) if record['LoadedWeight'] is not None else None,
-                'emptyWeightDate': record['EmptyWeightDate'].isoformat() if record['EmptyWeightDate'] else None,
-                'emptyWeightTime': record['EmptyWeightTime'].strftime('%H:%M:%S') if record['EmptyWeightTime'] else None,
-                'loadWeightDate': record['LoadWeightDate'].isoformat() if record['LoadWeightDate'] else None,
-                'loadWeightTime': record['LoadWeightTime'].strftime('%H:%M:%S') if record['LoadWeightTime'] else None,
-                'netWeight': float(record['NetWeight']) if record['NetWeight'] is not None else None,
-                'pending': bool(record['Pending']) if record['Pending'] is not None else None,
-                'closed': bool(record['Closed']) if record['Closed'] is not None else None,
-                'exported': bool(record['Exported']) if record['Exported'] is not None else None,
-                'shift': record['Shift'],
-                'materialName': record['Materialname'],  # Use exact column name
-                'supplierName': record['SupplierName'],
-                'state': record['State'],
-                'blank': record['Blank'],
-                'createdAt': record['created_at'].isoformat() if record['created_at'] else None
-            }
-            formatted_data.append(formatted_record)
         
         # Log the activity
         log_system_activity(
@@ -979,8 +369,97 @@ def get_weighbridge_data():
             request.remote_addr
         )
         
-        return jsonify(formatted_data), 200
+        # Rows are formatted and encoded batch by batch as the response streams
+        format_record = row_formatter(cursor, fields=WEIGHBRIDGE_FIELDS, overrides=WEIGHBRIDGE_OVERRIDES)
+        response = stream_json(json_array(iter_cursor(cursor), transform=format_record), cursor, conn)
+        cursor = conn = None  # closed by the stream
+        return response, 200
     
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+# Ticket Details Routes
+WEIGHBRIDGE_MATCHES_PAGE_SIZE = 100
+WEIGHBRIDGE_MATCHES_MAX_PAGE_SIZE = 1000
+
+def weighbridge_matches_cursor(row):
+    """Opaque keyset position after ``row``: '<event_ts>|<weighbridge_id>'."""
+    return f"{row['event_ts'].isoformat()}|{row['weighbridge_id']}"
+
+@app.route('/weighbridge-matches', methods=['GET'])
+def get_weighbridge_matches():
+    """
+    One page of weighings with their matched gate entry and supplier row,
+    newest first.  Filters: dateFrom/dateTo, vehicleNumber (normalized
+    prefix) and unmatched=true.  Pass the returned next_cursor as ?cursor=
+    for the following page; next_cursor is null on the last page.
+    """
+    try:
+        date_from = request.args.get('dateFrom')
+        date_to = request.args.get('dateTo')
+        vehicle_number = request.args.get('vehicleNumber')
+        unmatched = request.args.get('unmatched', '').lower() in ('1', 'true', 'yes')
+        page_cursor = request.args.get('cursor')
+        limit = min(max(request.args.get('limit', WEIGHBRIDGE_MATCHES_PAGE_SIZE, type=int), 1),
+                    WEIGHBRIDGE_MATCHES_MAX_PAGE_SIZE)
+        
+        query = '''
+            SELECT m.weighbridge_id, m.ticket_number, m.plate_key, m.event_ts, m.gate_gap_seconds,
+                   w.VehicleNumber, w.State, w.NetWeight, w.Materialname, w.SupplierName,
+                   m.vehicle_id, v.inward_no, v.vehicle_number, v.entry_time,
+                   m.supplier_id, s.poNumber, s.supplierName, s.material
+            FROM weighbridge_matches m
+            JOIN weighbridge_data w ON w.id = m.weighbridge_id
+            LEFT JOIN vehicles v ON v.id = m.vehicle_id
+            LEFT JOIN supplier s ON s.id = m.supplier_id
+            WHERE m.event_ts IS NOT NULL
+        '''
+        params = []
+        
+        try:
+            if date_from:
+                query += ' AND m.event_ts >= %s'
+                params.append(parse_date_param(date_from, 'dateFrom'))
+            
+            if date_to:
+                query += ' AND m.event_ts < %s'
+                params.append(parse_date_param(date_to, 'dateTo') + timedelta(days=1))
+            
+            if page_cursor:
+                # Same '<timestamp>|<id>' format as the system logs cursor
+                after_event_ts, after_id = parse_system_logs_cursor(page_cursor)
+                query += ' AND (m.event_ts < %s OR (m.event_ts = %s AND m.weighbridge_id < %s))'
+                params.extend([after_event_ts, after_event_ts, after_id])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        vehicle_key = vehicle_number_key(vehicle_number) if vehicle_number else ''
+        if vehicle_key:
+            query += ' AND m.plate_key LIKE %s'
+            params.append(like_prefix(vehicle_key))
+        
+        if unmatched:
+            query += ' AND m.vehicle_id IS NULL'
+        
+        query += ' ORDER BY m.event_ts DESC, m.weighbridge_id DESC LIMIT %s'
+        params.append(limit + 1)
+        
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, params)
+        matches = cursor.fetchall()
+        has_more = len(matches) > limit
+        matches = matches[:limit]
+        return jsonify({
+            'matches': matches,
+            'limit': limit,
+            'next_cursor': weighbridge_matches_cursor(matches[-1]) if has_more else None
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
@@ -989,40 +468,34 @@ def get_weighbridge_data():
         if 'conn' in locals():
             conn.close()
 
-# Ticket Details Routes
+@app.route('/weighbridge-matches/run', methods=['POST'])
+def run_weighbridge_matching():
+    """Match new weighings now; {"rematch": true} also retries the unmatched ones.
+
+    Returns 409 with status 'busy' while the background matcher is running.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        conn = get_db_connection()
+        if data.get('rematch'):
+            counts = vehicle_matching.rematch(conn)
+        else:
+            counts = vehicle_matching.match_pending(conn)
+        return jsonify(counts), 409 if counts['status'] == 'busy' else 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if 'conn' in locals():
+            conn.close()
+
 @app.route('/ticket-details', methods=['GET'])
 def get_ticket_details():
+    conn = None
+    cursor = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         cursor.execute("SELECT * FROM ticket_details ORDER BY createdAt DESC")
-        ticket_details = cursor.fetchall()
-        
-        # Format dates and times for JSON response
-        for ticket in ticket_details:
-            # Handle Date fields (expected to be datetime.date or datetime.datetime)
-            ticket['Date'] = ticket['Date'].isoformat() if ticket['Date'] else None
-            ticket['LoadWeightDate'] = ticket['LoadWeightDate'].isoformat() if ticket['LoadWeightDate'] else None
-            ticket['EmptyWeightDate'] = ticket['EmptyWeightDate'].isoformat() if ticket['EmptyWeightDate'] else None
-            ticket['createdAt'] = ticket['createdAt'].isoformat() if ticket['createdAt'] else None
-            ticket['updatedAt'] = ticket['updatedAt'].isoformat() if ticket['updatedAt'] else None
-
-            # Handle Time fields (check for timedelta or time)
-            def format_time_field(field):
-                if isinstance(field, timedelta):
-                    # Convert timedelta to HH:MM:SS
-                    total_seconds = int(field.total_seconds())
-                    hours, remainder = divmod(total_seconds, 3600)
-                    minutes, seconds = divmod(remainder, 60)
-                    return f"{hours:02}:{minutes:02}:{seconds:02}"
-                elif hasattr(field, 'strftime'):
-                    # If it's a time or datetime object, use strftime
-                    return field.strftime('%H:%M:%S')
-                return None
-
-            ticket['Time'] = format_time_field(ticket['Time']) if ticket['Time'] else None
-            ticket['LoadWeightTime'] = format_time_field(ticket['LoadWeightTime']) if ticket['LoadWeightTime'] else None
-            ticket['EmptyWeightTime'] = format_time_field(ticket['EmptyWeightTime']) if ticket['EmptyWeightTime'] else None
         
         log_system_activity(
             'Main Branch',
@@ -1032,13 +505,16 @@ def get_ticket_details():
             'Fetched all ticket details',
             request.remote_addr
         )
-        return jsonify(ticket_details), 200
+        # DATE/DATETIME -> ISO, TIME -> HH:MM:SS, DECIMAL -> float, chosen once from the column types
+        response = stream_json(json_array(iter_cursor(cursor), transform=row_formatter(cursor)), cursor, conn)
+        cursor = conn = None  # closed by the stream
+        return response, 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
-        if 'cursor' in locals():
+        if cursor:
             cursor.close()
-        if 'conn' in locals():
+        if conn:
             conn.close()
 
 @app.route('/ticket-details', methods=['POST'])
@@ -1216,13 +692,17 @@ def create_ticket_detail():
                     INSERT INTO ticket_details (
                         TicketNumber, VehicleNumber, `Date`, `Time`, LoadedWeight, EmptyWeight,
                         LoadWeightDate, LoadWeightTime, EmptyWeightDate, EmptyWeightTime,
-                        NetWeight, Pending, `Shift`, Materialname, SupplierName, `State`, Closed
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        NetWeight, Pending, `Shift`, Materialname, SupplierName, `State`, Closed,
+                        event_ts, load_ts, empty_ts
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 '''
                 values = (
                     ticket_number, vehicle_number, date_value, time_value, loaded_weight, empty_weight,
                     load_weight_date_value, load_weight_time_value, empty_weight_date_value, empty_weight_time_value,
-                    net_weight, pending, shift, material_name, supplier_name, state, closed
+                    net_weight, pending, shift, material_name, supplier_name, state, closed,
+                    parse_timestamp(date_value, time_value),
+                    parse_timestamp(load_weight_date_value, load_weight_time_value),
+                    parse_timestamp(empty_weight_date_value, empty_weight_time_value)
                 )
                 cursor.execute(query, values)
                 inserted_rows += 1
@@ -1278,7 +758,10 @@ def update_ticket_detail(id):
                 TicketNumber=%s, VehicleNumber=%s, `Date`=%s, `Time`=%s, LoadedWeight=%s,
                 EmptyWeight=%s, LoadWeightDate=%s, LoadWeightTime=%s, EmptyWeightDate=%s,
                 EmptyWeightTime=%s, NetWeight=%s, Pending=%s, `Shift`=%s, Materialname=%s,
-                SupplierName=%s, `State`=%s, Closed=%s, updatedAt=%s
+                SupplierName=%s, `State`=%s, Closed=%s, updatedAt=%s,
+                event_ts=TIMESTAMP(`Date`, `Time`),
+                load_ts=TIMESTAMP(LoadWeightDate, LoadWeightTime),
+                empty_ts=TIMESTAMP(EmptyWeightDate, EmptyWeightTime)
             WHERE id=%s
         '''
         values = (
@@ -1356,11 +839,34 @@ def delete_ticket_detail(id):
             cursor.close()
         if 'conn' in locals():
             conn.close()            
+def vehicle_video_result(temp_path):
+    """Run plate/material detection on a saved clip; shaped as the client expects."""
+    result = process_vehicle_video(temp_path)
+    if not result['success']:
+        return {'success': False, 'error': result['error']}
+    if result['matched']:
+        # Vehicle exists in database
+        return {
+            'success': True,
+            'matched': True,
+            'vehicle_number': result['vehicle_number'],
+            'existing_vehicle': result['existing_vehicle'],
+            'message': 'Vehicle matched in database'
+        }
+    # New vehicle detected
+    return {
+        'success': True,
+        'matched': False,
+        'vehicle_number': result['vehicle_number'],
+        'vehicle_data': result['vehicle_data'],
+        'message': 'New vehicle detected, please fill remaining details'
+    }
+
 @app.route('/vehicles/process-video', methods=['POST'])
 def process_video():
     """
-    Updated video processing route that integrates with license plate detection
-    and material detection Python scripts
+    Queue an uploaded clip for license plate and material detection.
+    Returns a job id; poll GET /vehicles/process-video/<job_id> for the result.
     """
     try:
         if 'file' not in request.files:
@@ -1370,56 +876,30 @@ def process_video():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Save uploaded file temporarily
-        filename = secure_filename(file.filename)
-        temp_dir = tempfile.gettempdir()
-        temp_path = os.path.join(temp_dir, filename)
-        file.save(temp_path)
+        # Save to a temp file of its own so concurrent uploads can't overwrite each other
+        _, ext = os.path.splitext(secure_filename(file.filename))
+        fd, temp_path = tempfile.mkstemp(suffix=ext, prefix='vehicle-video-')
+        with os.fdopen(fd, 'wb') as f:
+            file.save(f)
         
-        try:
-            # Process the video using the integrated Python scripts
-            result = process_vehicle_video(temp_path)
-            
-            # Clean up temporary file
-            os.remove(temp_path)
-            
-            if result['success']:
-                if result['matched']:
-                    # Vehicle exists in database
-                    return jsonify({
-                        'success': True,
-                        'matched': True,
-                        'vehicle_number': result['vehicle_number'],
-                        'existing_vehicle': result['existing_vehicle'],
-                        'message': 'Vehicle matched in database'
-                    })
-                else:
-                    # New vehicle detected
-                    return jsonify({
-                        'success': True,
-                        'matched': False,
-                        'vehicle_number': result['vehicle_number'],
-                        'vehicle_data': result['vehicle_data'],
-                        'message': 'New vehicle detected, please fill remaining details'
-                    })
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': result['error']
-                }), 400
-                
-        except Exception as e:
-            # Clean up temporary file in case of error
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            return jsonify({
-                'success': False,
-                'error': f'Processing error: {str(e)}'
-            }), 500
+        job_id = video_jobs.submit(temp_path, vehicle_video_result)
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f"/vehicles/process-video/{job_id}"
+        }), 202
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/vehicles/process-video/<job_id>', methods=['GET'])
+def get_video_job(job_id):
+    job = video_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job)
+
 @app.route('/vehicles', methods=['POST'])
 def create_vehicle():
     """
@@ -1436,14 +916,13 @@ def create_vehicle():
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
-        # Generate serial number
-        cursor.execute('SELECT MAX(sno) FROM vehicles')
-        result = cursor.fetchone()
-        max_sno = result['MAX(sno)'] if result and result['MAX(sno)'] else 0
-        new_sno = max_sno + 1
+        # Allocate the serial number from id_sequences and commit straight away,
+        # so the counter row is not locked while the vehicle is written
+        new_sno = allocate_ids(cursor, "inward_no", 1)
+        conn.commit()
 
         # Generate inward number like INWB001
-        inward_no = f"INWB{str(new_sno).zfill(3)}"
+        inward_no = format_inward_no(new_sno)
 
         # Check if vehicle already exists
         cursor.execute('SELECT * FROM vehicles WHERE vehicle_number = %s', (data['vehicle_number'],))
@@ -1488,6 +967,7 @@ def create_vehicle():
             )
 
             cursor.execute(query, values)
+            dashboard_stats.adjust_vehicle_entries(cursor, 1)
             message = "Vehicle entry created successfully"
             
             # Get the created vehicle data for supplier creation
@@ -1499,13 +979,17 @@ def create_vehicle():
                 'entry_time': data.get('entry_time', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
             }
 
+        # Queue supplier detail creation with the vehicle if we have the required data
+        queued = bool(vehicle_data and vehicle_data.get('supplier_name') and vehicle_data.get('material')
+                      and vehicle_data.get('inward_no'))
+        if queued:
+            supplier_outbox.enqueue(cursor, vehicle_data)
+
         conn.commit()
-        
-        # Auto-create supplier detail if we have the required data
-        if vehicle_data and vehicle_data.get('supplier_name') and vehicle_data.get('material') and vehicle_data.get('inward_no'):
-            auto_create_supplier_detail(vehicle_data)
+        if queued:
+            supplier_outbox.notify()
 
-        return jsonify({"message": message}), 201
+        return jsonify({"message": message, "supplier_detail_queued": queued}), 201
 
     except Exception as e:
         print(f"Error in create_vehicle: {str(e)}")
@@ -1572,7 +1056,11 @@ def delete_vehicle(vehicle_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
+        cursor.execute("SELECT created_at FROM vehicles WHERE id = %s FOR UPDATE", (vehicle_id,))
+        vehicle = cursor.fetchone()
         cursor.execute("DELETE FROM vehicles WHERE id = %s", (vehicle_id,))
+        if vehicle and vehicle[0]:
+            dashboard_stats.adjust_vehicle_entries(cursor, -1, vehicle[0].date())
         conn.commit()
         return jsonify({"message": "Vehicle deleted successfully"})
     except Exception as e:
@@ -1597,6 +1085,41 @@ def initialize_vehicles_table():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Supplier outbox (supplier details queued by vehicle entry)
+@app.route('/supplier-outbox/status', methods=['GET'])
+def get_supplier_outbox_status():
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        return jsonify(supplier_outbox.status(cursor))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+@app.route('/supplier-outbox/retry', methods=['POST'])
+def retry_supplier_outbox():
+    """Requeue failed entries; pass ?id= to requeue a single one."""
+    try:
+        entry_id = request.args.get('id', type=int)
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        requeued = supplier_outbox.retry_failed(cursor, entry_id)
+        conn.commit()
+        if requeued:
+            supplier_outbox.notify()
+        return jsonify({"message": f"Requeued {requeued} supplier outbox entries", "requeued": requeued})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
 # Intent Routes
 @app.route('/intents', methods=['GET'])
 def get_intents():
@@ -1931,12 +1454,27 @@ def delete_invoice_payment_details(payment_id):
             conn.close()
 
 # System Logs Routes
+SYSTEM_LOGS_PAGE_SIZE = 100
+SYSTEM_LOGS_MAX_PAGE_SIZE = 1000
+
+def system_logs_cursor(row):
+    """Opaque keyset position after ``row``: '<timestamp>|<id>'."""
+    return f"{row['timestamp'].isoformat()}|{row['id']}"
+
+def parse_system_logs_cursor(value):
+    try:
+        timestamp, _, log_id = value.partition('|')
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
 @app.route('/system-logs', methods=['GET'])
 def get_system_logs():
+    """
+    One page of logs, newest first.  Pass the returned next_cursor as
+    ?cursor= for the following page; next_cursor is null on the last page.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
         # Get query parameters for filtering
         date_from = request.args.get('dateFrom')
         date_to = request.args.get('dateTo')
@@ -1944,18 +1482,28 @@ def get_system_logs():
         module = request.args.get('module')
         action = request.args.get('action')
         user = request.args.get('user')
+        page_cursor = request.args.get('cursor')
+        limit = min(max(request.args.get('limit', SYSTEM_LOGS_PAGE_SIZE, type=int), 1), SYSTEM_LOGS_MAX_PAGE_SIZE)
         
-        # Build query with filters
+        # Build query with filters; timestamp ranges are half-open so partitions are pruned
         query = 'SELECT * FROM system_logs WHERE 1=1'
         params = []
         
-        if date_from:
-            query += ' AND DATE(timestamp) >= %s'
-            params.append(date_from)
-        
-        if date_to:
-            query += ' AND DATE(timestamp) <= %s'
-            params.append(date_to)
+        try:
+            if date_from:
+                query += ' AND timestamp >= %s'
+                params.append(parse_date_param(date_from, 'dateFrom'))
+            
+            if date_to:
+                query += ' AND timestamp < %s'
+                params.append(parse_date_param(date_to, 'dateTo') + timedelta(days=1))
+            
+            if page_cursor:
+                after_timestamp, after_id = parse_system_logs_cursor(page_cursor)
+                query += ' AND (timestamp < %s OR (timestamp = %s AND id < %s))'
+                params.extend([after_timestamp, after_timestamp, after_id])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         if branch and branch != 'All':
             query += ' AND branch_name = %s'
@@ -1970,14 +1518,24 @@ def get_system_logs():
             params.append(action)
         
         if user:
+            # Prefix match so idx_system_logs_action_by applies
             query += ' AND action_by LIKE %s'
-            params.append(f'%{user}%')
+            params.append(like_prefix(user))
         
-        query += ' ORDER BY timestamp DESC'
+        query += ' ORDER BY timestamp DESC, id DESC LIMIT %s'
+        params.append(limit + 1)
         
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
         cursor.execute(query, params)
         logs = cursor.fetchall()
-        return jsonify(logs)
+        has_more = len(logs) > limit
+        logs = logs[:limit]
+        return jsonify({
+            'logs': logs,
+            'limit': limit,
+            'next_cursor': system_logs_cursor(logs[-1]) if has_more else None
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
@@ -1991,8 +1549,7 @@ def clear_all_logs():
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM system_logs")
-        conn.commit()
+        log_partitions.truncate_logs(cursor)
         return jsonify({'message': 'All logs cleared successfully'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -2099,6 +1656,8 @@ def upload_bill():
                         # Update supplier table
                         conn = get_db_connection()
                         cursor = conn.cursor()
+                        cursor.execute("SELECT poNumber, supplierBillQty FROM supplier WHERE id = %s FOR UPDATE", (supplier_id,))
+                        supplier_row = cursor.fetchone()
                         cursor.execute('''
                             UPDATE supplier 
                             SET supplierBillFile = %s, supplierBillQty = %s, supplierBillRate = %s,
@@ -2114,7 +1673,12 @@ def upload_bill():
                             load_weight, net_weight, tax, cgst, sgst,
                             round_off, total, amount_in_words, supplier_id
                         ))
+                        if supplier_row:
+                            apply_supplier_change(cursor, supplier_row[0],
+                                                  billed_delta=supplier_bill_qty - float(supplier_row[1] or 0))
                         conn.commit()
+                        if supplier_row:
+                            invalidate_grn_cache(supplier_row[0])
 
                         # Insert into invoice_items table
                         cursor.execute('''
@@ -2243,7 +1807,7 @@ def update_supplier_bill_data(supplier_id):
         cursor = conn.cursor()
         
         # Calculate difference
-        po_rate_query = 'SELECT poRate FROM supplier WHERE id = %s'
+        po_rate_query = 'SELECT poRate, poNumber, supplierBillQty FROM supplier WHERE id = %s FOR UPDATE'
         cursor.execute(po_rate_query, (supplier_id,))
         po_rate_result = cursor.fetchone()
         
@@ -2265,7 +1829,11 @@ def update_supplier_bill_data(supplier_id):
             )
             
             cursor.execute(query, values)
+            _, billed_delta = supplier_row_change({'supplierBillQty': po_rate_result[2]},
+                                                  {'supplierBillQty': data.get('supplierBillQty')})
+            apply_supplier_change(cursor, po_rate_result[1], billed_delta=billed_delta)
             conn.commit()
+            invalidate_grn_cache(po_rate_result[1])
             
         return jsonify({'message': 'Supplier bill data updated successfully'})
         
@@ -2316,6 +1884,7 @@ def create_employee():
         )
         
         cursor.execute(query, values)
+        dashboard_stats.record_status_change(cursor, 'employees', None, data.get('status', 'Active'))
         conn.commit()
         
         # Log the activity
@@ -2343,6 +1912,7 @@ def update_employee(employee_id):
         data = request.json
         conn = get_db_connection()
         cursor = conn.cursor()
+        old_status = dashboard_stats.locked_status(cursor, 'employees', employee_id)
         
         query = '''
             UPDATE employees SET full_name=%s, date_of_birth=%s, gender=%s, phone_number=%s,
@@ -2359,6 +1929,8 @@ def update_employee(employee_id):
         )
         
         cursor.execute(query, values)
+        if old_status is not None:
+            dashboard_stats.record_status_change(cursor, 'employees', old_status, data.get('status', 'Active'))
         conn.commit()
         
         # Log the activity
@@ -2392,8 +1964,11 @@ def update_employee_status(employee_id):
         conn = get_db_connection()
         cursor = conn.cursor()
 
+        old_status = dashboard_stats.locked_status(cursor, 'employees', employee_id)
         query = "UPDATE employees SET status = %s WHERE id = %s"
         cursor.execute(query, (new_status, employee_id))
+        if old_status is not None:
+            dashboard_stats.record_status_change(cursor, 'employees', old_status, new_status)
         conn.commit()
 
         # Optional logging
@@ -2422,10 +1997,12 @@ def delete_employee(employee_id):
         cursor = conn.cursor(dictionary=True)
         
         # Get employee name for logging
-        cursor.execute('SELECT full_name FROM employees WHERE id = %s', (employee_id,))
+        cursor.execute('SELECT full_name, status FROM employees WHERE id = %s FOR UPDATE', (employee_id,))
         employee = cursor.fetchone()
         
         cursor.execute('DELETE FROM employees WHERE id = %s', (employee_id,))
+        if employee:
+            dashboard_stats.record_status_change(cursor, 'employees', employee['status'], None)
         conn.commit()
         
         # Log the activity
@@ -2794,6 +2371,7 @@ def create_project():
         values = (project_name, address, latitude, longitude, datetime.now())
 
         cursor.execute(query, values)
+        dashboard_stats.record_status_change(cursor, 'projects', None, 'Active')  # column default
         conn.commit()
         
         # Log the activity
@@ -2867,10 +2445,12 @@ def delete_project(project_id):
         cursor = conn.cursor(dictionary=True)
         
         # Get project name for logging
-        cursor.execute('SELECT project_name FROM projects WHERE id = %s', (project_id,))
+        cursor.execute('SELECT project_name, status FROM projects WHERE id = %s FOR UPDATE', (project_id,))
         project = cursor.fetchone()
         
         cursor.execute('DELETE FROM projects WHERE id = %s', (project_id,))
+        if project:
+            dashboard_stats.record_status_change(cursor, 'projects', project['status'], None)
         conn.commit()
         
         # Log the activity
@@ -2955,6 +2535,9 @@ def add_po():
         )
 
         cursor.execute(query, values)
+        refresh_ordered_qty(cursor, data["poNumber"])
+        dashboard_stats.record_status_change(cursor, 'po_details', None, data["status"])
+        stock_ledger.adjust(cursor, data["material"], ordered_qty=float(data["quantity"]))
         conn.commit()
         
         # Log the activity
@@ -2984,10 +2567,14 @@ def delete_po(id):
         cursor = conn.cursor(dictionary=True)
         
         # Get PO number for logging
-        cursor.execute("SELECT poNumber FROM po_details WHERE id = %s", (id,))
+        cursor.execute("SELECT poNumber, status, material, quantity FROM po_details WHERE id = %s FOR UPDATE", (id,))
         po = cursor.fetchone()
         
         cursor.execute("DELETE FROM po_details WHERE id = %s", (id,))
+        if po:
+            refresh_ordered_qty(cursor, po['poNumber'])
+            dashboard_stats.record_status_change(cursor, 'po_details', po['status'], None)
+            stock_ledger.adjust(cursor, po['material'], ordered_qty=-float(po['quantity']))
         conn.commit()
         
         # Log the activity
@@ -3033,6 +2620,8 @@ def update_po(id):
 
         conn = get_db_connection()
         cursor = conn.cursor()
+        cursor.execute("SELECT poNumber, status, material, quantity FROM po_details WHERE id = %s FOR UPDATE", (id,))
+        previous = cursor.fetchone()
 
         query = """
         UPDATE po_details SET
@@ -3065,6 +2654,13 @@ def update_po(id):
         )
 
         cursor.execute(query, values)
+        refresh_ordered_qty(cursor, data["poNumber"])
+        if previous and previous[0] != data["poNumber"]:
+            refresh_ordered_qty(cursor, previous[0])
+        if previous:
+            dashboard_stats.record_status_change(cursor, 'po_details', previous[1], data["status"])
+            stock_ledger.adjust(cursor, previous[2], ordered_qty=-float(previous[3]))
+        stock_ledger.adjust(cursor, data["material"], ordered_qty=float(data["quantity"]))
         conn.commit()
         
         # Log the activity
@@ -3089,56 +2685,39 @@ def update_po(id):
 
 
 # Supplier Routes - UPDATED
+# /supplier has always sent its quantities and rates as numbers
+SUPPLIER_OVERRIDES = {
+    column: to_float for column in (
+        'poBalanceQty', 'receivedQty', 'supplierBillQty', 'poRate', 'supplierBillRate', 'difference', 'orderedQty'
+    )
+}
+
+def supplier_formatter(cursor):
+    format_row = row_formatter(cursor, overrides=SUPPLIER_OVERRIDES)
+
+    def format_supplier(supplier):
+        formatted = format_row(supplier)
+        voucher_no = None
+        file_path = supplier['supplierBillFile']
+        if file_path:
+            # Use regex to find a numeric sequence in the filename
+            match = re.search(r'\d+', os.path.basename(file_path))
+            if match:
+                voucher_no = match.group(0)
+        formatted['voucherNo'] = voucher_no  # <-- Extracted voucher number
+        return formatted
+    return format_supplier
+
 @app.route('/supplier', methods=['GET'])
 def get_suppliers():
+    conn = None
+    cursor = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
         # Fetch all supplier data
         cursor.execute("SELECT * FROM supplier ORDER BY created_at DESC")
-        suppliers = cursor.fetchall()
-        
-        formatted_suppliers = []
-        
-        for supplier in suppliers:
-            file_path = supplier['supplierBillFile']
-            voucher_no = None
-            
-            if file_path:
-                # Extract the filename from the path
-                filename = os.path.basename(file_path)
-                
-                # Use regex to find a numeric sequence in the filename
-                match = re.search(r'\d+', filename)
-                if match:
-                    voucher_no = match.group(0)
-            
-            formatted_supplier = {
-                'id': supplier['id'],
-                'poNumber': supplier['poNumber'],
-                'poBalanceQty': float(supplier['poBalanceQty']) if supplier['poBalanceQty'] is not None else None,
-                'inwardNo': supplier['inwardNo'],
-                'vehicleNo': supplier['vehicleNo'],
-                'dateTime': supplier['dateTime'].isoformat() if supplier['dateTime'] else None,
-                'supplierName': supplier['supplierName'],
-                'material': supplier['material'],
-                'uom': supplier['uom'],
-                'receivedQty': float(supplier['receivedQty']) if supplier['receivedQty'] is not None else None,
-                'receivedBy': supplier['receivedBy'],
-                'supplierBillQty': float(supplier['supplierBillQty']) if supplier['supplierBillQty'] is not None else None,
-                'poRate': float(supplier['poRate']) if supplier['poRate'] is not None else None,
-                'supplierBillRate': float(supplier['supplierBillRate']) if supplier['supplierBillRate'] is not None else None,
-                'supplierBillFile': supplier['supplierBillFile'],
-                'voucherNo': voucher_no,  # <-- Extracted voucher number
-                'difference': float(supplier['difference']) if supplier['difference'] is not None else None,
-                'status': supplier['status'],
-                'created_at': supplier['created_at'].isoformat() if supplier['created_at'] else None,
-                'updated_at': supplier['updated_at'].isoformat() if supplier['updated_at'] else None,
-                'orderedQty': float(supplier['orderedQty']) if supplier['orderedQty'] is not None else None
-            }
-            
-            formatted_suppliers.append(formatted_supplier)
         
         # Log the activity
         log_system_activity(
@@ -3150,16 +2729,20 @@ def get_suppliers():
             request.remote_addr
         )
         
-        return jsonify(formatted_suppliers), 200
+        response = stream_json(json_array(iter_cursor(cursor), transform=supplier_formatter(cursor)), cursor, conn)
+        cursor = conn = None  # closed by the stream
+        return response, 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
     finally:
-        if 'cursor' in locals():
+        if cursor:
             cursor.close()
-        if 'conn' in locals():
-            conn.close()# Configure upload folder
+        if conn:
+            conn.close()
+
+# Configure upload folder
 UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
@@ -3264,7 +2847,10 @@ def add_supplier():
 
         print(f"Executing query: {query % values}")
         cursor.execute(query, values)
+        apply_supplier_change(cursor, data["poNumber"], received_delta=received_qty)
+        stock_ledger.adjust(cursor, data["material"], data.get("uom", "CFT"), received_qty=received_qty)
         conn.commit()
+        invalidate_grn_cache(data["poNumber"])
 
         # Log the activity
         log_system_activity(
@@ -3455,11 +3041,20 @@ def delete_supplier(id):
         cursor = conn.cursor(dictionary=True)
         
         # Get supplier details for logging
-        cursor.execute("SELECT supplierName, vehicleNo FROM supplier WHERE id = %s", (id,))
+        cursor.execute('''
+            SELECT supplierName, vehicleNo, poNumber, material, receivedQty, supplierBillQty
+            FROM supplier WHERE id = %s FOR UPDATE
+        ''', (id,))
         supplier = cursor.fetchone()
         
         cursor.execute("DELETE FROM supplier WHERE id = %s", (id,))
+        if supplier:
+            received_delta, billed_delta = supplier_row_change(supplier, None)
+            apply_supplier_change(cursor, supplier['poNumber'], received_delta, billed_delta)
+            stock_ledger.adjust(cursor, supplier['material'], received_qty=received_delta)
         conn.commit()
+        if supplier:
+            invalidate_grn_cache(supplier['poNumber'])
         
         # Log the activity
         if supplier:
@@ -3481,63 +3076,167 @@ def delete_supplier(id):
 # Dashboard Statistics Routes
 @app.route('/dashboard/stats', methods=['GET'])
 def get_dashboard_stats():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Total employees
-    cursor.execute('SELECT COUNT(*) FROM employees WHERE status = "Active"')
-    total_employees = cursor.fetchone()[0]
-    
-    # Active projects
-    cursor.execute('SELECT COUNT(*) FROM projects WHERE status = "Active"')
-    active_projects = cursor.fetchone()[0]
-    
-    # Vehicle entries (today)
-    cursor.execute('SELECT COUNT(*) FROM vehicles WHERE DATE(created_at) = CURDATE()')
-    vehicle_entries = cursor.fetchone()[0]
-    
-    # Purchase orders
-    cursor.execute('SELECT COUNT(*) FROM po_details WHERE status = "Active"')
-    purchase_orders = cursor.fetchone()[0]
-    
-    cursor.close()
-    conn.close()
-    
-    return jsonify({
-        'totalEmployees': total_employees,
-        'activeProjects': active_projects,
-        'vehicleEntries': vehicle_entries,
-        'purchaseOrders': purchase_orders
-    })
-@app.route('/combined-payment-supplier-details', methods=['GET'])
-def get_combined_payment_supplier_details():
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        # Counters are maintained by the write handlers; see dashboard_stats.py
+        return jsonify(dashboard_stats.read_stats(cursor))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+@app.route('/inventory/stats', methods=['GET'])
+def get_inventory_stats():
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        # Fetch Supplier Payment Details
-        cursor.execute("SELECT * FROM supplier_payment_details ORDER BY created_at DESC")
-        supplier_payment_details = cursor.fetchall()
+        # PO progress from po_balance (one row per PO); finished once billing covers the order
+        cursor.execute('''
+            SELECT COUNT(*) AS total, COALESCE(SUM(remaining_qty <= 0), 0) AS finished
+            FROM po_balance
+            WHERE ordered_qty > 0
+        ''')
+        po_counts = cursor.fetchone()
+        client_orders = dashboard_stats.client_order_counts(cursor)
         
-        # Fetch Invoice Payment Details
-        cursor.execute("SELECT * FROM invoice_payment_details ORDER BY created_at DESC")
-        invoice_payment_details = cursor.fetchall()
+        return jsonify({
+            'totalPO': int(po_counts['total']),
+            'finishedPO': int(po_counts['finished']),
+            'pendingPO': int(po_counts['total']) - int(po_counts['finished']),
+            'totalClientOrders': sum(client_orders.values()),
+            'finishedClientOrders': client_orders.get('Completed', 0),
+            'pendingClientOrders': client_orders.get('Active', 0),
+            'materials': stock_ledger.stock_levels(cursor)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+@app.route('/inventory/stats/rebuild', methods=['POST'])
+def rebuild_inventory_stats():
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        materials = stock_ledger.rebuild_stock_ledger(cursor)
+        conn.commit()
+        return jsonify({'message': 'Stock ledger rebuilt', 'materials': materials})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+COMBINED_PAYMENTS_PAGE_SIZE = 50
+COMBINED_PAYMENTS_MAX_PAGE_SIZE = 500
+
+def combined_payments_cursor(row):
+    """Opaque keyset position after ``row``: '<created_at>|<id>'."""
+    return f"{row['created_at'].isoformat()}|{row['id']}"
+
+@app.route('/combined-payment-supplier-details', methods=['GET'])
+def get_combined_payment_supplier_details():
+    """
+    One page of supplier payments, newest first, each joined to its PO's
+    supplier totals from po_balance.  Filters: dateFrom/dateTo on created_at,
+    supplier (name prefix) and poNumber.  Pass the returned next_cursor as
+    ?cursor= for the following page; next_cursor is null on the last page.
+
+    The response keeps its original keys: suppliers holds the supplier rows
+    of the page's POs only, and invoicePaymentDetails is always empty (those
+    share no key with supplier payments; see /invoice-payment-details).
+    """
+    try:
+        date_from = request.args.get('dateFrom')
+        date_to = request.args.get('dateTo')
+        supplier = request.args.get('supplier')
+        po_number = request.args.get('poNumber')
+        page_cursor = request.args.get('cursor')
+        limit = min(max(request.args.get('limit', COMBINED_PAYMENTS_PAGE_SIZE, type=int), 1),
+                    COMBINED_PAYMENTS_MAX_PAGE_SIZE)
         
-        # Fetch Supplier
-        cursor.execute("SELECT * FROM supplier ORDER BY created_at DESC")
-        supplier_details = cursor.fetchall()
+        query = '''
+            SELECT p.*,
+                   b.ordered_qty AS po_ordered_qty,
+                   b.received_qty AS po_received_qty,
+                   b.billed_qty AS po_billed_qty,
+                   b.remaining_qty AS po_remaining_qty
+            FROM supplier_payment_details p
+            LEFT JOIN po_balance b ON b.poNumber = p.po_number
+            WHERE 1=1
+        '''
+        params = []
         
-        cursor.close()
-        conn.close()
+        try:
+            if date_from:
+                query += ' AND p.created_at >= %s'
+                params.append(parse_date_param(date_from, 'dateFrom'))
+            
+            if date_to:
+                query += ' AND p.created_at < %s'
+                params.append(parse_date_param(date_to, 'dateTo') + timedelta(days=1))
+            
+            if page_cursor:
+                # Same '<timestamp>|<id>' format as the system logs cursor
+                after_created_at, after_id = parse_system_logs_cursor(page_cursor)
+                query += ' AND (p.created_at < %s OR (p.created_at = %s AND p.id < %s))'
+                params.extend([after_created_at, after_created_at, after_id])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if supplier:
+            # Prefix match so idx_supplier_payment_supplier_created applies
+            query += ' AND p.supplier_name LIKE %s'
+            params.append(like_prefix(supplier))
         
+        if po_number:
+            query += ' AND p.po_number = %s'
+            params.append(po_number)
+        
+        query += ' ORDER BY p.created_at DESC, p.id DESC LIMIT %s'
+        params.append(limit + 1)
+        
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(query, params)
+        payments = cursor.fetchall()
+        has_more = len(payments) > limit
+        payments = payments[:limit]
+        
+        po_numbers = sorted({p['po_number'] for p in payments if p['po_number']})
+        suppliers = []
+        if po_numbers:
+            cursor.execute(f'''
+                SELECT *
+                FROM supplier
+                WHERE poNumber IN ({", ".join(["%s"] * len(po_numbers))})
+                ORDER BY created_at DESC
+            ''', po_numbers)
+            suppliers = cursor.fetchall()
         return jsonify({
-            "supplierPaymentDetails": supplier_payment_details,
-            "invoicePaymentDetails": invoice_payment_details,
-            "suppliers": supplier_details
+            'supplierPaymentDetails': payments,
+            'invoicePaymentDetails': [],
+            'suppliers': suppliers,
+            'limit': limit,
+            'next_cursor': combined_payments_cursor(payments[-1]) if has_more else None
         })
-        
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
     
 
 @app.route('/login', methods=['POST'])
@@ -3687,4 +3386,8 @@ def signup():
 
 if __name__ == '__main__':
     init_db()
+    start_supplier_outbox_worker()
+    log_partitions.start_maintenance()
+    dashboard_stats.start_reconciliation()
+    vehicle_matching.start_matching()
     app.run(debug=False, use_reloader=False,port=5000)
@@ -0,0 +1,164 @@
+"""Incrementally maintained counters behind /dashboard/stats.
+
+dashboard_counters holds one row per counter.  Write handlers adjust the
+affected counter in the same transaction as their own write, so reading
+the dashboard is a single primary-key lookup instead of four COUNT(*)
+scans.  Vehicle entries are counted per day under 'vehicle_entries:<date>',
+dated by the database clock like vehicles.created_at, and batch slips
+(client orders) per status under 'client_orders:<status>'.
+
+reconcile() recomputes every counter from the source tables and drops
+old daily rows; app.py runs it at start-up and every RECONCILE_INTERVAL
+seconds, which also repairs any drift from writes made outside the app.
+"""
+import threading
+
+from db_config import get_db_connection
+
+RECONCILE_INTERVAL = 900
+
+# table -> counter of its rows whose status is 'Active'
+ACTIVE_COUNTERS = {
+    "employees": "active_employees",
+    "projects": "active_projects",
+    "po_details": "active_purchase_orders",
+}
+VEHICLE_ENTRIES_PREFIX = "vehicle_entries:"
+CLIENT_ORDERS_PREFIX = "client_orders:"
+
+def is_active(status):
+    return (status or "").strip().lower() == "active"
+
+def adjust(cursor, name, delta):
+    if not delta:
+        return
+    cursor.execute('''
+        INSERT INTO dashboard_counters (name, value) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE value = value + VALUES(value)
+    ''', (name, delta))
+
+def locked_status(cursor, table, row_id):
+    """Current status of a row, locked until commit; None if the row does not exist."""
+    cursor.execute(f"SELECT status FROM {table} WHERE id = %s FOR UPDATE", (row_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return row["status"] if isinstance(row, dict) else row[0]
+
+def record_status_change(cursor, table, old_status, new_status):
+    """Adjust the table's active counter for a row going from old_status to new_status.
+
+    Pass None as old_status for an insert and as new_status for a delete.
+    """
+    adjust(cursor, ACTIVE_COUNTERS[table], int(is_active(new_status)) - int(is_active(old_status)))
+
+def record_status_changes(cursor, table, old_statuses, new_statuses):
+    """record_status_change() for a bulk write: rows with old_statuses removed, new_statuses added."""
+    adjust(cursor, ACTIVE_COUNTERS[table],
+           sum(map(is_active, new_statuses)) - sum(map(is_active, old_statuses)))
+
+def adjust_vehicle_entries(cursor, delta, day=None):
+    """Adjust the vehicle entry count for ``day`` (a date), today by default."""
+    if not delta:
+        return
+    if day is None:
+        cursor.execute('''
+            INSERT INTO dashboard_counters (name, value) VALUES (CONCAT(%s, CURDATE()), %s)
+            ON DUPLICATE KEY UPDATE value = value + VALUES(value)
+        ''', (VEHICLE_ENTRIES_PREFIX, delta))
+    else:
+        adjust(cursor, f"{VEHICLE_ENTRIES_PREFIX}{day.isoformat()}", delta)
+
+def adjust_client_orders(cursor, status, delta):
+    adjust(cursor, f"{CLIENT_ORDERS_PREFIX}{status}", delta)
+
+def client_order_counts(cursor):
+    """{status: count} of batch slips."""
+    cursor.execute('''
+        SELECT name, value
+        FROM dashboard_counters
+        WHERE name LIKE CONCAT(%s, '%%')
+    ''', (CLIENT_ORDERS_PREFIX,))
+    counts = {}
+    for row in cursor.fetchall():
+        name, value = (row["name"], row["value"]) if isinstance(row, dict) else row
+        counts[name[len(CLIENT_ORDERS_PREFIX):]] = int(value)
+    return counts
+
+def read_stats(cursor):
+    """The dashboard counters as {'totalEmployees': ..., ...} from one indexed read."""
+    cursor.execute('''
+        SELECT name, value
+        FROM dashboard_counters
+        WHERE name IN (%s, %s, %s, CONCAT(%s, CURDATE()))
+    ''', (ACTIVE_COUNTERS["employees"], ACTIVE_COUNTERS["projects"], ACTIVE_COUNTERS["po_details"],
+          VEHICLE_ENTRIES_PREFIX))
+    values = {}
+    for row in cursor.fetchall():
+        name, value = (row["name"], row["value"]) if isinstance(row, dict) else row
+        values[name] = int(value)
+    return {
+        "totalEmployees": values.get(ACTIVE_COUNTERS["employees"], 0),
+        "activeProjects": values.get(ACTIVE_COUNTERS["projects"], 0),
+        "vehicleEntries": next((v for k, v in values.items() if k.startswith(VEHICLE_ENTRIES_PREFIX)), 0),
+        "purchaseOrders": values.get(ACTIVE_COUNTERS["po_details"], 0),
+    }
+
+def reconcile(conn):
+    """Recompute every counter from its source table and drop earlier days' vehicle counts."""
+    cursor = conn.cursor()
+    try:
+        for table, name in ACTIVE_COUNTERS.items():
+            cursor.execute(f'''
+                INSERT INTO dashboard_counters (name, value)
+                SELECT %s, COUNT(*) FROM {table} WHERE status = 'Active'
+                ON DUPLICATE KEY UPDATE value = VALUES(value)
+            ''', (name,))
+        cursor.execute('''
+            INSERT INTO dashboard_counters (name, value)
+            SELECT CONCAT(%s, CURDATE()), COUNT(*)
+            FROM vehicles
+            WHERE created_at >= CURDATE() AND created_at < CURDATE() + INTERVAL 1 DAY
+            ON DUPLICATE KEY UPDATE value = VALUES(value)
+        ''', (VEHICLE_ENTRIES_PREFIX,))
+        cursor.execute('''
+            DELETE FROM dashboard_counters
+            WHERE name LIKE CONCAT(%s, '%%') AND name < CONCAT(%s, CURDATE())
+        ''', (VEHICLE_ENTRIES_PREFIX, VEHICLE_ENTRIES_PREFIX))
+        cursor.execute('''
+            UPDATE dashboard_counters SET value = 0 WHERE name LIKE CONCAT(%s, '%%')
+        ''', (CLIENT_ORDERS_PREFIX,))
+        cursor.execute('''
+            INSERT INTO dashboard_counters (name, value)
+            SELECT CONCAT(%s, status), COUNT(*)
+            FROM batch_slips
+            WHERE status IS NOT NULL
+            GROUP BY status
+            ON DUPLICATE KEY UPDATE value = VALUES(value)
+        ''', (CLIENT_ORDERS_PREFIX,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def _run_periodically(stop):
+    while True:
+        conn = None
+        try:
+            conn = get_db_connection()
+            reconcile(conn)
+        except Exception as e:
+            print(f"Error reconciling dashboard counters: {str(e)}")
+        finally:
+            if conn is not None:
+                conn.close()
+        if stop.wait(RECONCILE_INTERVAL):
+            return
+
+def start_reconciliation():
+    """Reconcile now and then every RECONCILE_INTERVAL on a daemon thread."""
+    stop = threading.Event()
+    threading.Thread(target=_run_periodically, args=(stop,), name="dashboard-counters", daemon=True).start()
+    return stop
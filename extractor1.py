@@ -1,8 +1,15 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import tempfile
 import os
+import io
+import asyncio
+import zipfile
+import zlib
+import time
+from collections import OrderedDict
+from typing import List, Optional
 from pdf2image import convert_from_path
 from PIL import Image
 import pymysql
@@ -10,16 +17,20 @@ from pymysql.err import MySQLError
 import pytesseract
 import google.generativeai as genai
 from db_config import get_db_connection
+from migrations import migrate
+from po_balance import get_po_balance
+import segment_store
+from response_stream import FETCH_SIZE, closing_stream, encode_stream, iter_cursor, json_array, json_object
+from voucher_ingest import ingest_vouchers, save_csv_spools, VoucherFormatError
+from weighbridge_filters import like_prefix
+import ijson
 import mysql.connector
 from datetime import datetime, date
 import json
 import logging
 import sys
 import re
-import pandas as pd
-import shutil
 import uuid
-import dateutil.parser
 from mysql.connector import Error
 
 # Configure logging
@@ -62,6 +73,12 @@ except Exception as e:
     logger.error(f"Failed to configure Tesseract: {e}", exc_info=True)
     raise
 
+@app.on_event("startup")
+def apply_schema_migrations():
+    applied = migrate()
+    if applied:
+        logger.info(f"Applied schema migrations: {applied}")
+
 # Define folders and filenames
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -99,107 +116,81 @@ def convert_to_json_serializable(data):
         return data.isoformat()
     return data
 
-def clean_value(value):
-    if value == "NULL" or value is None:
-        return None
-    if isinstance(value, str):
-        value = value.strip()
-        try:
-            return float(value)
-        except ValueError:
-            return value
-    return value
-
-def parse_quantity(quantity_str):
-    if not quantity_str or quantity_str == "NULL":
-        return 0.0
-    try:
-        match = re.match(r"(\d+\.\d+|\d+)", quantity_str)
-        if match:
-            return float(match.group(0))
-        return float(quantity_str.split()[0])
-    except (ValueError, IndexError):
-        return 0.0
-
-def parse_rate(rate_str):
-    if not rate_str or rate_str == "NULL":
-        return 0.0
-    try:
-        return float(rate_str.split('/')[0])
-    except (ValueError, IndexError):
-        return 0.0
-
-def parse_date(date_str):
-    if not date_str or date_str == "NULL":
-        return None
-    try:
-        parsed = dateutil.parser.parse(date_str, dayfirst=False)
-        return parsed.strftime('%Y-%m-%d')
-    except (ValueError, TypeError):
-        return None
+def stream_json_response(request, chunks, *resources):
+    """Stream JSON chunks, compressed per Accept-Encoding, closing resources when done."""
+    body, headers = encode_stream(chunks, request.headers.get("accept-encoding"))
+    return StreamingResponse(closing_stream(body, *resources), media_type="application/json", headers=headers)
 
 # --- Invoice Extraction Service Routes ---
-@app.post("/extract-invoice/")
-async def extract_invoice(file: UploadFile = File(...), supplier_id: str = Form(None)):
+ALLOWED_INVOICE_TYPES = ["application/pdf", "image/png", "image/jpeg", "image/jpg"]
+MAX_INVOICE_SIZE = 10 * 1024 * 1024
+
+# Batch extraction limits; each pipeline stage gets its own worker pool so a
+# slow Gemini call never stalls OCR of the next file (and vice versa).
+BATCH_MAX_FILES = 100
+BATCH_MAX_BYTES = 200 * 1024 * 1024  # uploads plus inflated zip members held in memory
+BATCH_OCR_WORKERS = 2
+BATCH_EXTRACT_WORKERS = 4
+BATCH_DB_WORKERS = 2
+INVOICE_EXTENSION_TYPES = {
+    ".pdf": "application/pdf",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg"
+}
+
+class InvoiceProcessingError(Exception):
+    """Raised by an invoice pipeline stage; carries the HTTP status and error payload."""
+    def __init__(self, status_code, content):
+        super().__init__(content.get("error"))
+        self.status_code = status_code
+        self.content = content
+
+def validate_invoice_upload(content, content_type, supplier_id=None):
+    if supplier_id and not re.match(r'^[A-Za-z0-9_-]+$', supplier_id):
+        raise InvoiceProcessingError(400, {"status": "error", "error": "Invalid supplier_id format"})
+    if len(content) > MAX_INVOICE_SIZE:
+        raise InvoiceProcessingError(400, {"status": "error", "error": "File size exceeds 10MB limit"})
+    if content_type not in ALLOWED_INVOICE_TYPES:
+        raise InvoiceProcessingError(400, {"status": "error", "error": f"Unsupported file type: {content_type}"})
+
+def save_invoice_upload(content, filename):
+    file_extension = os.path.splitext(filename)[1]
+    unique_filename = f"{uuid.uuid4().hex}{file_extension}"
+    file_path = os.path.join(UPLOAD_DIR, unique_filename)
+    with open(file_path, "wb") as f:
+        f.write(content)
+    logger.debug(f"File saved to: {file_path}")
+    return unique_filename
+
+def ocr_invoice(content, filename, content_type):
+    """OCR stage: write the upload to a temporary file and run Tesseract on it."""
     tmp_path = None
-    conn = None
-    cursor = None
     try:
-        logger.debug(f"Starting processing for file: {file.filename}, content_type: {file.content_type}, supplier_id: {supplier_id}")
-
-        # Validate supplier_id if provided
-        if supplier_id and not re.match(r'^[A-Za-z0-9_-]+$', supplier_id):
-            return JSONResponse(
-                status_code=400,
-                content={"status": "error", "error": "Invalid supplier_id format"}
-            )
-
-        # Validate file size
-        content = await file.read()
-        if len(content) > 10 * 1024 * 1024:
-            return JSONResponse(
-                status_code=400,
-                content={"status": "error", "error": "File size exceeds 10MB limit"}
-            )
-
-        # Validate content type
-        if file.content_type not in ["application/pdf", "image/png", "image/jpeg", "image/jpg"]:
-            return JSONResponse(
-                status_code=400,
-                content={"status": "error", "error": f"Unsupported file type: {file.content_type}"}
-            )
-
-        # Save file to uploads folder
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4().hex}{file_extension}"
-        file_path = os.path.join(UPLOAD_DIR, unique_filename)
-        with open(file_path, "wb") as f:
-            f.write(content)
-        logger.debug(f"File saved to: {file_path}")
-
-        # Create temporary file for OCR
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as tmp_file:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as tmp_file:
                 tmp_file.write(content)
                 tmp_path = tmp_file.name
             logger.debug(f"Temporary file created: {tmp_path}")
         except Exception as e:
             logger.error(f"Failed to create temporary file: {e}", exc_info=True)
-            return JSONResponse(
-                status_code=500,
-                content={"status": "error", "error": f"Failed to create temporary file: {str(e)}"}
-            )
+            raise InvoiceProcessingError(500, {"status": "error", "error": f"Failed to create temporary file: {str(e)}"})
 
-        # Extract text
-        text = extract_text(tmp_path, file.content_type)
+        text = extract_text(tmp_path, content_type)
         if not text:
-            return JSONResponse(
-                status_code=400,
-                content={"status": "error", "error": "No text extracted from file", "raw_text": text[:200] if text else None}
-            )
+            raise InvoiceProcessingError(400, {"status": "error", "error": "No text extracted from file", "raw_text": text[:200] if text else None})
+        return text
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            try:
+                os.unlink(tmp_path)
+                logger.debug(f"Temporary file deleted: {tmp_path}")
+            except Exception as e:
+                logger.error(f"Failed to delete temporary file {tmp_path}: {e}")
 
-        # Prepare and send prompt to Gemini
-        prompt = f"""
+def extract_invoice_fields(text, supplier_id=None):
+    """Extraction stage: ask Gemini for the invoice fields and normalise them."""
+    prompt = f"""
         Extract all invoice bill details into a JSON object with these keys:
         supplier, address, gstin, invoice_no, invoice_date, vehicle_number, token_no, description, qty, rate, amount, empty_weight, load_weight, net_weight, tax, cgst, sgst, round_off, total, amount_in_words
 
@@ -215,185 +206,106 @@ async def extract_invoice(file: UploadFile = File(...), supplier_id: str = Form(
         {text}
         """
 
-        logger.debug("Sending prompt to Gemini model")
-        try:
-            response = model.generate_content(prompt, generation_config={"temperature": 0.1, "max_output_tokens": 2000})
-            logger.debug(f"Full Gemini response: {response.text}")
-        except Exception as e:
-            logger.error(f"Gemini API call failed: {e}", exc_info=True)
-            return JSONResponse(
-                status_code=500,
-                content={"status": "error", "error": f"Gemini API error: {str(e)}"}
-            )
-
-        # Parse JSON response
-        json_text = response.text.strip()
-        if json_text.startswith('```json'):
-            json_text = json_text[7:]
-        if json_text.endswith('```'):
-            json_text = json_text[:-3]
-        try:
-            invoice_data = json.loads(json_text) if json_text else {}
-            invoice_data = convert_to_json_serializable(invoice_data)
-            invoice_data['supplier_id'] = supplier_id
-            logger.debug(f"Parsed invoice data: {invoice_data}")
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error: {e}, Raw response: {json_text}", exc_info=True)
-            return JSONResponse(
-                status_code=400,
-                content={"status": "error", "error": f"Failed to parse JSON: {e}", "raw_response": json_text}
-            )
-
-        if not invoice_data:
-            logger.warning("No valid data extracted from Gemini response")
-            return JSONResponse(
-                status_code=400,
-                content={"status": "error", "error": "No valid data extracted", "raw_response": json_text}
-            )
-
-        # Convert numeric fields (corrected version to handle empty strings)
-        numeric_fields = ['qty', 'rate', 'amount', 'empty_weight', 'load_weight', 'net_weight', 'tax', 'cgst', 'sgst', 'round_off', 'total']
-        for key in numeric_fields:
-            value = invoice_data.get(key, None)
-            if value is not None and str(value).strip() != "":
-                try:
-                    invoice_data[key] = float(re.sub(r'[^\d.-]', '', str(value)))
-                except (ValueError, TypeError) as e:
-                    logger.warning(f"Failed to convert {key} to float: {e}, value: {value}")
-                    invoice_data[key] = None
-            else:
-                invoice_data[key] = None  # Handle empty or invalid value
-
-        # Parse invoice_date
-        if invoice_data.get("invoice_date"):
+    logger.debug("Sending prompt to Gemini model")
+    try:
+        response = model.generate_content(prompt, generation_config={"temperature": 0.1, "max_output_tokens": 2000})
+        logger.debug(f"Full Gemini response: {response.text}")
+    except Exception as e:
+        logger.error(f"Gemini API call failed: {e}", exc_info=True)
+        raise InvoiceProcessingError(500, {"status": "error", "error": f"Gemini API error: {str(e)}"})
+
+    # Parse JSON response
+    json_text = response.text.strip()
+    if json_text.startswith('```json'):
+        json_text = json_text[7:]
+    if json_text.endswith('```'):
+        json_text = json_text[:-3]
+    try:
+        invoice_data = json.loads(json_text) if json_text else {}
+        invoice_data = convert_to_json_serializable(invoice_data)
+        invoice_data['supplier_id'] = supplier_id
+        logger.debug(f"Parsed invoice data: {invoice_data}")
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON parsing error: {e}, Raw response: {json_text}", exc_info=True)
+        raise InvoiceProcessingError(400, {"status": "error", "error": f"Failed to parse JSON: {e}", "raw_response": json_text})
+
+    if not invoice_data:
+        logger.warning("No valid data extracted from Gemini response")
+        raise InvoiceProcessingError(400, {"status": "error", "error": "No valid data extracted", "raw_response": json_text})
+
+    # Convert numeric fields (corrected version to handle empty strings)
+    numeric_fields = ['qty', 'rate', 'amount', 'empty_weight', 'load_weight', 'net_weight', 'tax', 'cgst', 'sgst', 'round_off', 'total']
+    for key in numeric_fields:
+        value = invoice_data.get(key, None)
+        if value is not None and str(value).strip() != "":
             try:
-                invoice_date = datetime.strptime(invoice_data["invoice_date"], "%Y-%m-%d").date()
-                invoice_data["invoice_date"] = invoice_date.isoformat()
-            except ValueError as e:
-                logger.warning(f"Invalid invoice_date format: {e}, value: {invoice_data['invoice_date']}")
-                invoice_data["invoice_date"] = None
+                invoice_data[key] = float(re.sub(r'[^\d.-]', '', str(value)))
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Failed to convert {key} to float: {e}, value: {value}")
+                invoice_data[key] = None
+        else:
+            invoice_data[key] = None  # Handle empty or invalid value
 
-        # Database operations
+    # Parse invoice_date
+    if invoice_data.get("invoice_date"):
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            logger.debug("Database connection established")
-            cursor.execute("SELECT DATABASE()")
-            current_db = cursor.fetchone()[0]
-            logger.debug(f"Connected to database: {current_db}")
+            invoice_date = datetime.strptime(invoice_data["invoice_date"], "%Y-%m-%d").date()
+            invoice_data["invoice_date"] = invoice_date.isoformat()
+        except ValueError as e:
+            logger.warning(f"Invalid invoice_date format: {e}, value: {invoice_data['invoice_date']}")
+            invoice_data["invoice_date"] = None
 
-            # Ensure table exists
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS invoice_items (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    supplier_id VARCHAR(255),
-                    vehicle_number VARCHAR(255),
-                    description TEXT,
-                    quantity DECIMAL(10,2),
-                    rate DECIMAL(10,2),
-                    amount DECIMAL(10,2),
-                    supplier_name VARCHAR(255),
-                    invoice_number VARCHAR(100),
-                    invoice_date DATE,
-                    gstin VARCHAR(15),
-                    address TEXT,
-                    empty_weight DECIMAL(10,2),
-                    load_weight DECIMAL(10,2),
-                    net_weight DECIMAL(10,2),
-                    tax DECIMAL(10,2),
-                    cgst DECIMAL(10,2),
-                    sgst DECIMAL(10,2),
-                    round_off DECIMAL(10,2),
-                    total DECIMAL(10,2),
-                    amount_in_words TEXT,
-                    file_name VARCHAR(255),
-                    file_content LONGBLOB,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-                )
-            """)
-            logger.debug("Table invoice_items ensured to exist")
-
-            cursor.execute("DESCRIBE invoice_items")
-            schema = cursor.fetchall()
-            logger.debug(f"Current invoice_items schema: {schema}")
-
-            # Add missing columns if necessary
-            for column, column_type in [
-                ("supplier_id", "VARCHAR(255)"),
-                ("description", "TEXT"),
-                ("gstin", "VARCHAR(15)"),
-                ("address", "TEXT"),
-                ("empty_weight", "DECIMAL(10,2)"),
-                ("load_weight", "DECIMAL(10,2)"),
-                ("net_weight", "DECIMAL(10,2)"),
-                ("tax", "DECIMAL(10,2)"),
-                ("cgst", "DECIMAL(10,2)"),
-                ("sgst", "DECIMAL(10,2)"),
-                ("round_off", "DECIMAL(10,2)"),
-                ("total", "DECIMAL(10,2)"),
-                ("amount_in_words", "TEXT"),
-                ("file_name", "VARCHAR(255)"),
-                ("file_content", "LONGBLOB")
-            ]:
-                try:
-                    cursor.execute(f"ALTER TABLE invoice_items ADD COLUMN {column} {column_type}")
-                    logger.debug(f"Added {column} column to invoice_items")
-                except mysql.connector.Error as e:
-                    if e.errno != 1060:  # Ignore "Duplicate column name"
-                        logger.error(f"Failed to add {column} column: {e}")
-                        raise
+    return invoice_data
 
-            insert_data = (
-                invoice_data.get("supplier_id", supplier_id),
-                invoice_data.get("vehicle_number", ""),
-                invoice_data.get("description", ""),
-                invoice_data.get("qty"),
-                invoice_data.get("rate"),
-                invoice_data.get("amount"),
-                invoice_data.get("supplier", ""),
-                invoice_data.get("invoice_no", ""),
-                invoice_data.get("invoice_date"),
-                invoice_data.get("gstin", ""),
-                invoice_data.get("address", ""),
-                invoice_data.get("empty_weight"),
-                invoice_data.get("load_weight"),
-                invoice_data.get("net_weight"),
-                invoice_data.get("tax"),
-                invoice_data.get("cgst"),
-                invoice_data.get("sgst"),
-                invoice_data.get("round_off"),
-                invoice_data.get("total"),
-                invoice_data.get("amount_in_words", ""),
-                file.filename,
-                content  # Store file content as BLOB
-            )
-
-            logger.debug(f"Inserting data into invoice_items: {insert_data[:-1]}")  # Exclude file_content for logging
-            cursor.execute("""
-                INSERT INTO invoice_items (
-                    supplier_id, vehicle_number, description, quantity, rate, amount, supplier_name,
-                    invoice_number, invoice_date, gstin, address, empty_weight, load_weight,
-                    net_weight, tax, cgst, sgst, round_off, total, amount_in_words, file_name, file_content
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, insert_data)
-            invoice_id = cursor.lastrowid
-            conn.commit()
-            logger.debug(f"Data inserted into invoice_items successfully, invoice_id: {invoice_id}")
+def store_invoice(invoice_data, supplier_id, filename, content):
+    """DB-insert stage: persist the extracted invoice and return its invoice_id."""
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        logger.debug("Database connection established")
+
+        insert_data = (
+            invoice_data.get("supplier_id", supplier_id),
+            invoice_data.get("vehicle_number", ""),
+            invoice_data.get("description", ""),
+            invoice_data.get("qty"),
+            invoice_data.get("rate"),
+            invoice_data.get("amount"),
+            invoice_data.get("supplier", ""),
+            invoice_data.get("invoice_no", ""),
+            invoice_data.get("invoice_date"),
+            invoice_data.get("gstin", ""),
+            invoice_data.get("address", ""),
+            invoice_data.get("empty_weight"),
+            invoice_data.get("load_weight"),
+            invoice_data.get("net_weight"),
+            invoice_data.get("tax"),
+            invoice_data.get("cgst"),
+            invoice_data.get("sgst"),
+            invoice_data.get("round_off"),
+            invoice_data.get("total"),
+            invoice_data.get("amount_in_words", ""),
+            filename,
+            content  # Store file content as BLOB
+        )
 
-            return {
-                "status": "success",
-                "data": invoice_data,
-                "file_path": unique_filename,  # Return file path for frontend
-                "invoice_id": invoice_id,
-                "message": "Invoice data extracted and stored successfully"
-            }
-        except mysql.connector.Error as db_error:
-            logger.error(f"Database insertion failed: {db_error}", exc_info=True)
-            return JSONResponse(
-                status_code=500,
-                content={"status": "db_error", "error": str(db_error), "invoice_data": invoice_data}
-            )
+        logger.debug(f"Inserting data into invoice_items: {insert_data[:-1]}")  # Exclude file_content for logging
+        cursor.execute("""
+            INSERT INTO invoice_items (
+                supplier_id, vehicle_number, description, quantity, rate, amount, supplier_name,
+                invoice_number, invoice_date, gstin, address, empty_weight, load_weight,
+                net_weight, tax, cgst, sgst, round_off, total, amount_in_words, file_name, file_content
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, insert_data)
+        invoice_id = cursor.lastrowid
+        conn.commit()
+        logger.debug(f"Data inserted into invoice_items successfully, invoice_id: {invoice_id}")
+        return invoice_id
+    except mysql.connector.Error as db_error:
+        logger.error(f"Database insertion failed: {db_error}", exc_info=True)
+        raise InvoiceProcessingError(500, {"status": "db_error", "error": str(db_error), "invoice_data": invoice_data})
     finally:
         if cursor:
             cursor.close()
@@ -401,16 +313,213 @@ async def extract_invoice(file: UploadFile = File(...), supplier_id: str = Form(
         if conn and conn.is_connected():
             conn.close()
             logger.debug("Database connection closed")
-        if tmp_path and os.path.exists(tmp_path):
+
+@app.post("/extract-invoice/")
+async def extract_invoice(file: UploadFile = File(...), supplier_id: str = Form(None)):
+    try:
+        logger.debug(f"Starting processing for file: {file.filename}, content_type: {file.content_type}, supplier_id: {supplier_id}")
+
+        content = await file.read()
+        validate_invoice_upload(content, file.content_type, supplier_id)
+        unique_filename = save_invoice_upload(content, file.filename)
+        text = ocr_invoice(content, file.filename, file.content_type)
+        invoice_data = extract_invoice_fields(text, supplier_id)
+        invoice_id = store_invoice(invoice_data, supplier_id, file.filename, content)
+
+        return {
+            "status": "success",
+            "data": invoice_data,
+            "file_path": unique_filename,  # Return file path for frontend
+            "invoice_id": invoice_id,
+            "message": "Invoice data extracted and stored successfully"
+        }
+    except InvoiceProcessingError as e:
+        return JSONResponse(status_code=e.status_code, content=e.content)
+
+def is_zip_upload(filename, content_type):
+    return content_type in ("application/zip", "application/x-zip-compressed") or filename.lower().endswith(".zip")
+
+def count_batch_items(totals, files=0, size=0):
+    """Add to the batch's running file count and byte total; raises once either limit is exceeded."""
+    totals["files"] += files
+    totals["bytes"] += size
+    if totals["files"] > BATCH_MAX_FILES:
+        raise InvoiceProcessingError(400, {"status": "error", "error": f"Batch exceeds {BATCH_MAX_FILES} file limit"})
+    if totals["bytes"] > BATCH_MAX_BYTES:
+        raise InvoiceProcessingError(
+            400, {"status": "error", "error": f"Batch exceeds {BATCH_MAX_BYTES // (1024 * 1024)}MB limit"}
+        )
+
+def expand_invoice_batch(filename, content_type, content, totals):
+    """Yield (filename, content_type, content, error) for an upload, unpacking zip archives.
+
+    A zip's members are counted against the batch limits from its central
+    directory before any member is inflated; ``error`` is set for items that
+    fail before the pipeline (oversized or unreadable members).
+    """
+    if not is_zip_upload(filename, content_type):
+        count_batch_items(totals, files=1)
+        yield filename, content_type, content, None
+        return
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(content))
+    except zipfile.BadZipFile:
+        count_batch_items(totals, files=1)
+        yield filename, content_type, None, "Invalid zip archive"
+        return
+    with archive:
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir() and not os.path.basename(info.filename).startswith(".")
+        ]
+        # file_size bounds what read() inflates, so this total holds even for a zip bomb
+        count_batch_items(totals, files=len(members),
+                          size=sum(info.file_size for info in members if info.file_size <= MAX_INVOICE_SIZE))
+        for info in members:
+            member_name = os.path.basename(info.filename)
+            member_type = INVOICE_EXTENSION_TYPES.get(os.path.splitext(member_name)[1].lower(), "application/octet-stream")
+            if info.file_size > MAX_INVOICE_SIZE:
+                yield member_name, member_type, None, "File size exceeds 10MB limit"
+                continue
             try:
-                os.unlink(tmp_path)
-                logger.debug(f"Temporary file deleted: {tmp_path}")
+                member = archive.read(info)
+            except (zipfile.BadZipFile, zlib.error, EOFError, RuntimeError, NotImplementedError):
+                yield member_name, member_type, None, f"Invalid zip archive: cannot read {member_name}"
+                continue
+            yield member_name, member_type, member, None
+
+async def run_invoice_pipeline(items, supplier_id, results):
+    """Push items through OCR -> extraction -> DB insert with a bounded worker pool per stage.
+
+    Each finished item (success or failure) is put on ``results``; a final ``None`` marks the end.
+    """
+    ocr_queue = asyncio.Queue()
+    extract_queue = asyncio.Queue(maxsize=BATCH_EXTRACT_WORKERS * 2)
+    db_queue = asyncio.Queue(maxsize=BATCH_DB_WORKERS * 2)
+
+    def failure(item, stage, error):
+        content = error.content if isinstance(error, InvoiceProcessingError) else {"status": "error", "error": str(error)}
+        return {"index": item["index"], "file": item["filename"], "stage": stage, **content}
+
+    async def ocr_worker():
+        while True:
+            item = await ocr_queue.get()
+            if item is None:
+                break
+            try:
+                if item["error"]:
+                    raise InvoiceProcessingError(400, {"status": "error", "error": item["error"]})
+                validate_invoice_upload(item["content"], item["content_type"], supplier_id)
+                item["file_path"] = await asyncio.to_thread(save_invoice_upload, item["content"], item["filename"])
+                item["text"] = await asyncio.to_thread(ocr_invoice, item["content"], item["filename"], item["content_type"])
+                await extract_queue.put(item)
             except Exception as e:
-                logger.error(f"Failed to delete temporary file {tmp_path}: {e}")
+                await results.put(failure(item, "ocr", e))
 
+    async def extract_worker():
+        while True:
+            item = await extract_queue.get()
+            if item is None:
+                break
+            try:
+                item["data"] = await asyncio.to_thread(extract_invoice_fields, item.pop("text"), supplier_id)
+                await db_queue.put(item)
+            except Exception as e:
+                await results.put(failure(item, "extraction", e))
+
+    async def db_worker():
+        while True:
+            item = await db_queue.get()
+            if item is None:
+                break
+            try:
+                invoice_id = await asyncio.to_thread(store_invoice, item["data"], supplier_id, item["filename"], item["content"])
+                await results.put({
+                    "index": item["index"],
+                    "file": item["filename"],
+                    "status": "success",
+                    "data": item["data"],
+                    "file_path": item["file_path"],
+                    "invoice_id": invoice_id
+                })
+            except Exception as e:
+                await results.put(failure(item, "db", e))
+
+    async def run_stage(workers, count, next_queue=None, next_count=0):
+        await asyncio.gather(*(workers() for _ in range(count)))
+        for _ in range(next_count):
+            await next_queue.put(None)
+
+    for item in items:
+        ocr_queue.put_nowait(item)
+    for _ in range(BATCH_OCR_WORKERS):
+        ocr_queue.put_nowait(None)
+
+    await asyncio.gather(
+        run_stage(ocr_worker, BATCH_OCR_WORKERS, extract_queue, BATCH_EXTRACT_WORKERS),
+        run_stage(extract_worker, BATCH_EXTRACT_WORKERS, db_queue, BATCH_DB_WORKERS),
+        run_stage(db_worker, BATCH_DB_WORKERS)
+    )
+    await results.put(None)
+
+@app.post("/extract-invoices/batch")
+async def extract_invoices_batch(files: List[UploadFile] = File(...), supplier_id: str = Form(None)):
+    """Extract many invoices (or a zip of them) and stream one NDJSON result line per file as it completes."""
+    logger.info(f"Received batch extraction request with {len(files)} upload(s), supplier_id: {supplier_id}")
+    if supplier_id and not re.match(r'^[A-Za-z0-9_-]+$', supplier_id):
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "error": "Invalid supplier_id format"}
+        )
+
+    if len(files) > BATCH_MAX_FILES:
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "error": f"Batch exceeds {BATCH_MAX_FILES} file limit ({len(files)} files)"}
+        )
+
+    # Uploads are read up front: the request body is gone once streaming starts.
+    # Reading stops as soon as the running file count or byte total is over its limit.
+    items = []
+    totals = {"files": 0, "bytes": 0}
+    try:
+        for upload in files:
+            content = await upload.read(BATCH_MAX_BYTES - totals["bytes"] + 1)
+            count_batch_items(totals, size=len(content))
+            for filename, content_type, member, error in expand_invoice_batch(
+                    upload.filename, upload.content_type, content, totals):
+                items.append({
+                    "index": len(items), "filename": filename, "content_type": content_type,
+                    "content": member, "error": error
+                })
+    except InvoiceProcessingError as e:
+        return JSONResponse(status_code=e.status_code, content=e.content)
+    if not items:
+        return JSONResponse(status_code=400, content={"status": "error", "error": "No files found in upload"})
+
+    async def stream_results():
+        results = asyncio.Queue()
+        pipeline = asyncio.create_task(run_invoice_pipeline(items, supplier_id, results))
+        succeeded = failed = 0
+        try:
+            while True:
+                result = await results.get()
+                if result is None:
+                    break
+                if result["status"] == "success":
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield json.dumps(result, default=str) + "\n"
+            await pipeline
+        finally:
+            if not pipeline.done():
+                pipeline.cancel()
+        logger.info(f"Batch extraction finished: {succeeded} succeeded, {failed} failed")
+        yield json.dumps({"status": "complete", "total": len(items), "succeeded": succeeded, "failed": failed}) + "\n"
 
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
 
-                
 
 @app.get("/get-invoice-file/{invoice_id}")
 async def get_invoice_file(invoice_id: int):
@@ -464,7 +573,7 @@ async def serve_uploaded_file(filename: str):
     )
 
 @app.get("/invoices")
-async def get_invoices():
+async def get_invoices(request: Request):
     conn = None
     cursor = None
     try:
@@ -472,14 +581,16 @@ async def get_invoices():
         cursor = conn.cursor(dictionary=True)
         logger.debug(f"Database connection established for fetching invoices at {datetime.now().strftime('%Y-%m-%d %H:%M:%S IST')}")
         cursor.execute("SELECT id, supplier_id, vehicle_number, description, quantity, rate, amount, supplier_name, invoice_number, invoice_date, gstin, address, empty_weight, load_weight, net_weight, tax, cgst, sgst, round_off, total, amount_in_words, file_name FROM invoice_items")
-        invoices = cursor.fetchall()
-        logger.debug(f"Fetched {len(invoices)} invoices from invoice_items at {datetime.now().strftime('%Y-%m-%d %H:%M:%S IST')}")
-        invoices = [convert_to_json_serializable({**invoice, "file_path": f"{invoice['file_name']}" if invoice['file_name'] else None}) for invoice in invoices]
-        return {
+        invoices = json_array(
+            iter_cursor(cursor),
+            transform=lambda invoice: convert_to_json_serializable({**invoice, "file_path": f"{invoice['file_name']}" if invoice['file_name'] else None})
+        )
+        response = stream_json_response(request, json_object({
             "status": "success",
-            "data": invoices,
             "message": "Invoices fetched successfully"
-        }
+        }, [("data", invoices)]), cursor, conn)
+        cursor = conn = None  # closed by the stream
+        return response
     except mysql.connector.Error as db_error:
         logger.error(f"Database query failed: {db_error}")
         return JSONResponse(
@@ -505,6 +616,12 @@ def home():
         "message": "Upload JSON. Vouchers will be saved in po_details table (for PURCHASE ORDER) and CSVs (SupplierDetail.csv, po.csv, indent.csv) based on type."
     }
 
+# Tally stock item names shown under a shorter material name in the supplier form
+MATERIAL_NAME_MAPPING = {
+    "Steel Reinforcement Rod 8mm Dia": "Steel",
+    "TMT Bars 12mm": "TMT Bars",
+}
+
 @app.get("/api/vouchers/materials-by-voucher")
 async def get_materials_by_voucher(vch_no: str = Query(...)):
     logger.info(f"Received request to /api/vouchers/materials-by-voucher?vch_no={vch_no}")
@@ -611,11 +728,7 @@ async def get_inventory_details_by_vch_no(vch_no: str = Query(...)):
         if not row:
             raise HTTPException(status_code=404, detail=f"No inventory details found for vch_no: {vch_no}")
 
-        material_mapping = {
-            "Steel Reinforcement Rod 8mm Dia": "Steel",
-            "TMT Bars 12mm": "TMT Bars",
-        }
-        stock_item = material_mapping.get(row["stock_item"], row["stock_item"] or "")
+        stock_item = MATERIAL_NAME_MAPPING.get(row["stock_item"], row["stock_item"] or "")
 
         return {
             "status": "success",
@@ -635,7 +748,7 @@ async def get_inventory_details_by_vch_no(vch_no: str = Query(...)):
             conn.close()
 
 @app.get("/api/po-details")
-async def get_po_details():
+async def get_po_details(request: Request):
     logger.info("Received request to /api/po-details")
     conn = None
     cursor = None
@@ -643,29 +756,29 @@ async def get_po_details():
         conn = get_db_connection()
         if conn is None:
             raise HTTPException(status_code=500, detail="Database connection failed")
-        cursor = conn.cursor(dictionary=True, buffered=True)
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM po_details")
+        total_rows = cursor.fetchone()[0]
+        if not total_rows:
+            return {"status": "success", "headers": [], "data": [], "total_rows": 0}
+
         query = """
             SELECT id, poNumber, material, supplier, quantity, rate, totalAmount, poType, deliveryDate, narration, status, createdAt, updatedAt
             FROM po_details
         """
         cursor.execute(query)
-        rows = cursor.fetchall()
-
-        if not rows:
-            return {"status": "success", "headers": [], "data": [], "total_rows": 0}
 
         headers = [
             "id", "poNumber", "material", "supplier", "quantity", "rate", "totalAmount",
             "poType", "deliveryDate", "narration", "status", "createdAt", "updatedAt"
         ]
-        data = [list(row.values()) for row in rows]
-
-        return {
+        response = stream_json_response(request, json_object({
             "status": "success",
             "headers": headers,
-            "data": data,
-            "total_rows": len(data)
-        }
+            "total_rows": total_rows
+        }, [("data", json_array(iter_cursor(cursor)))]), cursor, conn)
+        cursor = conn = None  # closed by the stream
+        return response
     except Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     finally:
@@ -674,8 +787,27 @@ async def get_po_details():
         if conn and conn.is_connected():
             conn.close()
 
+def parse_csv_filters(filters):
+    """Turn repeated ?filter=column:text parameters into a {column: text} dict."""
+    parsed = {}
+    for item in filters or []:
+        column, sep, text = item.partition(":")
+        if not sep or not column:
+            raise HTTPException(status_code=400, detail=f"Invalid filter (expected column:text): {item}")
+        parsed[column] = text
+    return parsed
+
 @app.get("/get-csv-data/{csv_type}")
-async def get_csv_data(csv_type: str):
+async def get_csv_data(
+    request: Request,
+    csv_type: str,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    columns: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    filter: Optional[List[str]] = Query(None, description="column:text, matched case-insensitively"),
+    sort_by: Optional[str] = None,
+    order: str = Query("asc", description="asc or desc")
+):
     logger.info(f"Received request to /get-csv-data/{csv_type}")
     try:
         csv_file_map = {
@@ -686,20 +818,33 @@ async def get_csv_data(csv_type: str):
         if csv_type not in csv_file_map:
             raise HTTPException(status_code=400, detail="Invalid CSV type")
         csv_path = csv_file_map[csv_type]
-        if not os.path.exists(csv_path):
-            return {"status": "success", "headers": [], "data": [], "total_rows": 0}
-        df = pd.read_csv(csv_path)
-        if df.empty:
+        df = await asyncio.to_thread(segment_store.cached_frame, csv_path)
+        if df is None or df.empty:
             return {"status": "success", "headers": [], "data": [], "total_rows": 0}
-        df = df.replace({float('inf'): None, float('-inf'): None}).fillna("")
-        headers = df.columns.tolist()
-        data = df.values.tolist()
-        return {
+        if order not in ("asc", "desc"):
+            raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+        try:
+            page, matched = segment_store.query_frame(
+                df,
+                columns=[c.strip() for c in columns.split(",") if c.strip()] if columns else None,
+                filters=parse_csv_filters(filter),
+                sort_by=sort_by,
+                descending=order == "desc",
+                offset=offset,
+                limit=limit
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        batches = (page.iloc[i:i + FETCH_SIZE].values.tolist() for i in range(0, len(page), FETCH_SIZE))
+        return stream_json_response(request, json_object({
             "status": "success",
-            "headers": headers,
-            "data": data,
-            "total_rows": len(data)
-        }
+            "headers": page.columns.tolist(),
+            "total_rows": matched,
+            "offset": offset,
+            "limit": limit
+        }, [("data", json_array(batches))]))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading CSV: {str(e)}")
 
@@ -715,7 +860,8 @@ async def download_csv(csv_type: str):
         if csv_type not in csv_file_map:
             raise HTTPException(status_code=400, detail="Invalid CSV type")
         csv_path = csv_file_map[csv_type]
-        if not os.path.exists(csv_path):
+        csv_path = segment_store.materialize(csv_path)
+        if csv_path is None:
             raise HTTPException(status_code=404, detail="CSV file not found")
         return FileResponse(
             path=csv_path,
@@ -737,8 +883,7 @@ async def clear_csv(csv_type: str):
         if csv_type not in csv_file_map:
             raise HTTPException(status_code=400, detail="Invalid CSV type")
         csv_path = csv_file_map[csv_type]
-        if os.path.exists(csv_path):
-            os.remove(csv_path)
+        segment_store.clear(csv_path)
         return {"status": "success", "message": f"{csv_type.upper()} CSV cleared successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error clearing CSV: {str(e)}")
@@ -747,352 +892,37 @@ async def clear_csv(csv_type: str):
 async def upload_json(file: UploadFile = File(...)):
     logger.info("Received request to /upload-json/")
     conn = None
-    cursor = None
-    temp_file_path = None
+    result = None
     try:
-        temp_file_path = f"temp_{uuid.uuid4().hex}.json"
-        with open(temp_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        with open(temp_file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        if "Voucher" not in data:
-            raise HTTPException(status_code=400, detail="'Voucher' key missing in JSON")
-
-        grouped_data = {
-            "SupplierDetail": [],
-            "PURCHASE ORDER": [],
-            "INDENT": []
-        }
-
         conn = get_db_connection()
         if conn is None:
             raise HTTPException(status_code=500, detail="Database connection failed")
-        cursor = conn.cursor(buffered=True)
-
-        insert_voucher_query = '''
-            INSERT INTO vouchers (
-                sal_time, voucher_type_name, vch_no, date, effective_date, narration, state_buyer, cancel, refund,
-                customer_name, mailing_name, customer_web_id, customer_tally_id, billing_address, consignee_name,
-                shipping_address, billing_pin_code, shipping_pin_code, billing_phone_no, shipping_phone_no,
-                total_amount, sales_tally_id, web_id, action, billing_state, billing_country, shipping_state,
-                shipping_country, created_at, updated_at
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        '''
-
-        insert_inventory_query = '''
-            INSERT INTO inventory_entries (
-                voucher_id, stock_item, debitor_credit, billed_qty, actual_qty, rate, discount, amount
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        '''
-
-        insert_batch_query = '''
-            INSERT INTO batch_allocations (
-                inventory_id, batch_name, godown_name, batch_billed_qty, batch_actual_qty, batch_rate, batch_discount, amount
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        '''
-
-        insert_accounting_query = '''
-            INSERT INTO accounting_allocations (
-                inventory_id, ledger_name, amount
-            ) VALUES (%s, %s, %s)
-        '''
-
-        insert_ledger_query = '''
-            INSERT INTO ledger_details (
-                voucher_id, ledger_name, debitor_credit, amount
-            ) VALUES (%s, %s, %s, %s)
-        '''
-
-        insert_bill_wise_query = '''
-            INSERT INTO bill_wise_details (
-                ledger_id, bill_type, bill_amount
-            ) VALUES (%s, %s, %s)
-        '''
-
-        insert_po_query = '''
-            INSERT INTO po_details (
-                poNumber, material, supplier, quantity, rate, totalAmount, poType, deliveryDate, narration, status, createdAt, updatedAt
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        '''
-
-        purchase_order_count = 0
-        errors = []
-
-        for voucher in data.get("Voucher", []):
-            vtype = clean_value(voucher.get("VoucherTypeName", "")).upper()
-            if "SUPPLIERDETAIL" in vtype:
-                key = "SupplierDetail"
-            elif "PURCHASE ORDER" in vtype or "PO" in vtype:
-                key = "PURCHASE ORDER"
-            elif "INDENT" in vtype:
-                key = "INDENT"
-            else:
-                errors.append(f"Unknown VoucherTypeName: {vtype} for VchNo: {voucher.get('VchNo', 'Unknown')}")
-                continue
 
-            base_info = {k: clean_value(v) for k, v in voucher.items() if k not in ["Inventory Entries", "Ledgerdetails"]}
-            try:
-                sal_time = base_info.get('SalTime')
-                voucher_type_name = base_info.get('VoucherTypeName', '')
-                vch_no = base_info.get('VchNo', '')
-                date = parse_date(base_info.get('Date'))
-                effective_date = parse_date(base_info.get('EffectiveDate'))
-                narration = base_info.get('Narration', '')
-                state_buyer = base_info.get('StateBuyer')
-                cancel = base_info.get('Cancel')
-                refund = base_info.get('Refund', '')
-                customer_name = base_info.get('CustomerName', '')
-                mailing_name = base_info.get('MailingName', '')
-                customer_web_id = base_info.get('CustomerWebID')
-                customer_tally_id = base_info.get('CustomerTallyID')
-                billing_address = base_info.get('BillingAddress', '')
-                consignee_name = base_info.get('ConsigneeName', '')
-                shipping_address = base_info.get('ShippingAddress', '')
-                billing_pin_code = base_info.get('BillingPinCode', '')
-                shipping_pin_code = base_info.get('ShippingPinCode', '')
-                billing_phone_no = base_info.get('BillingPhoneNo')
-                shipping_phone_no = base_info.get('ShippingPhoneNo')
-                total_amount = float(base_info.get('TotalAmount', 0.0))
-                sales_tally_id = base_info.get('SalesTallyID', '')
-                web_id = base_info.get('WebID')
-                action = base_info.get('Action')
-                billing_state = base_info.get('BillingState', '')
-                billing_country = base_info.get('BillingCountry', '')
-                shipping_state = base_info.get('ShippingState', '')
-                shipping_country = base_info.get('ShippingCountry', '')
-                created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                updated_at = created_at
-
-                cursor.execute(insert_voucher_query, (
-                    sal_time, voucher_type_name, vch_no, date, effective_date, narration, state_buyer, cancel, refund,
-                    customer_name, mailing_name, customer_web_id, customer_tally_id, billing_address, consignee_name,
-                    shipping_address, billing_pin_code, shipping_pin_code, billing_phone_no, shipping_phone_no,
-                    total_amount, sales_tally_id, web_id, action, billing_state, billing_country, shipping_state,
-                    shipping_country, created_at, updated_at
-                ))
-                voucher_id = cursor.lastrowid
-            except Exception as e:
-                errors.append(f"Error inserting voucher (VchNo: {voucher.get('VchNo', 'Unknown')}): {str(e)}")
-                continue
-
-            if "Inventory Entries" in voucher and voucher["Inventory Entries"]:
-                for inventory in voucher.get("Inventory Entries", []):
-                    inv_info = {k: clean_value(v) for k, v in inventory.items() if k not in ["BatchAllocations", "AccountingAllocations"]}
-                    try:
-                        stock_item = inv_info.get('StockItem', '')
-                        debitor_credit = inv_info.get('DebitorCredit', '')
-                        billed_qty = parse_quantity(inv_info.get('BilledQty'))
-                        actual_qty = parse_quantity(inv_info.get('AcutalQty'))
-                        rate = parse_rate(inv_info.get('Rate'))
-                        discount = float(inv_info.get('Discount', 0))
-                        amount = float(inv_info.get('Amount', 0.0))
-
-                        cursor.execute(insert_inventory_query, (
-                            voucher_id, stock_item, debitor_credit, billed_qty, actual_qty, rate, discount, amount
-                        ))
-                        inventory_id = cursor.lastrowid
-                    except Exception as e:
-                        errors.append(f"Error inserting inventory entry for VchNo: {vch_no}: {str(e)}")
-                        continue
-
-                    if "BatchAllocations" in inventory and inventory["BatchAllocations"]:
-                        for batch in inventory.get("BatchAllocations", []):
-                            batch_info = {k: clean_value(v) for k, v in batch.items()}
-                            combined_row = {**base_info, **inv_info, **batch_info}
-                            grouped_data[key].append(combined_row)
-                            try:
-                                batch_name = batch_info.get('BatchName', '')
-                                godown_name = batch_info.get('GodownName', '')
-                                batch_billed_qty = parse_quantity(batch_info.get('BatchBilledQty'))
-                                batch_actual_qty = parse_quantity(batch_info.get('BatchActualQty'))
-                                batch_rate = parse_rate(batch_info.get('BatchRate'))
-                                batch_discount = float(batch_info.get('BatchDiscount', 0))
-                                batch_amount = float(batch_info.get('Amount', 0.0))
-
-                                cursor.execute(insert_batch_query, (
-                                    inventory_id, batch_name, godown_name, batch_billed_qty, batch_actual_qty,
-                                    batch_rate, batch_discount, batch_amount
-                                ))
-                            except Exception as e:
-                                errors.append(f"Error inserting batch allocation for VchNo: {vch_no}: {str(e)}")
-                                continue
-
-                            if key == "PURCHASE ORDER":
-                                try:
-                                    poNumber = vch_no
-                                    material = stock_item
-                                    supplier = customer_name
-                                    quantity = billed_qty
-                                    rate_val = rate
-                                    totalAmount = amount
-                                    poType = voucher_type_name
-                                    deliveryDate = date
-                                    narration_val = narration
-                                    status = 'Active'
-                                    createdAt = created_at
-                                    updatedAt = created_at
-
-                                    if not poNumber or not deliveryDate:
-                                        raise ValueError(f"Missing required fields: poNumber={poNumber}, deliveryDate={deliveryDate}")
-
-                                    cursor.execute(insert_po_query, (
-                                        poNumber, material, supplier, quantity, rate_val, totalAmount,
-                                        poType, deliveryDate, narration_val, status, createdAt, updatedAt
-                                    ))
-                                    purchase_order_count += 1
-                                except Exception as e:
-                                    errors.append(f"Error inserting purchase order (VchNo: {vch_no}, StockItem: {stock_item}): {str(e)}")
-                                    continue
-                    else:
-                        combined_row = {**base_info, **inv_info}
-                        grouped_data[key].append(combined_row)
-                        if "AccountingAllocations" in inventory and inventory["AccountingAllocations"]:
-                            for accounting in inventory.get("AccountingAllocations", []):
-                                try:
-                                    ledger_name = clean_value(accounting.get('LedgerName', ''))
-                                    acc_amount = float(clean_value(accounting.get('Amount', 0.0)))
-                                    cursor.execute(insert_accounting_query, (
-                                        inventory_id, ledger_name, acc_amount
-                                    ))
-                                except Exception as e:
-                                    errors.append(f"Error inserting accounting allocation for VchNo: {vch_no}: {str(e)}")
-                                    continue
-
-                        if key == "PURCHASE ORDER":
-                            try:
-                                poNumber = vch_no
-                                material = stock_item
-                                supplier = customer_name
-                                quantity = billed_qty
-                                rate_val = rate
-                                totalAmount = amount
-                                poType = voucher_type_name
-                                deliveryDate = date
-                                narration_val = narration
-                                status = 'Active'
-                                createdAt = created_at
-                                updatedAt = created_at
-
-                                if not poNumber or not deliveryDate:
-                                    raise ValueError(f"Missing required fields: poNumber={poNumber}, deliveryDate={deliveryDate}")
-
-                                cursor.execute(insert_po_query, (
-                                    poNumber, material, supplier, quantity, rate_val, totalAmount,
-                                    poType, deliveryDate, narration_val, status, createdAt, updatedAt
-                                ))
-                                purchase_order_count += 1
-                            except Exception as e:
-                                errors.append(f"Error inserting purchase order (VchNo: {vch_no}, StockItem: {stock_item}): {str(e)}")
-                                continue
-            else:
-                combined_row = base_info
-                grouped_data[key].append(combined_row)
-                if key == "PURCHASE ORDER":
-                    try:
-                        poNumber = vch_no
-                        material = ''
-                        supplier = customer_name
-                        quantity = 0.0
-                        rate_val = 0.0
-                        totalAmount = total_amount
-                        poType = voucher_type_name
-                        deliveryDate = date
-                        narration_val = narration
-                        status = 'Active'
-                        createdAt = created_at
-                        updatedAt = created_at
-
-                        if not poNumber or not deliveryDate:
-                            raise ValueError(f"Missing required fields: poNumber={poNumber}, deliveryDate={deliveryDate}")
-
-                        cursor.execute(insert_po_query, (
-                            poNumber, material, supplier, quantity, rate_val, totalAmount,
-                            poType, deliveryDate, narration_val, status, createdAt, updatedAt
-                        ))
-                        purchase_order_count += 1
-                    except Exception as e:
-                        errors.append(f"Error inserting purchase order (VchNo: {vch_no}): {str(e)}")
-                        continue
-
-            if "Ledgerdetails" in voucher and voucher["Ledgerdetails"]:
-                for ledger in voucher.get("Ledgerdetails", []):
-                    try:
-                        ledger_name = clean_value(ledger.get('Ledgername', ''))
-                        debitor_credit = clean_value(ledger.get('DebitorCredit', ''))
-                        amount = float(clean_value(ledger.get('Amount', 0.0)))
-                        cursor.execute(insert_ledger_query, (
-                            voucher_id, ledger_name, debitor_credit, amount
-                        ))
-                        ledger_id = cursor.lastrowid
-                    except Exception as e:
-                        errors.append(f"Error inserting ledger detail for VchNo: {vch_no}: {str(e)}")
-                        continue
-
-                    if "BillWiseDetails" in ledger and ledger["BillWiseDetails"]:
-                        for bill in ledger.get("BillWiseDetails", []):
-                            try:
-                                bill_type = clean_value(bill.get('BillType', ''))
-                                bill_amount = float(clean_value(bill.get('Amount', 0.0)))
-                                cursor.execute(insert_bill_wise_query, (
-                                    ledger_id, bill_type, bill_amount
-                                ))
-                            except Exception as e:
-                                errors.append(f"Error inserting bill wise detail for VchNo: {vch_no}: {str(e)}")
-                                continue
-
-        conn.commit()
-
-        if purchase_order_count > 0:
-            try:
-                cursor.execute(
-                    '''
-                    INSERT INTO system_logs (branch_name, module_name, action_performed, action_by, action_on, ip_address, timestamp)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    ''',
-                    (
-                        'Main Branch', 'Purchase Orders', 'Insert', 'System',
-                        f'Uploaded {purchase_order_count} records to po_details', '127.0.0.1', datetime.now()
-                    )
-                )
-                conn.commit()
-            except Exception as e:
-                errors.append(f"Error inserting system log: {str(e)}")
+        # Vouchers are parsed straight off the upload stream, one at a time.
+        try:
+            result = await asyncio.to_thread(ingest_vouchers, conn, file.file)
+        except VoucherFormatError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ijson.JSONError:
+            raise HTTPException(status_code=400, detail="Invalid JSON format")
 
-        result = []
-        for vtype_key, records in grouped_data.items():
-            if not records:
-                continue
-            try:
-                df_new = pd.DataFrame(records)
-                csv_path = CSV_PATHS[vtype_key]
-                df_new = df_new.astype(str).replace('nan', '')
-                if os.path.exists(csv_path):
-                    df_existing = pd.read_csv(csv_path).astype(str).replace('nan', '')
-                    all_columns = list(set(df_existing.columns.tolist() + df_new.columns.tolist()))
-                    df_existing = df_existing.reindex(columns=all_columns, fill_value="")
-                    df_new = df_new.reindex(columns=all_columns, fill_value="")
-                    combined_df = pd.concat([df_existing, df_new], ignore_index=True)
-                else:
-                    combined_df = df_new
-                combined_df.to_csv(csv_path, index=False)
-                result.append({
-                    "voucher_type": vtype_key,
-                    "file": csv_path,
-                    "rows_added": len(df_new),
-                    "total_rows": combined_df.shape[0]
-                })
-            except Exception as e:
-                errors.append(f"Error saving CSV for {vtype_key}: {str(e)}")
+        if result.voucher_count or result.updated_count:
+            invalidate_voucher_caches()
+        details = save_csv_spools(result, CSV_PATHS)
 
         response = {
             "status": "success",
-            "message": f"File processed: {purchase_order_count} records saved to po_details table, all details saved to respective tables, data also saved to CSVs.",
-            "details": result
+            "message": f"File processed: {result.purchase_order_count} records saved to po_details table, all details saved to respective tables, data also saved to CSVs.",
+            "details": details,
+            "vouchers": {
+                "inserted": result.voucher_count,
+                "updated": result.updated_count,
+                "unchanged": result.unchanged_count
+            }
         }
-        if errors:
-            response["errors"] = errors
-        if not result and purchase_order_count == 0:
+        if result.errors:
+            response["errors"] = result.errors
+        if not details and result.purchase_order_count == 0 and result.unchanged_count == 0:
             raise HTTPException(
                 status_code=400,
                 detail="No valid VoucherType found (SupplierDetail, Purchase Order, Indent) and no purchase orders saved."
@@ -1103,14 +933,187 @@ async def upload_json(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
     finally:
-        if temp_file_path and os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-        if cursor:
-            cursor.close()
+        if result:
+            result.close()
         if conn and conn.is_connected():
             conn.close()
+# Per-vch_no response caches for /grn/ and /api/vouchers/{vch_no}/summary.
+# upload_json and the supplier routes in app.py (via POST /grn/cache/invalidate)
+# drop entries; the TTL bounds staleness if a notification is missed.
+VOUCHER_CACHE_SIZE = 256
+VOUCHER_CACHE_TTL = 300
+grn_cache = OrderedDict()      # vch_no -> (expires_at, response data)
+summary_cache = OrderedDict()  # vch_no -> (expires_at, summary); ("prefix", text, limit) -> matches
+
+def cache_get(cache, key):
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    if entry[0] < time.monotonic():
+        del cache[key]
+        return None
+    cache.move_to_end(key)
+    return entry[1]
+
+def cache_put(cache, key, value):
+    cache[key] = (time.monotonic() + VOUCHER_CACHE_TTL, value)
+    cache.move_to_end(key)
+    while len(cache) > VOUCHER_CACHE_SIZE:
+        cache.popitem(last=False)
+
+def invalidate_voucher_caches(vch_no=None):
+    """Drop cached responses for vch_no, or every entry when vch_no is None.
+
+    Prefix-search results are dropped with it for every prefix of vch_no,
+    since those are the searches whose matches it can appear in.
+    """
+    if vch_no is None:
+        grn_cache.clear()
+        summary_cache.clear()
+    else:
+        grn_cache.pop(vch_no, None)
+        summary_cache.pop(vch_no, None)
+        for key in [k for k in summary_cache if isinstance(k, tuple) and vch_no.startswith(k[1])]:
+            del summary_cache[key]
+
+def fetch_grn_voucher(cursor, vch_no):
+    """Rebuild the Tally-style voucher for vch_no with a fixed number of queries; None if absent."""
+    cursor.execute("""
+        SELECT id, sal_time, voucher_type_name, vch_no, date, effective_date, narration, state_buyer, 
+            cancel, refund, customer_name, mailing_name, customer_web_id, customer_tally_id, 
+            billing_address, consignee_name, shipping_address, billing_pin_code, shipping_pin_code, 
+            billing_phone_no, shipping_phone_no, total_amount, sales_tally_id, web_id, action, 
+            billing_state, billing_country, shipping_state, shipping_country
+        FROM vouchers 
+        WHERE vch_no = %s
+        ORDER BY id
+        LIMIT 1
+    """, (vch_no,))
+    voucher = cursor.fetchone()
+    if not voucher:
+        return None
+    voucher_id = voucher['id']
+
+    cursor.execute("""
+        SELECT id, stock_item, debitor_credit, billed_qty, actual_qty, rate, discount, amount
+        FROM inventory_entries
+        WHERE voucher_id = %s
+        ORDER BY id
+    """, (voucher_id,))
+    inventory_entries = cursor.fetchall()
+
+    # Batch allocations come from the supplier rows for this PO and are the
+    # same for every inventory entry, so they are fetched once.
+    cursor.execute("""
+        SELECT receivedQty, poRate, supplierBillRate
+        FROM supplier
+        WHERE poNumber = %s
+    """, (vch_no,))
+    batches = [{
+        "batch_name": "Primary Batch",
+        "godown_name": "Thulasi Readymix",
+        "batch_billed_qty": f"{float(s['receivedQty']):.2f} cft" if s['receivedQty'] is not None else None,
+        "batch_actual_qty": f"{float(s['receivedQty']):.2f} cft" if s['receivedQty'] is not None else None,
+        "batch_rate": f"{float(s['poRate']):.2f}/cft" if s['poRate'] is not None else None,
+        "batch_discount": 0,
+        "amount": float(s['supplierBillRate']) if s['supplierBillRate'] is not None else None
+    } for s in cursor.fetchall()]
+
+    cursor.execute("""
+        SELECT aa.inventory_id, aa.ledger_name, aa.amount
+        FROM accounting_allocations aa
+        JOIN inventory_entries ie ON ie.id = aa.inventory_id
+        WHERE ie.voucher_id = %s
+        ORDER BY aa.id
+    """, (voucher_id,))
+    accountings = {}
+    for a in cursor.fetchall():
+        accountings.setdefault(a['inventory_id'], []).append({
+            "ledger_name": a['ledger_name'],
+            "amount": float(a['amount']) if a['amount'] is not None else None
+        })
+
+    inventory_data = [{
+        "StockItem": entry['stock_item'],
+        "DebitorCredit": entry['debitor_credit'],
+        "BilledQty": f"{float(entry['billed_qty']):.2f} cft" if entry['billed_qty'] is not None else None,
+        "AcutalQty": f"{float(entry['actual_qty']):.2f} cft" if entry['actual_qty'] is not None else None,
+        "Rate": f"{float(entry['rate']):.2f}/cft" if entry['rate'] is not None else None,
+        "Discount": float(entry['discount']) if entry['discount'] is not None else None,
+        "Amount": float(entry['amount']) if entry['amount'] is not None else None,
+        "BatchAllocations": batches,
+        "AccountingAllocations": accountings.get(entry['id'], [])
+    } for entry in inventory_entries]
+
+    cursor.execute("""
+        SELECT id, ledger_name, debitor_credit, amount
+        FROM ledger_details
+        WHERE voucher_id = %s
+        ORDER BY id
+    """, (voucher_id,))
+    ledger_rows = cursor.fetchall()
+
+    cursor.execute("""
+        SELECT bw.ledger_id, bw.bill_type, bw.bill_amount
+        FROM bill_wise_details bw
+        JOIN ledger_details ld ON ld.id = bw.ledger_id
+        WHERE ld.voucher_id = %s
+        ORDER BY bw.id
+    """, (voucher_id,))
+    bill_wise = {}
+    for bw in cursor.fetchall():
+        bill_wise.setdefault(bw['ledger_id'], []).append({
+            "bill_type": bw['bill_type'],
+            "bill_amount": float(bw['bill_amount']) if bw['bill_amount'] is not None else None
+        })
+
+    ledger_details = [{
+        "Ledgername": ledger['ledger_name'],
+        "DebitorCredit": ledger['debitor_credit'],
+        "Amount": float(ledger['amount']) if ledger['amount'] is not None else None,
+        "BillWiseDetails": bill_wise.get(ledger['id'], [])
+    } for ledger in ledger_rows]
+
+    return {
+        "Voucher": [{
+            "SalTime": voucher['sal_time'],
+            "VoucherTypeName": voucher['voucher_type_name'],
+            "VchNo": voucher['vch_no'],
+            "Date": str(voucher['date']) if voucher['date'] else None,
+            "EffectiveDate": str(voucher['effective_date']) if voucher['effective_date'] else None,
+            "Narration": voucher['narration'],
+            "StateBuyer": voucher['state_buyer'],
+            "Cancel": voucher['cancel'],
+            "Refund": voucher['refund'],
+            "CustomerName": voucher['customer_name'],
+            "MailingName": voucher['mailing_name'],
+            "CustomerWebID": voucher['customer_web_id'],
+            "CustomerTallyID": voucher['customer_tally_id'],
+            "BillingAddress": voucher['billing_address'],
+            "ConsigneeName": voucher['consignee_name'],
+            "ShippingAddress": voucher['shipping_address'],
+            "BillingPinCode": voucher['billing_pin_code'],
+            "ShippingPinCode": voucher['shipping_pin_code'],
+            "BillingPhoneNo": voucher['billing_phone_no'],
+            "ShippingPhoneNo": voucher['shipping_phone_no'],
+            "TotalAmount": float(voucher['total_amount']) if voucher['total_amount'] is not None else None,
+            "SalesTallyID": voucher['sales_tally_id'],
+            "WebID": voucher['web_id'],
+            "Action": voucher['action'],
+            "BillingState": voucher['billing_state'],
+            "BillingCountry": voucher['billing_country'],
+            "ShippingState": voucher['shipping_state'],
+            "ShippingCountry": voucher['shipping_country'],
+            "Inventory Entries": inventory_data,
+            "Ledgerdetails": ledger_details
+        }]
+    }
+
 @app.get("/grn/")
 async def get_grn_data(vch_no: str = Query(...)):
+    cached = cache_get(grn_cache, vch_no)
+    if cached is not None:
+        return JSONResponse(content={"status": "success", "data": cached})
     conn = None
     cursor = None
     try:
@@ -1119,147 +1122,10 @@ async def get_grn_data(vch_no: str = Query(...)):
             raise HTTPException(status_code=500, detail="Database connection failed")
         
         cursor = conn.cursor(dictionary=True)
-
-        # Fetch voucher details
-        voucher_query = """
-            SELECT id, sal_time, voucher_type_name, vch_no, date, effective_date, narration, state_buyer, 
-                cancel, refund, customer_name, mailing_name, customer_web_id, customer_tally_id, 
-                billing_address, consignee_name, shipping_address, billing_pin_code, shipping_pin_code, 
-                billing_phone_no, shipping_phone_no, total_amount, sales_tally_id, web_id, action, 
-                billing_state, billing_country, shipping_state, shipping_country
-            FROM vouchers 
-            WHERE vch_no = %s
-        """
-        cursor.execute(voucher_query, (vch_no,))
-        voucher = cursor.fetchone()
-        if not voucher:
+        response = fetch_grn_voucher(cursor, vch_no)
+        if response is None:
             raise HTTPException(status_code=404, detail=f"No voucher found for vch_no: {vch_no}")
-
-        voucher_id = voucher['id']
-
-        # Inventory entries
-        inventory_query = """
-            SELECT id, stock_item, debitor_credit, billed_qty, actual_qty, rate, discount, amount
-            FROM inventory_entries
-            WHERE voucher_id = %s
-        """
-        cursor.execute(inventory_query, (voucher_id,))
-        inventory_entries = cursor.fetchall()
-
-        inventory_data = []
-        for entry in inventory_entries:
-            entry_id = entry['id']
-
-            # Fetch supplier data for BatchAllocations
-            supplier_query = """
-                SELECT receivedQty, poRate, supplierBillRate
-                FROM supplier
-                WHERE poNumber = %s
-            """
-            cursor.execute(supplier_query, (vch_no,))
-            supplier_rows = cursor.fetchall()
-            batches = [{
-                "batch_name": "Primary Batch",
-                "godown_name": "Thulasi Readymix",
-                "batch_billed_qty": f"{float(s['receivedQty']):.2f} cft" if s['receivedQty'] is not None else None,
-                "batch_actual_qty": f"{float(s['receivedQty']):.2f} cft" if s['receivedQty'] is not None else None,
-                "batch_rate": f"{float(s['poRate']):.2f}/cft" if s['poRate'] is not None else None,
-                "batch_discount": 0,
-                "amount": float(s['supplierBillRate']) if s['supplierBillRate'] is not None else None
-            } for s in supplier_rows]
-
-            # Accounting allocations
-            accounting_query = """
-                SELECT ledger_name, amount
-                FROM accounting_allocations
-                WHERE inventory_id = %s
-            """
-            cursor.execute(accounting_query, (entry_id,))
-            accounting_rows = cursor.fetchall()
-            accountings = [{
-                "ledger_name": a['ledger_name'],
-                "amount": float(a['amount']) if a['amount'] is not None else None
-            } for a in accounting_rows]
-
-            inventory_data.append({
-                "StockItem": entry['stock_item'],
-                "DebitorCredit": entry['debitor_credit'],
-                "BilledQty": f"{float(entry['billed_qty']):.2f} cft" if entry['billed_qty'] is not None else None,
-                "AcutalQty": f"{float(entry['actual_qty']):.2f} cft" if entry['actual_qty'] is not None else None,
-                "Rate": f"{float(entry['rate']):.2f}/cft" if entry['rate'] is not None else None,
-                "Discount": float(entry['discount']) if entry['discount'] is not None else None,
-                "Amount": float(entry['amount']) if entry['amount'] is not None else None,
-                "BatchAllocations": batches,
-                "AccountingAllocations": accountings
-            })
-
-        # Ledger details
-        ledger_query = """
-            SELECT id, ledger_name, debitor_credit, amount
-            FROM ledger_details
-            WHERE voucher_id = %s
-        """
-        cursor.execute(ledger_query, (voucher_id,))
-        ledger_rows = cursor.fetchall()
-
-        ledger_details = []
-        for ledger in ledger_rows:
-            ledger_id = ledger['id']
-
-            bill_wise_query = """
-                SELECT bill_type, bill_amount
-                FROM bill_wise_details
-                WHERE ledger_id = %s
-            """
-            cursor.execute(bill_wise_query, (ledger_id,))
-            bill_rows = cursor.fetchall()
-            bill_wise_list = [{
-                "bill_type": bw['bill_type'],
-                "bill_amount": float(bw['bill_amount']) if bw['bill_amount'] is not None else None
-            } for bw in bill_rows]
-
-            ledger_details.append({
-                "Ledgername": ledger['ledger_name'],
-                "DebitorCredit": ledger['debitor_credit'],
-                "Amount": float(ledger['amount']) if ledger['amount'] is not None else None,
-                "BillWiseDetails": bill_wise_list
-            })
-
-        # Prepare final response
-        response = {
-            "Voucher": [{
-                "SalTime": voucher['sal_time'],
-                "VoucherTypeName": voucher['voucher_type_name'],
-                "VchNo": voucher['vch_no'],
-                "Date": str(voucher['date']) if voucher['date'] else None,
-                "EffectiveDate": str(voucher['effective_date']) if voucher['effective_date'] else None,
-                "Narration": voucher['narration'],
-                "StateBuyer": voucher['state_buyer'],
-                "Cancel": voucher['cancel'],
-                "Refund": voucher['refund'],
-                "CustomerName": voucher['customer_name'],
-                "MailingName": voucher['mailing_name'],
-                "CustomerWebID": voucher['customer_web_id'],
-                "CustomerTallyID": voucher['customer_tally_id'],
-                "BillingAddress": voucher['billing_address'],
-                "ConsigneeName": voucher['consignee_name'],
-                "ShippingAddress": voucher['shipping_address'],
-                "BillingPinCode": voucher['billing_pin_code'],
-                "ShippingPinCode": voucher['shipping_pin_code'],
-                "BillingPhoneNo": voucher['billing_phone_no'],
-                "ShippingPhoneNo": voucher['shipping_phone_no'],
-                "TotalAmount": float(voucher['total_amount']) if voucher['total_amount'] is not None else None,
-                "SalesTallyID": voucher['sales_tally_id'],
-                "WebID": voucher['web_id'],
-                "Action": voucher['action'],
-                "BillingState": voucher['billing_state'],
-                "BillingCountry": voucher['billing_country'],
-                "ShippingState": voucher['shipping_state'],
-                "ShippingCountry": voucher['shipping_country'],
-                "Inventory Entries": inventory_data,
-                "Ledgerdetails": ledger_details
-            }]
-        }
+        cache_put(grn_cache, vch_no, response)
 
         return JSONResponse(content={"status": "success", "data": response})
 
@@ -1276,6 +1142,113 @@ async def get_grn_data(vch_no: str = Query(...)):
             cursor.close()
         if conn:
             conn.close()
+
+@app.post("/grn/cache/invalidate")
+async def invalidate_grn(vch_no: Optional[str] = Query(None)):
+    """Called by the supplier routes in app.py after they write rows for a PO."""
+    invalidate_voucher_caches(vch_no)
+    return {"status": "success", "invalidated": vch_no or "all"}
+
+VOUCHER_SEARCH_LIMIT = 10
+
+def fetch_voucher_summary(cursor, vch_no):
+    """Customer, materials, first inventory line and PO balance for vch_no; None if absent."""
+    cursor.execute("""
+        SELECT customer_name
+        FROM vouchers
+        WHERE vch_no = %s
+        ORDER BY id
+        LIMIT 1
+    """, (vch_no,))
+    voucher = cursor.fetchone()
+    if not voucher:
+        return None
+
+    cursor.execute("""
+        SELECT ie.stock_item, ie.billed_qty, ie.actual_qty, ie.rate
+        FROM inventory_entries ie
+        JOIN vouchers v ON ie.voucher_id = v.id
+        WHERE v.vch_no = %s
+        ORDER BY ie.id
+    """, (vch_no,))
+    entries = cursor.fetchall()
+
+    # Every quantity comes from the one po_balance ledger row
+    balance = get_po_balance(cursor, vch_no) or {"ordered_qty": 0.0, "received_qty": 0.0, "billed_qty": 0.0}
+
+    first = entries[0] if entries else None
+    ordered_qty = balance["ordered_qty"]
+    billed_qty = balance["billed_qty"]
+    return {
+        "vch_no": vch_no,
+        "customer_name": voucher["customer_name"] or "",
+        "materials": sorted({e["stock_item"] for e in entries if e["stock_item"]}),
+        "inventory": {
+            "stock_item": MATERIAL_NAME_MAPPING.get(first["stock_item"], first["stock_item"] or ""),
+            "actual_qty": float(first["actual_qty"]) if first["actual_qty"] is not None else 0.0,
+            "rate": float(first["rate"]) if first["rate"] is not None else 0.0
+        } if first else None,
+        "po_balance": {
+            "ordered_qty": ordered_qty,
+            "received_qty": balance["received_qty"],
+            "billed_qty": billed_qty,
+            "balance_qty": ordered_qty - billed_qty
+        }
+    }
+
+def search_vouchers(cursor, prefix, limit):
+    """vch_no/customer pairs whose vch_no starts with prefix, served from the vch_no index."""
+    cursor.execute("""
+        SELECT vch_no, MIN(customer_name) AS customer_name
+        FROM vouchers
+        WHERE vch_no LIKE %s
+        GROUP BY vch_no
+        ORDER BY vch_no
+        LIMIT %s
+    """, (like_prefix(prefix), limit))
+    return [{"vch_no": row["vch_no"], "customer_name": row["customer_name"]} for row in cursor.fetchall()]
+
+# Tally voucher numbers often contain "/" (PO/2024/001); the server decodes %2F
+# before routing, so the segment has to match across slashes.
+@app.get("/api/vouchers/{vch_no:path}/summary")
+async def get_voucher_summary(
+    vch_no: str,
+    mode: str = Query("exact", description="exact, or prefix for type-ahead matches"),
+    limit: int = Query(VOUCHER_SEARCH_LIMIT, ge=1, le=50)
+):
+    """Everything the supplier form autofills from a PO number, in one round trip."""
+    if mode not in ("exact", "prefix"):
+        raise HTTPException(status_code=400, detail="mode must be 'exact' or 'prefix'")
+    key = vch_no if mode == "exact" else ("prefix", vch_no, limit)
+    cached = cache_get(summary_cache, key)
+    if cached is not None:
+        return cached
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_connection()
+        if conn is None:
+            raise HTTPException(status_code=500, detail="Database connection failed")
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        if mode == "prefix":
+            response = {"status": "success", "prefix": vch_no, "matches": search_vouchers(cursor, vch_no, limit)}
+        else:
+            summary = fetch_voucher_summary(cursor, vch_no)
+            if summary is None:
+                raise HTTPException(status_code=404, detail=f"No voucher found for vch_no: {vch_no}")
+            response = {"status": "success", **summary}
+        cache_put(summary_cache, key, response)
+        return response
+    except HTTPException as e:
+        raise e
+    except Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
 @app.post("/extract-vehicle/")
 async def extract_vehicle(file: UploadFile = File(...)):
     tmp_path = None
@@ -1355,38 +1328,6 @@ async def extract_vehicle(file: UploadFile = File(...)):
             cursor = conn.cursor()
             logger.debug("Database connection established")
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS invoice_items (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    supplier_id VARCHAR(255),
-                    vehicle_number VARCHAR(255),
-                    description TEXT,
-                    quantity DECIMAL(10,2),
-                    rate DECIMAL(10,2),
-                    amount DECIMAL(10,2),
-                    supplier_name VARCHAR(255),
-                    invoice_number VARCHAR(100),
-                    invoice_date DATE,
-                    gstin VARCHAR(15),
-                    address TEXT,
-                    empty_weight DECIMAL(10,2),
-                    load_weight DECIMAL(10,2),
-                    net_weight DECIMAL(10,2),
-                    tax DECIMAL(10,2),
-                    cgst DECIMAL(10,2),
-                    sgst DECIMAL(10,2),
-                    round_off DECIMAL(10,2),
-                    total DECIMAL(10,2),
-                    amount_in_words TEXT,
-                    file_name VARCHAR(255),
-                    file_content LONGBLOB,
-                    status VARCHAR(50),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-                )
-            """)
-            logger.debug("Table invoice_items ensured to exist")
-
             insert_data = (
                 None,  # supplier_id
                 vehicle_no,
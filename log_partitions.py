@@ -0,0 +1,117 @@
+"""Monthly partition maintenance for system_logs.
+
+system_logs is RANGE COLUMNS partitioned on timestamp, one partition per
+calendar month (p202610 holds October 2026) plus a catch-all pmax.  The
+maintenance pass keeps FUTURE_PARTITIONS months ahead split out of pmax
+and drops partitions older than LOG_RETENTION_MONTHS, which discards a
+month of logs without a row-by-row DELETE.  app.py runs it at start-up and
+then daily; it can also be run by hand:
+
+    python log_partitions.py
+"""
+import re
+import threading
+from datetime import date
+
+from db_config import get_db_connection
+
+LOG_TABLE = "system_logs"
+LOG_RETENTION_MONTHS = 12
+FUTURE_PARTITIONS = 2
+MAINTENANCE_INTERVAL = 24 * 3600
+
+PARTITION_NAME = re.compile(r"^p(\d{4})(\d{2})$")
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month):
+    return f"p{month.year:04d}{month.month:02d}"
+
+def partition_definition(month):
+    """DDL for the partition holding ``month``; its bound is the next month's first day."""
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN ('{add_months(month, 1).isoformat()}')"
+
+def monthly_partitions(cursor):
+    """First days of the months that have their own partition, oldest first."""
+    cursor.execute('''
+        SELECT PARTITION_NAME
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+    ''', (LOG_TABLE,))
+    months = []
+    for (name,) in cursor.fetchall():
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+def ensure_future_partitions(cursor, today=None, ahead=FUTURE_PARTITIONS):
+    """Split months up to ``ahead`` past the current one out of pmax; returns the names added."""
+    current = month_start(today or date.today())
+    existing = monthly_partitions(cursor)
+    start = add_months(existing[-1], 1) if existing else current
+    months = []
+    month = start
+    while month <= add_months(current, ahead):
+        months.append(month)
+        month = add_months(month, 1)
+    if not months:
+        return []
+    definitions = ", ".join(partition_definition(m) for m in months)
+    cursor.execute(f'''
+        ALTER TABLE {LOG_TABLE} REORGANIZE PARTITION pmax INTO (
+            {definitions},
+            PARTITION pmax VALUES LESS THAN (MAXVALUE)
+        )
+    ''')
+    return [partition_name(m) for m in months]
+
+def drop_expired_partitions(cursor, today=None, retention_months=LOG_RETENTION_MONTHS):
+    """Drop monthly partitions entirely older than the retention window; returns their names."""
+    cutoff = add_months(month_start(today or date.today()), -retention_months)
+    expired = [partition_name(m) for m in monthly_partitions(cursor) if add_months(m, 1) <= cutoff]
+    if expired:
+        cursor.execute(f"ALTER TABLE {LOG_TABLE} DROP PARTITION {', '.join(expired)}")
+    return expired
+
+def truncate_logs(cursor):
+    """Empty every partition; instant, unlike DELETE, and leaves no undo behind."""
+    cursor.execute(f"ALTER TABLE {LOG_TABLE} TRUNCATE PARTITION ALL")
+
+def maintain():
+    """One maintenance pass on its own connection; returns (added, dropped) partition names."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        added = ensure_future_partitions(cursor)
+        dropped = drop_expired_partitions(cursor)
+        return added, dropped
+    finally:
+        cursor.close()
+        conn.close()
+
+def _run_periodically(stop):
+    while True:
+        try:
+            added, dropped = maintain()
+            if added or dropped:
+                print(f"system_logs partitions added: {added}, dropped: {dropped}")
+        except Exception as e:
+            print(f"Error maintaining system_logs partitions: {str(e)}")
+        if stop.wait(MAINTENANCE_INTERVAL):
+            return
+
+def start_maintenance():
+    """Run maintain() now and then every MAINTENANCE_INTERVAL on a daemon thread."""
+    stop = threading.Event()
+    threading.Thread(target=_run_periodically, args=(stop,), name="log-partitions", daemon=True).start()
+    return stop
+
+if __name__ == "__main__":
+    added, dropped = maintain()
+    print(f"Added partitions: {added or 'none'}; dropped partitions: {dropped or 'none'}")
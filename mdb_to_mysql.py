@@ -4,6 +4,8 @@ import mysql.connector
 import pandas as pd
 import pyodbc
 import pyodbc
+import stock_ledger
+from weighbridge_timestamps import row_timestamps
 print(pyodbc.drivers())
 
 # --- CONFIG ---
@@ -61,7 +63,11 @@ def create_mysql_table(columns):
     create_stmt = f"""
     CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
         id INT AUTO_INCREMENT PRIMARY KEY,
-        {col_defs}
+        {col_defs},
+        event_ts DATETIME NULL,
+        load_ts DATETIME NULL,
+        empty_ts DATETIME NULL,
+        INDEX idx_weighbridge_event_ts (event_ts)
     )
     """
     cursor.execute(create_stmt)
@@ -74,14 +80,21 @@ def insert_into_mysql(df):
     conn = get_connection()
     cursor = conn.cursor()
 
-    cols = ", ".join([f"`{c}`" for c in df.columns])
-    placeholders = ", ".join(["%s"] * len(df.columns))
+    # event_ts/load_ts/empty_ts combine each split Date + Time pair once, here
+    cols = ", ".join([f"`{c}`" for c in df.columns] + ["event_ts", "load_ts", "empty_ts"])
+    placeholders = ", ".join(["%s"] * (len(df.columns) + 3))
     insert_stmt = f"INSERT INTO {TABLE_NAME} ({cols}) VALUES ({placeholders})"
 
     # Insert in batches for speed
-    data = [tuple(row.astype(str)) for _, row in df.iterrows()]
+    data = [tuple(row.astype(str)) + row_timestamps(row) for _, row in df.iterrows()]
     cursor.executemany(insert_stmt, data)
 
+    # Add the file's net weight per material to the stock ledger in the same transaction
+    if "Materialname" in df.columns and "NetWeight" in df.columns:
+        net_weights = pd.to_numeric(df["NetWeight"], errors="coerce").fillna(0).groupby(df["Materialname"]).sum()
+        for material, net_weight in net_weights.items():
+            stock_ledger.adjust(cursor, material, weighbridge_qty=net_weight)
+
     conn.commit()
     cursor.close()
     conn.close()
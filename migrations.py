@@ -0,0 +1,1029 @@
+"""Versioned schema migrations shared by app.py and extractor1.py.
+
+Each migration runs exactly once per database and is recorded in the
+schema_version table.  Services call migrate() at startup so request
+handlers never issue DDL themselves.  New migrations are appended with the
+next version number; never edit or reorder one that has already shipped.
+"""
+from datetime import date
+
+import mysql.connector
+from db_config import get_db_connection
+
+MIGRATION_LOCK_NAME = "construction_schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 60
+
+MIGRATIONS = []
+
+def migration(version, description):
+    """Register a migration step; steps receive an open cursor."""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        return func
+    return register
+
+def add_column(cursor, table, column, column_type):
+    try:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+    except mysql.connector.Error as e:
+        if e.errno != 1060:  # Duplicate column name
+            raise
+
+def add_index(cursor, table, index_name, columns, unique=False):
+    try:
+        cursor.execute(f"ALTER TABLE {table} ADD {'UNIQUE ' if unique else ''}INDEX {index_name} ({columns})")
+    except mysql.connector.Error as e:
+        if e.errno != 1061:  # Duplicate key name
+            raise
+
+@migration(1, "Baseline tables")
+def create_baseline_tables(cursor):
+    
+    # Create employees table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS employees (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            full_name VARCHAR(255) NOT NULL,
+            date_of_birth DATE,
+            gender ENUM('Male', 'Female', 'Other'),
+            phone_number VARCHAR(15),
+            email_id VARCHAR(255) UNIQUE,
+            address TEXT,
+            aadhar_number VARCHAR(12),
+            pan_number VARCHAR(10),
+            joining_date DATE,
+            designation VARCHAR(100),
+            department VARCHAR(100),
+            emergency_contact VARCHAR(15),
+            status ENUM('Active', 'Inactive') DEFAULT 'Active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+        # Create user_signin table
+    cursor.execute('''
+   CREATE TABLE IF NOT EXISTS user_signin (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    email VARCHAR(255) UNIQUE NOT NULL,
+    phone_number VARCHAR(15),
+    status ENUM('Active', 'Inactive') DEFAULT 'Active',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+)
+''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS purchase_orders (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    voucher_number VARCHAR(50) NOT NULL,
+    date DATE NOT NULL,
+    effective_date DATE,
+    narration TEXT,
+    state_buyer VARCHAR(100),
+    refund_status VARCHAR(20),
+    total_amount DECIMAL(15,2) DEFAULT 0.00,
+    sales_tally_id VARCHAR(50),
+    cancel_status VARCHAR(20),
+    customer_name VARCHAR(100),
+    customer_web_id VARCHAR(50),
+    customer_tally_id VARCHAR(50),
+    billing_address TEXT,
+    consignee_name VARCHAR(100),
+    shipping_address TEXT,
+    billing_pin_code VARCHAR(20),
+    shipping_pin_code VARCHAR(20),
+    billing_phone_no VARCHAR(20),
+    shipping_phone_no VARCHAR(20),
+    web_id VARCHAR(50),
+    action VARCHAR(50),
+    vehicle_number VARCHAR(20),
+    empty_weight DECIMAL(10,2),
+    loaded_weight DECIMAL(10,2),
+    net_weight DECIMAL(10,2),
+    empty_weight_date DATETIME,
+    empty_weight_time TIME,
+    load_weight_date DATETIME,
+    load_weight_time TIME,
+    pending BOOLEAN DEFAULT FALSE,
+    closed BOOLEAN DEFAULT FALSE,
+    exported BOOLEAN DEFAULT FALSE,
+    shift VARCHAR(5),
+    inventory_entries JSON,
+    ledger_details JSON,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+''')
+    # Create branches table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS branches (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            branch_name VARCHAR(255) NOT NULL,
+            address TEXT,
+            contact_number VARCHAR(15),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Create roles table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS roles (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            role_name VARCHAR(100) NOT NULL,
+            permissions JSON,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Create employee_login table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS employee_login (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            employee_id INT,
+            branch_id INT,
+            login_id VARCHAR(50) UNIQUE,
+            password VARCHAR(255),
+            role_id INT,
+            status ENUM('Active', 'Inactive') DEFAULT 'Active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (employee_id) REFERENCES employees(id),
+            FOREIGN KEY (branch_id) REFERENCES branches(id),
+            FOREIGN KEY (role_id) REFERENCES roles(id)
+        )
+    ''')
+    
+    # Create login table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS login (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            employee_id INT,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            role VARCHAR(50) NOT NULL,
+            branch_id INT,
+            status ENUM('Active', 'Inactive') DEFAULT 'Active',
+            last_login DATETIME,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Create projects table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS projects (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            project_name VARCHAR(255) NOT NULL,
+            address TEXT,
+            latitude DECIMAL(10, 8),
+            longitude DECIMAL(11, 8),
+            status ENUM('Active', 'Inactive', 'Completed') DEFAULT 'Active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Create po_details table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS po_details (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            poNumber VARCHAR(50) NOT NULL,
+            material VARCHAR(100) NOT NULL,
+            supplier VARCHAR(100) NOT NULL,
+            quantity DECIMAL(10,2) NOT NULL,
+            rate DECIMAL(10,2) NOT NULL,
+            totalAmount DECIMAL(15,2) NOT NULL,
+            poType VARCHAR(50) NOT NULL,
+            deliveryDate DATE NOT NULL,
+            narration TEXT,
+            status VARCHAR(20) DEFAULT 'Active',
+            createdAt DATETIME NOT NULL,
+            updatedAt DATETIME NOT NULL
+        )
+    ''')
+        # Create vouchers table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vouchers (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            sal_time VARCHAR(255),
+            voucher_type_name VARCHAR(255),
+            vch_no VARCHAR(255),
+            date DATE,
+            effective_date DATE,
+            narration TEXT,
+            state_buyer VARCHAR(255),
+            cancel VARCHAR(255),
+            refund VARCHAR(255),
+            customer_name VARCHAR(255),
+            mailing_name VARCHAR(255),
+            customer_web_id VARCHAR(255),
+            customer_tally_id VARCHAR(255),
+            billing_address TEXT,
+            consignee_name VARCHAR(255),
+            shipping_address TEXT,
+            billing_pin_code VARCHAR(50),
+            shipping_pin_code VARCHAR(50),
+            billing_phone_no VARCHAR(50),
+            shipping_phone_no VARCHAR(50),
+            total_amount DECIMAL(15,2),
+            sales_tally_id VARCHAR(255),
+            web_id VARCHAR(255),
+            action VARCHAR(255),
+            billing_state VARCHAR(255),
+            billing_country VARCHAR(255),
+            shipping_state VARCHAR(255),
+            shipping_country VARCHAR(255),
+            created_at DATETIME,
+            updated_at DATETIME
+        )
+    ''')
+
+    # Create inventory_entries table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS inventory_entries (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    voucher_id INT NOT NULL,
+    vch_no VARCHAR(50) NOT NULL,
+    stock_item VARCHAR(255),
+    debitor_credit VARCHAR(50),
+    billed_qty DECIMAL(15,3),
+    actual_qty DECIMAL(15,3),
+    rate DECIMAL(15,2),
+    discount DECIMAL(15,2),
+    amount DECIMAL(15,2),
+    FOREIGN KEY (voucher_id) REFERENCES vouchers(id)
+)
+''')
+
+    # Create batch_allocations table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS batch_allocations (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            inventory_id INT,
+            batch_name VARCHAR(255),
+            godown_name VARCHAR(255),
+            batch_billed_qty DECIMAL(15,3),
+            batch_actual_qty DECIMAL(15,3),
+            batch_rate DECIMAL(15,2),
+            batch_discount DECIMAL(15,2),
+            amount DECIMAL(15,2),
+            FOREIGN KEY (inventory_id) REFERENCES inventory_entries(id)
+        )
+    ''')
+
+    # Create accounting_allocations table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS accounting_allocations (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            inventory_id INT,
+            ledger_name VARCHAR(255),
+            amount DECIMAL(15,2),
+            FOREIGN KEY (inventory_id) REFERENCES inventory_entries(id)
+        )
+    ''')
+
+    # Create ledger_details table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ledger_details (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            voucher_id INT,
+            ledger_name VARCHAR(255),
+            debitor_credit VARCHAR(50),
+            amount DECIMAL(15,2),
+            FOREIGN KEY (voucher_id) REFERENCES vouchers(id)
+        )
+    ''')
+
+    # Create bill_wise_details table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bill_wise_details (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            ledger_id INT,
+            bill_type VARCHAR(255),
+            bill_amount DECIMAL(15,2),
+            FOREIGN KEY (ledger_id) REFERENCES ledger_details(id)
+        )
+    ''')
+
+    # Create system_logs table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS system_logs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            branch_name VARCHAR(255),
+            module_name VARCHAR(255),
+            action_performed VARCHAR(255),
+            action_by VARCHAR(255),
+            action_on TEXT,
+            ip_address VARCHAR(50),
+            timestamp DATETIME
+        )
+    ''')
+    # Create ticket_details table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ticket_details (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        TicketNumber VARCHAR(50) NOT NULL,
+        VehicleNumber VARCHAR(50) NOT NULL,
+        `Date` DATE NOT NULL,
+        `Time` TIME NOT NULL,
+        LoadedWeight DECIMAL(10,2) NOT NULL,
+        EmptyWeight DECIMAL(10,2) NOT NULL,
+        LoadWeightDate DATE,
+        LoadWeightTime TIME,
+        EmptyWeightDate DATE,
+        EmptyWeightTime TIME,
+        NetWeight DECIMAL(10,2) NOT NULL,
+        Pending VARCHAR(20),
+        `Shift` VARCHAR(20),
+        Materialname VARCHAR(100),
+        SupplierName VARCHAR(100),
+        `State` VARCHAR(50),
+        Closed VARCHAR(20),
+        createdAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        updatedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    ''')
+    
+#Creating or updating the invoice_items table
+    cursor.execute('''
+CREATE TABLE IF NOT EXISTS invoice_items (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    vehicle_number VARCHAR(255),
+    description TEXT,
+    quantity DECIMAL(10,2),
+    rate DECIMAL(10,2),
+    amount DECIMAL(10,2),
+    supplier_name VARCHAR(255),
+    invoice_number VARCHAR(100),
+    invoice_date DATE,
+    gstin VARCHAR(20),
+    address TEXT,
+    empty_weight DECIMAL(10,2),
+    load_weight DECIMAL(10,2),
+    net_weight DECIMAL(10,2),
+    tax DECIMAL(10,2),
+    cgst DECIMAL(10,2),
+    sgst DECIMAL(10,2),
+    round_off DECIMAL(10,2),
+    total DECIMAL(10,2),
+    amount_in_words TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+''')
+    
+    # Create weighbridge_data table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS weighbridge_data (
+                   id INT AUTO_INCREMENT PRIMARY KEY,
+    TicketNumber INT,
+    VehicleNumber VARCHAR(20),
+    Date DATETIME,
+    Time DATETIME,
+    EmptyWeight DECIMAL(10,2),
+    LoadedWeight DECIMAL(10,2),
+    EmptyWeightDate DATETIME,
+    EmptyWeightTime DATETIME,
+    LoadWeightDate DATETIME,
+    LoadWeightTime DATETIME,
+    NetWeight DECIMAL(10,2),
+    Pending BOOLEAN,
+    Closed BOOLEAN,
+    Exported BOOLEAN,
+    Shift VARCHAR(5),
+    MaterialName VARCHAR(100),
+    SupplierName VARCHAR(100),
+    State VARCHAR(100),
+    Blank VARCHAR(100),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS supplier (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    poNumber VARCHAR(50) NOT NULL,
+    poBalanceQty DECIMAL(10,2) NOT NULL,
+    inwardNo VARCHAR(50) NOT NULL,
+    vehicleNo VARCHAR(50) NOT NULL,
+    dateTime DATETIME NOT NULL,
+    supplierName VARCHAR(255) NOT NULL,
+    material VARCHAR(255) NOT NULL,
+    uom VARCHAR(50) DEFAULT 'tons',
+    orderedQty DECIMAL(10,2) NOT NULL DEFAULT 0.00,
+    receivedQty DECIMAL(10,2),
+    receivedBy VARCHAR(255),
+    supplierBillQty DECIMAL(10,2),
+    poRate DECIMAL(10,2) NOT NULL,
+    supplierBillRate DECIMAL(10,2),
+    supplierBillFile VARCHAR(255),
+    difference DECIMAL(10,2),
+    status ENUM('Pending', 'Approved', 'Rejected') DEFAULT 'Pending',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+                   ''')
+
+    # Create supplier table
+    # cursor.execute('''
+    #     CREATE TABLE IF NOT EXISTS supplier (
+    #         id INT AUTO_INCREMENT PRIMARY KEY,
+    #         poNumber VARCHAR(50) NOT NULL,
+    #         poBalanceQty DECIMAL(10,2) NOT NULL,
+    #         inwardNo VARCHAR(50) NOT NULL,
+    #         vehicleNo VARCHAR(50) NOT NULL,
+    #         dateTime DATETIME NOT NULL,
+    #         supplierName VARCHAR(255) NOT NULL,
+    #         material VARCHAR(255) NOT NULL,
+    #         uom VARCHAR(50) DEFAULT 'tons',
+    #         receivedQty DECIMAL(10,2),
+    #         receivedBy VARCHAR(255),
+    #         supplierBillQty DECIMAL(10,2),
+    #         poRate DECIMAL(10,2) NOT NULL,
+    #         supplierBillRate DECIMAL(10,2),
+    #         supplierBillFile VARCHAR(255),
+    #         difference DECIMAL(10,2),
+    #         status ENUM('Pending', 'Approved', 'Rejected') DEFAULT 'Pending',
+    #         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    #         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    #     )
+    # ''')
+    
+    # Create vehicles table with updated structure
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vehicles (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            sno INT,
+            inward_no VARCHAR(50),
+            vehicle_number VARCHAR(50) NOT NULL,
+            supplier_name VARCHAR(255),
+            material VARCHAR(255),
+            entry_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            INDEX(sno),
+            INDEX(vehicle_number)
+        )
+    ''')
+    
+    # Create system_logs table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS system_logs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            sno INT,
+            branch_name VARCHAR(255),
+            module_name VARCHAR(255),
+            action_performed VARCHAR(100),
+            action_by VARCHAR(255),
+            action_on VARCHAR(255),
+            timestamp DATETIME,
+            ip_address VARCHAR(45),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX(sno)
+        )
+    ''')
+    
+    # Create batch_slips table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS batch_slips (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            plant_serial_number VARCHAR(50),
+            batch_date DATE,
+            batch_start_time TIME,
+            batch_end_time TIME,
+            batch_number VARCHAR(50) UNIQUE,
+            customer VARCHAR(255),
+            site VARCHAR(255),
+            recipe_code VARCHAR(50),
+            recipe_name VARCHAR(255),
+            truck_number VARCHAR(50),
+            truck_driver VARCHAR(255),
+            order_number VARCHAR(50),
+            batcher_name VARCHAR(255),
+            ordered_quantity DECIMAL(10, 2),
+            production_quantity DECIMAL(10, 2),
+            adj_manual_quantity DECIMAL(10, 2),
+            with_this_load DECIMAL(10, 2),
+            mixer_capacity DECIMAL(10, 2),
+            batch_size DECIMAL(10, 2),
+            client_name VARCHAR(255),
+            client_address TEXT,
+            client_email VARCHAR(255),
+            client_gstin VARCHAR(50),
+            description VARCHAR(255),
+            hsn_code VARCHAR(20),
+            quantity DECIMAL(10, 2),
+            rate DECIMAL(10, 2),
+            unit VARCHAR(20),
+            status ENUM('Active', 'Completed', 'Cancelled') DEFAULT 'Active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Create invoices table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS invoices (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            invoice_number VARCHAR(50) UNIQUE,
+            batch_slip_id INT,
+            client_name VARCHAR(255),
+            client_address TEXT,
+            client_email VARCHAR(255),
+            client_gstin VARCHAR(50),
+            description VARCHAR(255),
+            hsn_code VARCHAR(20),
+            quantity DECIMAL(10, 2),
+            rate DECIMAL(10, 2),
+            unit VARCHAR(20),
+            total_amount DECIMAL(12, 2),
+            cgst DECIMAL(12, 2),
+            sgst DECIMAL(12, 2),
+            grand_total DECIMAL(12, 2),
+            amount_in_words TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (batch_slip_id) REFERENCES batch_slips(id)
+        )
+    ''')
+    
+    # Create grn table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS grn (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            grnNumber VARCHAR(50),
+            poNumber VARCHAR(50),
+            supplier VARCHAR(255),
+            material VARCHAR(255),
+            orderedQty DECIMAL(10, 2),
+            receivedQty DECIMAL(10, 2),
+            rate DECIMAL(10, 2),
+            totalAmount DECIMAL(15, 2),
+            receivedDate DATE,
+            status VARCHAR(50) DEFAULT 'Received',
+            remarks TEXT,
+            grn_number VARCHAR(50) UNIQUE,
+            linked_po_number VARCHAR(50),
+            supplier_name VARCHAR(255),
+            project VARCHAR(255),
+            received_quantity DECIMAL(10, 2),
+            received_date DATE,
+            material_condition ENUM('Good', 'Damaged', 'Partially Damaged', 'Rejected'),
+            supporting_document VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Create intents table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS intents (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            intentNumber VARCHAR(50) NOT NULL,
+            supplier VARCHAR(100) NOT NULL,
+            material VARCHAR(100) NOT NULL,
+            quantity DECIMAL(10,2) NOT NULL,
+            rate DECIMAL(10,2) NOT NULL,
+            totalAmount DECIMAL(15,2) NOT NULL,
+            deliveryDate DATE NOT NULL,
+            narration TEXT,
+            status VARCHAR(20) DEFAULT 'Active',
+            createdAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updatedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Create po_payments table for tracking PO payments
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS po_payments (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            po_id INT,
+            po_number VARCHAR(50),
+            payment_amount DECIMAL(15, 2),
+            payment_date DATE,
+            payment_method VARCHAR(50),
+            reference_number VARCHAR(100),
+            remarks TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (po_id) REFERENCES po_details(id)
+        )
+    ''')
+    
+    # Create invoice_payments table for tracking invoice payments
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS invoice_payments (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            invoice_id INT,
+            invoice_number VARCHAR(50),
+            payment_amount DECIMAL(15, 2),
+            payment_date DATE,
+            payment_method VARCHAR(50),
+            reference_number VARCHAR(100),
+            remarks TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (invoice_id) REFERENCES invoices(id)
+        )
+    ''')
+    
+    # Create supplier_payment_details table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS supplier_payment_details (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            po_number VARCHAR(50) NOT NULL,
+            supplier_name VARCHAR(255) NOT NULL,
+            material VARCHAR(255) NOT NULL,
+            quantity_ordered DECIMAL(10,2) NOT NULL,
+            total_amount DECIMAL(15,2) NOT NULL,
+            paid_amount DECIMAL(15,2) NOT NULL,
+            pending_amount DECIMAL(15,2) NOT NULL,
+            payment_status VARCHAR(50) DEFAULT 'Pending',
+            payment_date DATE,
+            payment_method VARCHAR(50),
+            remarks TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Create invoice_payment_details table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS invoice_payment_details (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            invoice_number VARCHAR(50) NOT NULL,
+            client_name VARCHAR(255) NOT NULL,
+            material VARCHAR(255) NOT NULL,
+            quantity_ordered DECIMAL(10,2) NOT NULL,
+            total_amount DECIMAL(15,2) NOT NULL,
+            received_amount DECIMAL(15,2) NOT NULL,
+            pending_amount DECIMAL(15,2) NOT NULL,
+            payment_date DATE,
+            payment_method VARCHAR(50),
+            remarks TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+
+@migration(2, "invoice_items columns used by the extractor service")
+def add_invoice_item_columns(cursor):
+    for column, column_type in [
+        ("supplier_id", "VARCHAR(255)"),
+        ("description", "TEXT"),
+        ("gstin", "VARCHAR(20)"),
+        ("address", "TEXT"),
+        ("empty_weight", "DECIMAL(10,2)"),
+        ("load_weight", "DECIMAL(10,2)"),
+        ("net_weight", "DECIMAL(10,2)"),
+        ("tax", "DECIMAL(10,2)"),
+        ("cgst", "DECIMAL(10,2)"),
+        ("sgst", "DECIMAL(10,2)"),
+        ("round_off", "DECIMAL(10,2)"),
+        ("total", "DECIMAL(10,2)"),
+        ("amount_in_words", "TEXT"),
+        ("file_name", "VARCHAR(255)"),
+        ("file_content", "LONGBLOB"),
+        ("status", "VARCHAR(50)")
+    ]:
+        add_column(cursor, "invoice_items", column, column_type)
+
+@migration(3, "id_sequences counter table for client-assigned voucher keys")
+def create_id_sequences(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS id_sequences (
+            name VARCHAR(64) PRIMARY KEY,
+            next_value BIGINT NOT NULL
+        )
+    ''')
+    for table in ("vouchers", "inventory_entries", "ledger_details"):
+        cursor.execute(
+            f"INSERT IGNORE INTO id_sequences (name, next_value) SELECT %s, COALESCE(MAX(id), 0) + 1 FROM {table}",
+            (table,)
+        )
+
+@migration(4, "Natural key and content hash on vouchers for idempotent ingest")
+def add_voucher_natural_key(cursor):
+    add_column(cursor, "vouchers", "content_hash", "CHAR(64)")
+
+    # Earlier uploads appended every voucher again; keep only the newest copy.
+    newer = '''
+        JOIN vouchers newer
+          ON newer.vch_no = v.vch_no
+         AND newer.voucher_type_name = v.voucher_type_name
+         AND newer.id > v.id
+    '''
+    cursor.execute(f'''
+        DELETE bw FROM bill_wise_details bw
+        JOIN ledger_details ld ON ld.id = bw.ledger_id
+        JOIN vouchers v ON v.id = ld.voucher_id {newer}
+    ''')
+    cursor.execute(f"DELETE ld FROM ledger_details ld JOIN vouchers v ON v.id = ld.voucher_id {newer}")
+    for child in ("batch_allocations", "accounting_allocations"):
+        cursor.execute(f'''
+            DELETE c FROM {child} c
+            JOIN inventory_entries ie ON ie.id = c.inventory_id
+            JOIN vouchers v ON v.id = ie.voucher_id {newer}
+        ''')
+    cursor.execute(f"DELETE ie FROM inventory_entries ie JOIN vouchers v ON v.id = ie.voucher_id {newer}")
+    cursor.execute(f"DELETE v FROM vouchers v {newer}")
+
+    # po_details rows written by voucher ingest: keep the most recent upload's rows.
+    cursor.execute('''
+        DELETE p FROM po_details p
+        JOIN vouchers v ON v.vch_no = p.poNumber AND v.voucher_type_name = p.poType
+        JOIN po_details newer
+          ON newer.poNumber = p.poNumber
+         AND newer.poType = p.poType
+         AND newer.createdAt > p.createdAt
+    ''')
+
+    add_index(cursor, "vouchers", "uq_vouchers_vch_no_type", "vch_no, voucher_type_name", unique=True)
+    add_index(cursor, "po_details", "idx_po_details_po_type", "poNumber, poType")
+
+@migration(5, "Index supplier rows by PO number for the voucher summary")
+def add_supplier_po_index(cursor):
+    # vouchers.vch_no is already the leading column of uq_vouchers_vch_no_type.
+    add_index(cursor, "supplier", "idx_supplier_po_number", "poNumber")
+
+@migration(6, "po_balance table maintained by supplier and PO writes")
+def create_po_balance(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS po_balance (
+            poNumber VARCHAR(50) PRIMARY KEY,
+            ordered_qty DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+            received_qty DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+            billed_qty DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+            remaining_qty DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        INSERT IGNORE INTO po_balance (poNumber, ordered_qty, received_qty, billed_qty, remaining_qty)
+        SELECT k.poNumber,
+               COALESCE(o.ordered_qty, 0),
+               COALESCE(r.received_qty, 0),
+               COALESCE(r.billed_qty, 0),
+               COALESCE(o.ordered_qty, 0) - COALESCE(r.billed_qty, 0)
+        FROM (SELECT poNumber FROM po_details UNION SELECT poNumber FROM supplier) k
+        LEFT JOIN (
+            SELECT poNumber, SUM(quantity) AS ordered_qty
+            FROM po_details
+            GROUP BY poNumber
+        ) o ON o.poNumber = k.poNumber
+        LEFT JOIN (
+            SELECT poNumber, SUM(receivedQty) AS received_qty, SUM(supplierBillQty) AS billed_qty
+            FROM supplier
+            GROUP BY poNumber
+        ) r ON r.poNumber = k.poNumber
+    ''')
+
+@migration(7, "Seed the inward number sequence from vehicles.sno")
+def seed_inward_no_sequence(cursor):
+    cursor.execute(
+        "INSERT IGNORE INTO id_sequences (name, next_value) SELECT 'inward_no', COALESCE(MAX(sno), 0) + 1 FROM vehicles"
+    )
+
+@migration(8, "supplier_outbox queue for supplier details created from vehicle entries")
+def create_supplier_outbox(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS supplier_outbox (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            inward_no VARCHAR(50) NOT NULL,
+            vehicle_number VARCHAR(50) NOT NULL,
+            supplier_name VARCHAR(255) NOT NULL,
+            material VARCHAR(255) NOT NULL,
+            entry_time DATETIME,
+            status ENUM('pending', 'done', 'failed') NOT NULL DEFAULT 'pending',
+            attempts INT NOT NULL DEFAULT 0,
+            last_error TEXT,
+            next_attempt_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            processed_at DATETIME,
+            INDEX idx_supplier_outbox_due (status, next_attempt_at)
+        )
+    ''')
+
+@migration(9, "Normalized vehicle key and filter indexes on weighbridge_data")
+def add_weighbridge_indexes(cursor):
+    # Separators stripped here must match VEHICLE_NUMBER_SEPARATORS in weighbridge_filters.py.
+    add_column(
+        cursor, "weighbridge_data", "VehicleNumberKey",
+        "VARCHAR(20) AS (UPPER(REPLACE(REPLACE(REPLACE(REPLACE("
+        "VehicleNumber, ' ', ''), '-', ''), '.', ''), '/', ''))) STORED"
+    )
+    add_index(cursor, "weighbridge_data", "idx_weighbridge_date_shift", "Date, Shift")
+    add_index(cursor, "weighbridge_data", "idx_weighbridge_vehicle_date", "VehicleNumberKey, Date")
+    add_index(cursor, "weighbridge_data", "idx_weighbridge_created_at", "created_at")
+
+@migration(10, "Monthly RANGE partitioning and filter indexes on system_logs")
+def partition_system_logs(cursor):
+    # The partitioning column has to be NOT NULL and part of every unique key.
+    # system_logs has no created_at column, so undated rows take the migration time.
+    cursor.execute("UPDATE system_logs SET timestamp = NOW() WHERE timestamp IS NULL")
+    cursor.execute('''
+        ALTER TABLE system_logs
+            MODIFY timestamp DATETIME NOT NULL,
+            DROP PRIMARY KEY,
+            ADD PRIMARY KEY (id, timestamp)
+    ''')
+
+    # One partition per month from the oldest row to two months ahead;
+    # log_partitions.py keeps extending and trimming the range from here.
+    cursor.execute("SELECT MIN(timestamp) FROM system_logs")
+    oldest = cursor.fetchone()[0] or date.today()
+    today = date.today()
+    month = date(oldest.year, oldest.month, 1)
+    last = date(today.year + (today.month + 1) // 12, (today.month + 1) % 12 + 1, 1)
+    definitions = []
+    while month <= last:
+        next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        definitions.append(f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{next_month.isoformat()}')")
+        month = next_month
+    definitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+    cursor.execute(f"ALTER TABLE system_logs PARTITION BY RANGE COLUMNS(timestamp) ({', '.join(definitions)})")
+
+    add_index(cursor, "system_logs", "idx_system_logs_timestamp", "timestamp")
+    add_index(cursor, "system_logs", "idx_system_logs_module", "module_name, timestamp")
+    add_index(cursor, "system_logs", "idx_system_logs_action_by", "action_by, timestamp")
+
+@migration(11, "dashboard_counters for /dashboard/stats")
+def create_dashboard_counters(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dashboard_counters (
+            name VARCHAR(64) PRIMARY KEY,
+            value BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+    # Reconciliation counts today's vehicles with a created_at range.
+    add_index(cursor, "vehicles", "idx_vehicles_created_at", "created_at")
+
+@migration(12, "stock_ledger of per-material totals for /inventory/stats")
+def create_stock_ledger(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_ledger (
+            material VARCHAR(255) PRIMARY KEY,
+            unit VARCHAR(50),
+            ordered_qty DECIMAL(16,2) NOT NULL DEFAULT 0.00,
+            received_qty DECIMAL(16,2) NOT NULL DEFAULT 0.00,
+            weighbridge_qty DECIMAL(16,2) NOT NULL DEFAULT 0.00,
+            consumed_qty DECIMAL(16,2) NOT NULL DEFAULT 0.00,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        INSERT IGNORE INTO stock_ledger (material, unit, ordered_qty, received_qty, weighbridge_qty, consumed_qty)
+        SELECT m.material,
+               MAX(m.unit),
+               SUM(m.ordered_qty), SUM(m.received_qty), SUM(m.weighbridge_qty), SUM(m.consumed_qty)
+        FROM (
+            SELECT TRIM(material) AS material, NULL AS unit,
+                   quantity AS ordered_qty, 0 AS received_qty, 0 AS weighbridge_qty, 0 AS consumed_qty
+            FROM po_details
+            UNION ALL
+            SELECT TRIM(material), uom, 0, COALESCE(receivedQty, 0), 0, 0
+            FROM supplier
+            UNION ALL
+            SELECT TRIM(Materialname), NULL, 0, 0, COALESCE(NetWeight, 0), 0
+            FROM weighbridge_data
+            UNION ALL
+            SELECT TRIM(description), unit, 0, 0, 0, COALESCE(quantity, 0)
+            FROM batch_slips
+        ) m
+        WHERE m.material IS NOT NULL AND m.material <> ''
+        GROUP BY m.material
+    ''')
+
+@migration(13, "payment indexes for the paged /combined-payment-supplier-details")
+def add_payment_indexes(cursor):
+    add_index(cursor, "supplier_payment_details", "idx_supplier_payment_created", "created_at, id")
+    add_index(cursor, "supplier_payment_details", "idx_supplier_payment_supplier_created", "supplier_name, created_at")
+    add_index(cursor, "supplier_payment_details", "idx_supplier_payment_po_number", "po_number")
+
+@migration(14, "ticket_details index for weighbridge trip de-duplication")
+def add_ticket_details_index(cursor):
+    add_index(cursor, "ticket_details", "idx_ticket_details_ticket", "TicketNumber, VehicleNumber, `Date`")
+
+@migration(15, "weighbridge event_ts/load_ts/empty_ts combined from the split date and time columns")
+def add_weighbridge_event_timestamps(cursor):
+    for table in ("weighbridge_data", "ticket_details"):
+        for column in ("event_ts", "load_ts", "empty_ts"):
+            add_column(cursor, table, column, "DATETIME NULL")
+    add_index(cursor, "weighbridge_data", "idx_weighbridge_event_ts", "event_ts")
+    add_index(cursor, "weighbridge_data", "idx_weighbridge_vehicle_event", "VehicleNumberKey, event_ts")
+    add_index(cursor, "ticket_details", "idx_ticket_details_event_ts", "event_ts")
+    cursor.execute('''
+        UPDATE weighbridge_data
+        SET event_ts = TIMESTAMP(DATE(`Date`), TIME(`Time`)),
+            load_ts = TIMESTAMP(DATE(LoadWeightDate), TIME(LoadWeightTime)),
+            empty_ts = TIMESTAMP(DATE(EmptyWeightDate), TIME(EmptyWeightTime))
+        WHERE event_ts IS NULL
+    ''')
+    cursor.execute('''
+        UPDATE ticket_details
+        SET event_ts = TIMESTAMP(`Date`, `Time`),
+            load_ts = TIMESTAMP(LoadWeightDate, LoadWeightTime),
+            empty_ts = TIMESTAMP(EmptyWeightDate, EmptyWeightTime)
+        WHERE event_ts IS NULL
+    ''')
+
+@migration(16, "s3_import_state for the incremental weighbridge CSV loader")
+def create_s3_import_state(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS s3_import_state (
+            source VARCHAR(512) PRIMARY KEY,
+            etag VARCHAR(255),
+            byte_offset BIGINT NOT NULL DEFAULT 0,
+            header TEXT,
+            prefix_sha256 CHAR(64),
+            rows_imported BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+
+@migration(17, "Normalized plate keys and weighbridge_matches for gate entry matching")
+def create_weighbridge_matches(cursor):
+    # Same normalization as weighbridge_data.VehicleNumberKey (migration 9)
+    add_column(
+        cursor, "vehicles", "vehicle_number_key",
+        "VARCHAR(50) AS (UPPER(REPLACE(REPLACE(REPLACE(REPLACE("
+        "vehicle_number, ' ', ''), '-', ''), '.', ''), '/', ''))) STORED"
+    )
+    add_column(
+        cursor, "supplier", "vehicleNoKey",
+        "VARCHAR(50) AS (UPPER(REPLACE(REPLACE(REPLACE(REPLACE("
+        "vehicleNo, ' ', ''), '-', ''), '.', ''), '/', ''))) STORED"
+    )
+    add_index(cursor, "vehicles", "idx_vehicles_plate_entry", "vehicle_number_key, entry_time")
+    add_index(cursor, "supplier", "idx_supplier_plate_datetime", "vehicleNoKey, dateTime")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS weighbridge_matches (
+            weighbridge_id INT PRIMARY KEY,
+            ticket_number INT,
+            plate_key VARCHAR(20),
+            event_ts DATETIME,
+            vehicle_id INT NULL,
+            supplier_id INT NULL,
+            gate_gap_seconds INT NULL,
+            matched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_weighbridge_matches_vehicle (vehicle_id),
+            INDEX idx_weighbridge_matches_supplier (supplier_id),
+            INDEX idx_weighbridge_matches_ticket (ticket_number, plate_key),
+            INDEX idx_weighbridge_matches_event (event_ts, weighbridge_id),
+            INDEX idx_weighbridge_matches_plate (plate_key, event_ts)
+        )
+    ''')
+
+@migration(18, "weighbridge_data import position for idempotent S3 loads")
+def add_weighbridge_import_position(cursor):
+    add_column(cursor, "weighbridge_data", "import_source", "VARCHAR(255) NULL")
+    add_column(cursor, "weighbridge_data", "import_offset", "BIGINT NULL")
+    # Rows from other writers leave both NULL, which a unique key allows any number of.
+    add_index(cursor, "weighbridge_data", "uq_weighbridge_import_position", "import_source, import_offset", unique=True)
+
+def applied_versions(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            description VARCHAR(255),
+            applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("SELECT version FROM schema_version")
+    return {row[0] for row in cursor.fetchall()}
+
+def migrate(conn=None):
+    """Apply all pending migrations in version order; returns the versions applied."""
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    cursor = conn.cursor()
+    applied = []
+    try:
+        # Serialise concurrent service start-ups so a migration never runs twice.
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK_NAME, MIGRATION_LOCK_TIMEOUT))
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Timed out waiting for the schema migration lock")
+        try:
+            done = applied_versions(cursor)
+            for version, description, func in sorted(MIGRATIONS, key=lambda m: m[0]):
+                if version in done:
+                    continue
+                print(f"Applying schema migration {version}: {description}")
+                func(cursor)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+                conn.commit()
+                applied.append(version)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK_NAME,))
+            cursor.fetchone()
+        return applied
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+
+if __name__ == "__main__":
+    applied = migrate()
+    print(f"Applied migrations: {applied}" if applied else "Schema is up to date")
@@ -0,0 +1,117 @@
+"""Maintained per-PO quantity balances.
+
+po_balance holds one row per poNumber: the ordered quantity summed from
+po_details and the received/billed quantities summed from supplier, with
+remaining_qty = ordered_qty - billed_qty.  Supplier writes apply their
+change as a delta in the same transaction (a single-row upsert, which also
+serialises concurrent writers to one PO), and PO writes recompute the
+ordered side, so a balance lookup is a primary-key read instead of a SUM
+over the PO's supplier history.
+
+If the table is ever suspected to have drifted (rows edited by hand, a
+writer that bypasses these helpers), recompute it from scratch with:
+
+    python po_balance.py rebuild
+"""
+import sys
+
+from db_config import get_db_connection
+
+def _qty(value):
+    return float(value) if value not in (None, "") else 0.0
+
+def apply_supplier_change(cursor, po_number, received_delta=0, billed_delta=0):
+    """Add the change in a PO's received/billed quantity from one supplier write."""
+    if not po_number or (not received_delta and not billed_delta):
+        return
+    cursor.execute('''
+        INSERT INTO po_balance (poNumber, ordered_qty, received_qty, billed_qty, remaining_qty)
+        VALUES (%s, 0, %s, %s, -%s)
+        ON DUPLICATE KEY UPDATE
+            received_qty = received_qty + VALUES(received_qty),
+            billed_qty = billed_qty + VALUES(billed_qty),
+            remaining_qty = ordered_qty - billed_qty
+    ''', (po_number, received_delta, billed_delta, billed_delta))
+
+def supplier_row_change(old_row, new_row):
+    """(received delta, billed delta) between two supplier rows; either may be None."""
+    old_row = old_row or {}
+    new_row = new_row or {}
+    return (_qty(new_row.get("receivedQty")) - _qty(old_row.get("receivedQty")),
+            _qty(new_row.get("supplierBillQty")) - _qty(old_row.get("supplierBillQty")))
+
+def refresh_ordered_qty(cursor, po_number):
+    """Recompute a PO's ordered quantity after its po_details rows changed."""
+    refresh_ordered_qtys(cursor, [po_number])
+
+def refresh_ordered_qtys(cursor, po_numbers):
+    """refresh_ordered_qty() for many POs in one statement."""
+    po_numbers = sorted({po_number for po_number in po_numbers if po_number})
+    if not po_numbers:
+        return
+    keys = " UNION ALL ".join(["SELECT %s AS poNumber"] * len(po_numbers))
+    cursor.execute(f'''
+        INSERT INTO po_balance (poNumber, ordered_qty, received_qty, billed_qty, remaining_qty)
+        SELECT k.poNumber, COALESCE(SUM(d.quantity), 0), 0, 0, COALESCE(SUM(d.quantity), 0)
+        FROM ({keys}) k
+        LEFT JOIN po_details d ON d.poNumber = k.poNumber
+        GROUP BY k.poNumber
+        ON DUPLICATE KEY UPDATE
+            ordered_qty = VALUES(ordered_qty),
+            remaining_qty = ordered_qty - billed_qty
+    ''', po_numbers)
+
+def get_po_balance(cursor, po_number):
+    """The po_balance row for po_number as a dict, or None."""
+    cursor.execute('''
+        SELECT ordered_qty, received_qty, billed_qty, remaining_qty
+        FROM po_balance
+        WHERE poNumber = %s
+    ''', (po_number,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    if not isinstance(row, dict):
+        row = dict(zip(("ordered_qty", "received_qty", "billed_qty", "remaining_qty"), row))
+    return {key: float(value) for key, value in row.items()}
+
+def rebuild_po_balance(cursor):
+    """Recompute every row from po_details and supplier; returns the row count."""
+    cursor.execute("DELETE FROM po_balance")
+    cursor.execute('''
+        INSERT INTO po_balance (poNumber, ordered_qty, received_qty, billed_qty, remaining_qty)
+        SELECT k.poNumber,
+               COALESCE(o.ordered_qty, 0),
+               COALESCE(r.received_qty, 0),
+               COALESCE(r.billed_qty, 0),
+               COALESCE(o.ordered_qty, 0) - COALESCE(r.billed_qty, 0)
+        FROM (SELECT poNumber FROM po_details UNION SELECT poNumber FROM supplier) k
+        LEFT JOIN (
+            SELECT poNumber, SUM(quantity) AS ordered_qty
+            FROM po_details
+            GROUP BY poNumber
+        ) o ON o.poNumber = k.poNumber
+        LEFT JOIN (
+            SELECT poNumber, SUM(receivedQty) AS received_qty, SUM(supplierBillQty) AS billed_qty
+            FROM supplier
+            GROUP BY poNumber
+        ) r ON r.poNumber = k.poNumber
+    ''')
+    return cursor.rowcount
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        print("usage: python po_balance.py rebuild")
+        sys.exit(2)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        count = rebuild_po_balance(cursor)
+        conn.commit()
+        print(f"Rebuilt po_balance: {count} purchase orders")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
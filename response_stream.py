@@ -0,0 +1,167 @@
+"""Streaming JSON encoding and negotiated compression for large responses.
+
+Shared by the Flask app (app.py) and the FastAPI extractor (extractor1.py).
+Rows are pulled from an unbuffered (server-side) cursor with fetchmany and
+encoded one batch at a time, so neither the result set nor the encoded body
+is ever held in memory in full.  The encoded chunks are then compressed with
+Brotli or gzip according to the request's Accept-Encoding.
+
+    chunks = json_array(iter_cursor(cursor), transform=format_row)
+    body, headers = encode_stream(chunks, request.headers.get("Accept-Encoding"))
+
+Brotli needs the optional ``brotli`` package; without it only gzip is offered.
+Encoding uses orjson when it is installed (it handles date/datetime/time
+natively and is several times faster than the json module) and falls back
+to json otherwise; both go through json_default for Decimal and timedelta.
+"""
+import base64
+import json
+import zlib
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from row_format import to_hms
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FETCH_SIZE = 500
+# Non-streamed responses smaller than this are not worth compressing.
+COMPRESS_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+def json_default(value):
+    """json.dumps fallback for the types MySQL hands back."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return to_hms(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode("ascii")
+    if isinstance(value, set):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value, default=json_default):
+    """Encode ``value`` as compact JSON bytes; ``default`` handles the types JSON lacks."""
+    if orjson is not None:
+        return orjson.dumps(value, default=default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=default, separators=(",", ":")).encode("utf-8")
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def iter_cursor(cursor, size=FETCH_SIZE):
+    """Yield lists of rows from ``cursor`` using fetchmany."""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+def json_array(batches, transform=None):
+    """Encode an iterable of row batches as one JSON array, one chunk per batch."""
+    yield b"["
+    first = True
+    for batch in batches:
+        if transform is not None:
+            batch = [transform(row) for row in batch]
+        if not batch:
+            continue
+        encoded = b",".join(dumps(row) for row in batch)
+        yield encoded if first else b"," + encoded
+        first = False
+    yield b"]"
+
+def json_object(fields, arrays):
+    """Encode ``fields`` plus streamed array members as one JSON object.
+
+    ``arrays`` is a list of (key, chunk iterator) pairs, each iterator as
+    produced by json_array(); they are consumed in order.
+    """
+    head = dumps(fields)
+    yield head[:-1]
+    separator = b"," if fields else b""
+    for key, chunks in arrays:
+        yield separator + dumps(key) + b":"
+        separator = b","
+        yield from chunks
+    yield b"}"
+
+def negotiate_encoding(accept_encoding):
+    """Pick "br", "gzip" or None from an Accept-Encoding header value."""
+    offered = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            offered[name.lower()] = quality
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+def _compressor(encoding):
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        return compressor.process, compressor.finish
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    return compressor.compress, compressor.flush
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of str/bytes chunks, yielding compressed bytes as they fill."""
+    compress, finish = _compressor(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        data = compress(chunk)
+        if data:
+            yield data
+    tail = finish()
+    if tail:
+        yield tail
+
+def compress_bytes(data, encoding):
+    compress, finish = _compressor(encoding)
+    return compress(data) + finish()
+
+def encode_stream(chunks, accept_encoding):
+    """Return (byte iterator, extra headers) for a streamed JSON body."""
+    encoding = negotiate_encoding(accept_encoding)
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding is None:
+        body = (chunk.encode("utf-8") if isinstance(chunk, str) else chunk for chunk in chunks)
+    else:
+        body = compress_stream(chunks, encoding)
+        headers["Content-Encoding"] = encoding
+    return body, headers
+
+def closing_stream(chunks, *resources):
+    """Yield from ``chunks`` and close cursors/connections once the body is done."""
+    try:
+        yield from chunks
+    finally:
+        for resource in resources:
+            try:
+                resource.close()
+            except Exception:
+                pass
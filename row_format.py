@@ -0,0 +1,88 @@
+"""Row formatting planned once per query from cursor.description.
+
+Instead of testing every field of every row with isinstance/hasattr, the
+column types reported by MySQL are mapped to converter functions when the
+query has executed, and each row is then formatted by a flat loop over that
+plan:
+
+    cursor.execute(...)
+    format_row = row_formatter(cursor, fields=[("ticketNumber", "TicketNumber"), ...],
+                               overrides={"Pending": to_bool})
+    rows = [format_row(row) for row in cursor]
+
+NULL stays None whatever the converter.  DECIMAL columns (amounts, weights,
+quantities) become exact strings, as jsonify() has always sent them; an
+endpoint that has always returned such a column as a number overrides it
+with to_float.
+"""
+from datetime import timedelta
+
+from mysql.connector import FieldType
+
+def to_iso(value):
+    return value.isoformat()
+
+def to_hms(value):
+    """HH:MM:SS from a TIME column (timedelta) or a time/datetime."""
+    if isinstance(value, timedelta):
+        total_seconds = int(value.total_seconds())
+        hours, remainder = divmod(total_seconds, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        return f"{hours:02}:{minutes:02}:{seconds:02}"
+    return value.strftime('%H:%M:%S')
+
+def to_float(value):
+    return float(value)
+
+def to_decimal_str(value):
+    return str(value)
+
+def to_bool(value):
+    return bool(value)
+
+TYPE_CONVERTERS = {
+    FieldType.DATE: to_iso,
+    FieldType.NEWDATE: to_iso,
+    FieldType.DATETIME: to_iso,
+    FieldType.TIMESTAMP: to_iso,
+    FieldType.TIME: to_hms,
+    FieldType.DECIMAL: to_decimal_str,
+    FieldType.NEWDECIMAL: to_decimal_str,
+}
+
+def column_converters(description, overrides=None):
+    """Map each column name in a cursor.description to its converter (or None)."""
+    overrides = overrides or {}
+    converters = {}
+    for column in description:
+        name, type_code = column[0], column[1]
+        converters[name] = overrides.get(name, TYPE_CONVERTERS.get(type_code))
+    return converters
+
+def row_formatter(cursor, fields=None, overrides=None):
+    """Return a function formatting one dictionary-cursor row for JSON.
+
+    ``fields`` is an optional list of (output key, column) pairs used to
+    rename and select columns; by default every column keeps its name.
+    ``overrides`` maps a column to a converter replacing the type-based one.
+    """
+    converters = column_converters(cursor.description, overrides)
+    plan = [(key, column, converters.get(column))
+            for key, column in (fields or [(name, name) for name in converters])]
+
+    def format_row(row):
+        formatted = {}
+        for key, column, convert in plan:
+            value = row[column]
+            formatted[key] = convert(value) if convert is not None and value is not None else value
+        return formatted
+    return format_row
+
+def tuple_formatter(cursor, overrides=None):
+    """Like row_formatter() for plain (tuple) cursors; rows become lists."""
+    converters = list(column_converters(cursor.description, overrides).values())
+
+    def format_row(row):
+        return [convert(value) if convert is not None and value is not None else value
+                for convert, value in zip(converters, row)]
+    return format_row
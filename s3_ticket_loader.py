@@ -0,0 +1,290 @@
+"""Incremental import of the weighbridge tickets CSV from S3 into weighbridge_data.
+
+The weighbridge PC appends to tickets_data.csv and uploads it to S3.  Each
+sync reads only the bytes after the offset recorded in s3_import_state,
+with a ranged GET streamed in READ_CHUNK_BYTES pieces, and inserts complete
+lines into weighbridge_data CHUNK_ROWS at a time.  Every chunk commits
+together with the advanced offset, so an interrupted sync resumes where it
+stopped and never imports a line twice; a trailing line without its
+newline is left for the next sync.
+
+The object's ETag changes on every upload, so it only short-circuits a
+sync when nothing changed.  To detect a rewritten (rather than appended)
+file, the state also keeps a SHA-256 of the PREFIX_CHECK_BYTES just before
+the offset, re-read with a small range request; if they differ the sync
+stops and the object has to be re-imported deliberately with ``reset``,
+which deletes the rows imported from it (reversing their stock ledger
+amounts) before the next sync reads it from the start.
+
+Every imported row records its source and the byte offset of its line
+(import_source, import_offset; unique together), and lines already present
+are skipped, so no sequence of syncs and resets imports a line twice.
+
+Credentials come from the usual boto3 chain (environment, profile, role).
+Set S3_ENDPOINT_URL to point at a local S3 stand-in such as MinIO:
+
+    python s3_ticket_loader.py [sync]
+    python s3_ticket_loader.py reset
+"""
+import csv
+import hashlib
+import os
+import sys
+
+import boto3
+
+import stock_ledger
+from db_config import get_db_connection
+from weighbridge_timestamps import row_timestamps
+
+BUCKET_NAME = os.environ.get("WEIGHBRIDGE_S3_BUCKET", "weighbridge-csv-storage")
+OBJECT_NAME = os.environ.get("WEIGHBRIDGE_S3_KEY", "tickets_data.csv")
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL") or None
+
+READ_CHUNK_BYTES = 1024 * 1024
+CHUNK_ROWS = 1000
+PREFIX_CHECK_BYTES = 4096
+LOADER_LOCK_NAME = "s3_ticket_loader"
+
+# export column -> weighbridge_data column
+COLUMN_MAP = {
+    "TicketNumber": "TicketNumber",
+    "VehicleNumber": "VehicleNumber",
+    "Date": "Date",
+    "Time": "Time",
+    "EmptyWeight": "EmptyWeight",
+    "LoadedWeight": "LoadedWeight",
+    "EmptyWeightDate": "EmptyWeightDate",
+    "EmptyWeightTime": "EmptyWeightTime",
+    "LoadWeightDate": "LoadWeightDate",
+    "LoadWeightTime": "LoadWeightTime",
+    "NetWeight": "NetWeight",
+    "Pending": "Pending",
+    "Closed": "Closed",
+    "Shift": "Shift",
+    "Materialname": "MaterialName",
+    "SupplierName": "SupplierName",
+    "State": "State",
+}
+BOOLEAN_COLUMNS = {"Pending", "Closed"}
+
+class PrefixChangedError(Exception):
+    """The already-imported part of the object no longer matches what was imported."""
+
+def make_client(endpoint_url=S3_ENDPOINT_URL):
+    return boto3.client("s3", endpoint_url=endpoint_url)
+
+def source_name(bucket, key):
+    return f"s3://{bucket}/{key}"
+
+def load_state(cursor, source):
+    cursor.execute('''
+        SELECT etag, byte_offset, header, prefix_sha256, rows_imported
+        FROM s3_import_state
+        WHERE source = %s
+    ''', (source,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    if not isinstance(row, dict):
+        row = dict(zip(("etag", "byte_offset", "header", "prefix_sha256", "rows_imported"), row))
+    return row
+
+def save_state(cursor, source, etag, byte_offset, header, prefix_sha256, rows):
+    cursor.execute('''
+        INSERT INTO s3_import_state (source, etag, byte_offset, header, prefix_sha256, rows_imported)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE etag = VALUES(etag), byte_offset = VALUES(byte_offset),
+            header = VALUES(header), prefix_sha256 = VALUES(prefix_sha256),
+            rows_imported = rows_imported + VALUES(rows_imported)
+    ''', (source, etag, byte_offset, header, prefix_sha256, rows))
+
+def _read_range(client, bucket, key, start, end):
+    """Bytes start..end-1 of the object."""
+    if end <= start:
+        return b""
+    return client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end - 1}")["Body"].read()
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+def _value(column, text):
+    text = (text or "").strip()
+    if column in BOOLEAN_COLUMNS:
+        return {"true": 1, "false": 0}.get(text.lower())
+    return text or None
+
+def weighbridge_row(record):
+    """weighbridge_data values (COLUMN_MAP order, then the event timestamps) for one export record."""
+    return tuple(_value(column, record.get(export)) for export, column in COLUMN_MAP.items()) \
+        + row_timestamps(record)
+
+def _insert(cursor, source, records):
+    """Insert (line offset, record) pairs not yet imported from ``source``; returns the count inserted."""
+    offsets = [line_offset for line_offset, _ in records]
+    cursor.execute(f'''
+        SELECT import_offset
+        FROM weighbridge_data
+        WHERE import_source = %s AND import_offset IN ({", ".join(["%s"] * len(offsets))})
+    ''', [source] + offsets)
+    existing = {row[0] for row in cursor.fetchall()}
+    records = [(line_offset, record) for line_offset, record in records if line_offset not in existing]
+    if not records:
+        return 0
+    columns = ", ".join(f"`{c}`" for c in COLUMN_MAP.values())
+    placeholders = ", ".join(["%s"] * (len(COLUMN_MAP) + 5))
+    cursor.executemany(
+        f"INSERT INTO weighbridge_data ({columns}, event_ts, load_ts, empty_ts, import_source, import_offset) "
+        f"VALUES ({placeholders})",
+        [weighbridge_row(record) + (source, line_offset) for line_offset, record in records]
+    )
+    net_weights = {}
+    for _, record in records:
+        material = (record.get("Materialname") or "").strip()
+        try:
+            net_weights[material] = net_weights.get(material, 0.0) + float(record.get("NetWeight") or 0)
+        except ValueError:
+            continue
+    for material, net_weight in net_weights.items():
+        stock_ledger.adjust(cursor, material, weighbridge_qty=net_weight)
+    return len(records)
+
+def sync(client=None, conn=None, bucket=BUCKET_NAME, key=OBJECT_NAME):
+    """Import the lines appended since the last sync; returns {'rows', 'offset', 'status'}."""
+    client = client or make_client()
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    cursor = conn.cursor()
+    source = source_name(bucket, key)
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (LOADER_LOCK_NAME,))
+        if cursor.fetchone()[0] != 1:
+            return {"rows": 0, "offset": None, "status": "busy"}
+        try:
+            head = client.head_object(Bucket=bucket, Key=key)
+            size, etag = head["ContentLength"], head["ETag"]
+            state = load_state(cursor, source) or {}
+            offset = state.get("byte_offset") or 0
+            header = state.get("header")
+            if state and etag == state["etag"] and offset == size:
+                return {"rows": 0, "offset": offset, "status": "up to date"}
+
+            tail = _read_range(client, bucket, key, max(0, offset - PREFIX_CHECK_BYTES), min(offset, size))
+            if offset and (size < offset or _sha256(tail) != state.get("prefix_sha256")):
+                raise PrefixChangedError(
+                    f"{source} was rewritten below byte {offset}; run 'python s3_ticket_loader.py reset' to re-import it"
+                )
+            if offset == size:
+                save_state(cursor, source, etag, offset, header, _sha256(tail), 0)
+                conn.commit()
+                return {"rows": 0, "offset": offset, "status": "up to date"}
+
+            body = client.get_object(Bucket=bucket, Key=key, Range=f"bytes={offset}-")["Body"]
+            imported = 0
+            records = []
+            pending = b""
+
+            def flush():
+                nonlocal records, imported
+                inserted = _insert(cursor, source, records) if records else 0
+                save_state(cursor, source, etag, offset, header, _sha256(tail), inserted)
+                conn.commit()
+                imported += inserted
+                records = []
+
+            for chunk in body.iter_chunks(READ_CHUNK_BYTES):
+                lines = (pending + chunk).split(b"\n")
+                pending = lines.pop()
+                for line in lines:
+                    line_offset = offset
+                    offset += len(line) + 1
+                    tail = (tail + line + b"\n")[-PREFIX_CHECK_BYTES:]
+                    text = line.decode("utf-8-sig" if header is None else "utf-8").rstrip("\r")
+                    if not text:
+                        continue
+                    values = next(csv.reader([text]))
+                    if header is None:
+                        header = ",".join(values)
+                        continue
+                    records.append((line_offset, dict(zip(header.split(","), values))))
+                    if len(records) >= CHUNK_ROWS:
+                        flush()
+            flush()
+            return {"rows": imported, "offset": offset, "status": "imported"}
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOADER_LOCK_NAME,))
+            cursor.fetchone()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+
+def reset(conn=None, bucket=BUCKET_NAME, key=OBJECT_NAME):
+    """Delete everything imported from the object and forget the position; returns the rows deleted.
+
+    The deleted rows' net weights come off the stock ledger and their
+    weighbridge matches are dropped, all in one transaction, so the next
+    sync re-imports the object from the start without double counting.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    cursor = conn.cursor()
+    source = source_name(bucket, key)
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (LOADER_LOCK_NAME,))
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("A sync is running; try the reset again once it finishes")
+        try:
+            return _delete_imported(conn, cursor, source)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOADER_LOCK_NAME,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
+        if own_conn:
+            conn.close()
+
+def _delete_imported(conn, cursor, source):
+    try:
+        cursor.execute('''
+            SELECT MaterialName, SUM(COALESCE(NetWeight, 0))
+            FROM weighbridge_data
+            WHERE import_source = %s
+            GROUP BY MaterialName
+        ''', (source,))
+        for material, net_weight in cursor.fetchall():
+            stock_ledger.adjust(cursor, material, weighbridge_qty=-float(net_weight or 0))
+        cursor.execute('''
+            DELETE m FROM weighbridge_matches m
+            JOIN weighbridge_data w ON w.id = m.weighbridge_id
+            WHERE w.import_source = %s
+        ''', (source,))
+        cursor.execute("DELETE FROM weighbridge_data WHERE import_source = %s", (source,))
+        deleted = cursor.rowcount
+        cursor.execute("DELETE FROM s3_import_state WHERE source = %s", (source,))
+        conn.commit()
+        return deleted
+    except Exception:
+        conn.rollback()
+        raise
+
+if __name__ == "__main__":
+    command = sys.argv[1:] or ["sync"]
+    if command == ["sync"]:
+        try:
+            result = sync()
+        except PrefixChangedError as e:
+            print(str(e))
+            sys.exit(1)
+        print(f"{result['status']}: {result['rows']} rows, offset {result['offset']}")
+    elif command == ["reset"]:
+        deleted = reset()
+        print(f"Reset {source_name(BUCKET_NAME, OBJECT_NAME)}: deleted {deleted} imported rows")
+    else:
+        print("usage: python s3_ticket_loader.py [sync|reset]")
+        sys.exit(2)
@@ -0,0 +1,230 @@
+"""Append-only CSV segment store behind the voucher CSV exports.
+
+Each export path in CSV_PATHS (e.g. converted/po.csv) is backed by a
+directory next to it (converted/po.segments/) holding one CSV segment per
+upload and a manifest.json with the union of columns in first-seen order:
+
+    {"columns": [...], "next_segment": 4,
+     "segments": [{"file": "seg-000001.csv", "rows": 120, "columns": [...]}]}
+
+An upload writes only its own segment and rewrites the small manifest, so
+its cost no longer grows with history.  Readers reindex every segment to the
+manifest columns.  Once a store has more than COMPACT_THRESHOLD segments
+they are merged into one.  The flat CSV at the export path is only
+materialized on demand for downloads, and parsed frames are cached in
+memory until the manifest changes.
+"""
+import csv
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+COMPACT_THRESHOLD = 32
+
+_lock = threading.Lock()
+_frame_cache = {}  # csv_path -> ((manifest mtime_ns, size), frame)
+
+def store_dir(csv_path):
+    return os.path.splitext(csv_path)[0] + ".segments"
+
+def manifest_path(csv_path):
+    return os.path.join(store_dir(csv_path), MANIFEST_NAME)
+
+def _empty_manifest():
+    return {"columns": [], "next_segment": 1, "segments": []}
+
+def _write_atomic(path, write):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _save_manifest(csv_path, manifest):
+    _write_atomic(manifest_path(csv_path), lambda f: json.dump(manifest, f))
+
+def _adopt_legacy_csv(csv_path, manifest):
+    """Turn a pre-existing flat export into the store's first segment."""
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        columns = next(reader, [])
+        rows = sum(1 for _ in reader)
+    name = f"seg-{manifest['next_segment']:06d}.csv"
+    os.replace(csv_path, os.path.join(store_dir(csv_path), name))
+    manifest["segments"].append({"file": name, "rows": rows, "columns": columns})
+    manifest["columns"] = list(columns)
+    manifest["next_segment"] += 1
+    logger.info(f"Adopted {csv_path} as segment {name}")
+
+def load_manifest(csv_path):
+    """Return the store's manifest, creating the store on first use."""
+    path = manifest_path(csv_path)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    os.makedirs(store_dir(csv_path), exist_ok=True)
+    manifest = _empty_manifest()
+    if os.path.exists(csv_path):
+        _adopt_legacy_csv(csv_path, manifest)
+    _save_manifest(csv_path, manifest)
+    return manifest
+
+def append_segment(csv_path, columns, write_rows, row_count):
+    """Add one segment with ``columns``; ``write_rows(fileobj)`` writes its CSV body and header.
+
+    Returns the updated manifest.
+    """
+    with _lock:
+        manifest = load_manifest(csv_path)
+        name = f"seg-{manifest['next_segment']:06d}.csv"
+        _write_atomic(os.path.join(store_dir(csv_path), name), write_rows)
+        manifest["segments"].append({"file": name, "rows": row_count, "columns": list(columns)})
+        manifest["columns"] = list(dict.fromkeys(manifest["columns"] + list(columns)))
+        manifest["next_segment"] += 1
+        _save_manifest(csv_path, manifest)
+        if len(manifest["segments"]) > COMPACT_THRESHOLD:
+            manifest = _compact(csv_path, manifest)
+        return manifest
+
+def _read_segment(csv_path, segment, columns, dtype=None):
+    df = pd.read_csv(os.path.join(store_dir(csv_path), segment["file"]), dtype=dtype,
+                     keep_default_na=dtype is None)
+    return df.reindex(columns=columns, fill_value="" if dtype is str else None)
+
+def read_frame(csv_path, dtype=None):
+    """Union of all segments reindexed to the manifest columns, or None if the store is empty."""
+    for attempt in range(2):
+        manifest = load_manifest(csv_path)
+        segments = [s for s in manifest["segments"] if s["rows"]]
+        if not segments:
+            return None
+        try:
+            frames = [_read_segment(csv_path, s, manifest["columns"], dtype) for s in segments]
+        except FileNotFoundError:
+            # A compaction replaced the segments under us; re-read the manifest once.
+            if attempt:
+                raise
+            continue
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+def cached_frame(csv_path):
+    """read_frame() with inf/NaN blanked, memoized on the manifest's mtime and size.
+
+    The returned frame is shared between callers and must not be modified.
+    """
+    load_manifest(csv_path)
+    stat = os.stat(manifest_path(csv_path))
+    key = (stat.st_mtime_ns, stat.st_size)
+    hit = _frame_cache.get(csv_path)
+    if hit is not None and hit[0] == key:
+        return hit[1]
+    df = read_frame(csv_path)
+    if df is not None:
+        df = df.replace({float('inf'): None, float('-inf'): None}).fillna("")
+    _frame_cache[csv_path] = (key, df)
+    return df
+
+def _sort_key(values):
+    # Blanked NaNs leave numeric columns mixed with ""; order those numerically.
+    numeric = pd.to_numeric(values, errors="coerce")
+    if numeric[values != ""].notna().all():
+        return numeric
+    return values.astype(str).str.lower()
+
+def query_frame(df, columns=None, filters=None, sort_by=None, descending=False, offset=0, limit=None):
+    """Filter, sort, page and project a frame from cached_frame().
+
+    ``filters`` maps column -> text matched case-insensitively as a substring.
+    Returns (page, matching row count).  Raises ValueError for unknown columns.
+    """
+    for column in list(columns or []) + list(filters or {}) + ([sort_by] if sort_by else []):
+        if column not in df.columns:
+            raise ValueError(f"Unknown column: {column}")
+    if filters:
+        mask = pd.Series(True, index=df.index)
+        for column, text in filters.items():
+            mask &= df[column].astype(str).str.contains(text, case=False, regex=False)
+        df = df[mask]
+    if sort_by:
+        df = df.sort_values(sort_by, ascending=not descending, kind="stable", key=_sort_key)
+    matched = len(df)
+    df = df.iloc[offset:offset + limit if limit is not None else None]
+    if columns:
+        df = df[list(columns)]
+    return df, matched
+
+def total_rows(csv_path):
+    return sum(s["rows"] for s in load_manifest(csv_path)["segments"])
+
+def _union_writer(csv_path, manifest):
+    """A write callback that streams every segment, as strings, under the manifest columns."""
+    columns = manifest["columns"]
+
+    def write(f):
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for segment in manifest["segments"]:
+            if segment["rows"]:
+                df = _read_segment(csv_path, segment, columns, dtype=str)
+                writer.writerows(df.itertuples(index=False, name=None))
+    return write
+
+def _compact(csv_path, manifest):
+    columns = manifest["columns"]
+    name = f"seg-{manifest['next_segment']:06d}.csv"
+    old_files = [s["file"] for s in manifest["segments"]]
+    _write_atomic(os.path.join(store_dir(csv_path), name), _union_writer(csv_path, manifest))
+    rows = sum(s["rows"] for s in manifest["segments"])
+    manifest = {
+        "columns": columns,
+        "next_segment": manifest["next_segment"] + 1,
+        "segments": [{"file": name, "rows": rows, "columns": columns}]
+    }
+    _save_manifest(csv_path, manifest)
+    for old in old_files:
+        os.remove(os.path.join(store_dir(csv_path), old))
+    logger.info(f"Compacted {len(old_files)} segments of {csv_path} into {name}")
+    return manifest
+
+def compact(csv_path):
+    """Merge all segments of the store into one; returns the new manifest."""
+    with _lock:
+        manifest = load_manifest(csv_path)
+        if len(manifest["segments"]) <= 1:
+            return manifest
+        return _compact(csv_path, manifest)
+
+def materialize(csv_path):
+    """Write the union of all segments to ``csv_path`` for download.
+
+    The flat file is rebuilt only when the manifest is newer.  Returns the
+    path, or None if the store has no rows.
+    """
+    with _lock:
+        manifest = load_manifest(csv_path)
+        if not any(s["rows"] for s in manifest["segments"]):
+            return None
+        if (os.path.exists(csv_path)
+                and os.path.getmtime(csv_path) >= os.path.getmtime(manifest_path(csv_path))):
+            return csv_path
+        _write_atomic(csv_path, _union_writer(csv_path, manifest))
+        return csv_path
+
+def clear(csv_path):
+    """Remove the store and any materialized export."""
+    with _lock:
+        shutil.rmtree(store_dir(csv_path), ignore_errors=True)
+        if os.path.exists(csv_path):
+            os.remove(csv_path)
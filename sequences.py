@@ -0,0 +1,49 @@
+"""Counter-table allocation of primary keys and serial numbers.
+
+id_sequences holds one row per sequence assigned client-side.
+A block is reserved with a single UPDATE using LAST_INSERT_ID(expr), which
+is atomic and connection-local, so callers should allocate on an autocommit
+connection (or commit straight after allocating) to release the counter row
+lock immediately.
+"""
+
+# sequence name -> (table, column) the counter must stay ahead of
+SEQUENCES = {
+    "vouchers": ("vouchers", "id"),
+    "inventory_entries": ("inventory_entries", "id"),
+    "ledger_details": ("ledger_details", "id"),
+    "inward_no": ("vehicles", "sno"),
+}
+
+INWARD_NO_PREFIX = "INWB"
+
+def allocate_ids(cursor, name, count):
+    """Reserve ``count`` consecutive values of sequence ``name``; returns the first.
+
+    The counter is never allowed to fall behind the MAX of its column (an
+    index lookup), so rows numbered elsewhere can't collide with a reserved
+    block.
+    """
+    if name not in SEQUENCES:
+        raise ValueError(f"No sequence named: {name}")
+    if count <= 0:
+        return None
+    table, column = SEQUENCES[name]
+    cursor.execute(f'''
+        UPDATE id_sequences
+        SET next_value = LAST_INSERT_ID(
+            GREATEST(next_value, (SELECT COALESCE(MAX({column}), 0) + 1 FROM {table})) + %s
+        )
+        WHERE name = %s
+    ''', (count, name))
+    if cursor.rowcount == 0:
+        cursor.execute("INSERT IGNORE INTO id_sequences (name, next_value) VALUES (%s, 1)", (name,))
+        return allocate_ids(cursor, name, count)
+    cursor.execute("SELECT LAST_INSERT_ID() AS next_value")
+    row = cursor.fetchone()
+    next_value = row["next_value"] if isinstance(row, dict) else row[0]
+    return next_value - count
+
+def format_inward_no(sno):
+    """Inward number shown for a vehicle serial number, e.g. INWB007."""
+    return f"{INWARD_NO_PREFIX}{str(sno).zfill(3)}"
@@ -22,21 +22,36 @@ const InventoryManagement = () => {
       const response = await fetch("http://localhost:5000/inventory/stats")
       const data = await response.json()
       setDashboardData(data)
+      if (data.materials) {
+        setMaterialData(
+          data.materials.map((material) => ({
+            name: material.material,
+            quantity: material.in_stock_qty,
+            unit: material.unit || "",
+            pending: material.pending_qty,
+            icon: materialIcons[material.material] || "📦",
+          })),
+        )
+      }
     } catch (error) {
       console.error("Error fetching inventory stats:", error)
     }
   }
 
-  const [materialData] = useState([
-    { name: "Cement", quantity: 500, unit: "bags", pending: 50, icon: "🏗️" },
-    { name: "Steel Bars", quantity: 200, unit: "tons", pending: 0, icon: "🔩" },
-    { name: "Bricks", quantity: 100, unit: "pieces", pending: 2000, icon: "🧱" },
-    { name: "Sand", quantity: 150, unit: "cubic meters", pending: 25, icon: "⏳" },
-    { name: "Gravel", quantity: 100, unit: "cubic meters", pending: 0, icon: "🪨" },
-    { name: "Paint", quantity: 80, unit: "liters", pending: 15, icon: "🎨" },
-    { name: "Tiles", quantity: 500, unit: "sq meters", pending: 100, icon: "⬜" },
-    { name: "Wood", quantity: 50, unit: "cubic meters", pending: 10, icon: "🪵" },
-  ])
+  const materialIcons = {
+    Cement: "🏗️",
+    "Steel Bars": "🔩",
+    Steel: "🔩",
+    Bricks: "🧱",
+    Sand: "⏳",
+    Gravel: "🪨",
+    Paint: "🎨",
+    Tiles: "⬜",
+    Wood: "🪵",
+  }
+
+  // Stock levels per material from the stock ledger
+  const [materialData, setMaterialData] = useState([])
 
   // Calculate chart data for order statistics
   const orderChartData = [
@@ -50,7 +65,7 @@ const InventoryManagement = () => {
 
   // Get max value for chart scaling
   const maxOrderValue = Math.max(...orderChartData.map((item) => item.value))
-  const maxMaterialValue = Math.max(...materialData.map((item) => item.quantity))
+  const maxMaterialValue = Math.max(1, ...materialData.map((item) => item.quantity))
 
   return (
     <div className="inventory-management">
@@ -60,52 +60,27 @@ const SupplierDetail = () => {
 
       setLoading(true)
       try {
-        const [customerResponse, inventoryResponse, materialsResponse] = await Promise.all([
-          fetch(`http://127.0.0.1:8001/api/vouchers/customer-name?vch_no=${encodeURIComponent(formData.poNumber)}`, {
-            credentials: 'include'
-          }),
-          fetch(`http://127.0.0.1:8001/api/vouchers/inventory-details?vch_no=${encodeURIComponent(formData.poNumber)}`, {
-            credentials: 'include'
-          }),
-          fetch(`http://127.0.0.1:8001/api/vouchers/materials-by-voucher?vch_no=${encodeURIComponent(formData.poNumber)}`, {
-            credentials: 'include'
-          })
-        ])
-
-        let customerData = { customer_name: "" }
-        if (customerResponse.ok) {
-          customerData = await customerResponse.json()
-        } else {
-          const error = await customerResponse.json()
-          console.error(`Error fetching customer name for vch_no ${formData.poNumber}: ${error.detail}`)
-          setError(`Error fetching customer name: ${error.detail}`)
-        }
-
-        let inventoryData = { stock_item: "", actual_qty: 0.0, rate: 0.0 }
-        if (inventoryResponse.ok) {
-          inventoryData = await inventoryResponse.json()
-        } else {
-          const error = await inventoryResponse.json()
-          console.error(`Error fetching inventory details for vch_no ${formData.poNumber}: ${error.detail}`)
-          setError((prev) => prev ? `${prev}\nError fetching inventory details: ${error.detail}` : `Error fetching inventory details: ${error.detail}`)
-        }
+        const response = await fetch(`http://127.0.0.1:8001/api/vouchers/${encodeURIComponent(formData.poNumber)}/summary`, {
+          credentials: 'include'
+        })
 
-        let materialsData = { data: {} }
-        if (materialsResponse.ok) {
-          materialsData = await materialsResponse.json()
+        let summary = { customer_name: "", materials: [], inventory: null }
+        if (response.ok) {
+          summary = await response.json()
         } else {
-          const error = await materialsResponse.json()
-          console.error(`Error fetching materials for vch_no ${formData.poNumber}: ${error.detail}`)
-          setError((prev) => prev ? `${prev}\nError fetching materials: ${error.detail}` : `Error fetching materials: ${error.detail}`)
+          const error = await response.json()
+          console.error(`Error fetching voucher summary for vch_no ${formData.poNumber}: ${error.detail}`)
+          setError(`Error fetching voucher details: ${error.detail}`)
         }
 
-        const stockItems = materialsData.data[formData.poNumber] || []
-        setMaterials(stockItems.filter(item => item !== null))
-        const defaultMaterial = stockItems.length > 0 && stockItems[0] !== null ? stockItems[0] : ""
+        const inventoryData = summary.inventory || { stock_item: "", actual_qty: 0.0, rate: 0.0 }
+        const stockItems = (summary.materials || []).filter(item => item !== null)
+        setMaterials(stockItems)
+        const defaultMaterial = stockItems.length > 0 ? stockItems[0] : ""
 
         setFormData((prev) => ({
           ...prev,
-          supplierName: customerData.customer_name || "",
+          supplierName: summary.customer_name || "",
           material: defaultMaterial,
           receivedQty: inventoryData.actual_qty !== 0 ? inventoryData.actual_qty.toString() : "",
           poRate: inventoryData.rate !== 0 ? inventoryData.rate.toString() : ""
@@ -140,6 +140,18 @@ const VehicleEntry = () => {
     setShowDetailsForm(false)
   }
 
+  const waitForVideoJob = async (jobId) => {
+    // Detection runs in the background; poll until the job finishes
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, 1000))
+      const response = await fetch(`http://localhost:5000/vehicles/process-video/${jobId}`)
+      const job = await response.json()
+      if (!response.ok) return { success: false, error: job.error }
+      if (job.status === "done") return job.result
+      if (job.status === "error") return { success: false, error: job.error }
+    }
+  }
+
   const handleVideoProcessing = async () => {
     if (!videoFile) return alert("Please upload a video first.")
     const formData = new FormData()
@@ -150,7 +162,12 @@ const VehicleEntry = () => {
         method: "POST",
         body: formData,
       })
-      const data = await response.json()
+      const queued = await response.json()
+      if (!queued.success) {
+        alert(`❌ Error: ${queued.error}`)
+        return
+      }
+      const data = await waitForVideoJob(queued.job_id)
       if (data.success) {
         setDetectedVehicle(data.vehicle_data)
         if (data.matched) {
@@ -0,0 +1,135 @@
+"""Materialized per-material stock levels behind /inventory/stats.
+
+stock_ledger holds one row per material name with running totals:
+
+    ordered_qty      po_details.quantity
+    received_qty     supplier.receivedQty
+    weighbridge_qty  weighbridge_data.NetWeight
+    consumed_qty     batch_slips.quantity, under the slip's description
+
+In-stock quantity is received_qty - consumed_qty.  weighbridge_qty is
+kept alongside but not added to it: the weighbridge weighs the same
+trucks whose receipts are booked as supplier rows (vehicle_matching.py
+links the two), so counting both would take in every delivery twice.  It
+is there to compare weighed against booked quantities per material.
+
+Each write handler adds its change with adjust() in its own transaction,
+so the inventory page reads the ledger instead of aggregating the history
+tables.  Batch slips record the product dispatched, not the raw materials
+that went into it, so consumption only nets out against stock when the
+slip description matches a material name.  If the ledger drifts (rows
+edited by hand, a writer that bypasses adjust()), rebuild it with
+POST /inventory/stats/rebuild or:
+
+    python stock_ledger.py rebuild
+"""
+import sys
+
+from db_config import get_db_connection
+
+LEDGER_COLUMNS = ("ordered_qty", "received_qty", "weighbridge_qty", "consumed_qty")
+
+def _qty(value):
+    try:
+        return float(value) if value not in (None, "") else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+def adjust(cursor, material, unit=None, **deltas):
+    """Add ``deltas`` (ordered_qty=..., received_qty=..., ...) to a material's totals."""
+    material = (material or "").strip()
+    deltas = {column: _qty(value) for column, value in deltas.items() if _qty(value)}
+    if not material or not deltas:
+        return
+    unknown = set(deltas) - set(LEDGER_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown stock ledger columns: {', '.join(sorted(unknown))}")
+    values = [deltas.get(column, 0.0) for column in LEDGER_COLUMNS]
+    updates = ", ".join(f"{column} = {column} + VALUES({column})" for column in deltas)
+    cursor.execute(f'''
+        INSERT INTO stock_ledger (material, unit, {", ".join(LEDGER_COLUMNS)})
+        VALUES (%s, %s, {", ".join(["%s"] * len(LEDGER_COLUMNS))})
+        ON DUPLICATE KEY UPDATE {updates}, unit = COALESCE(VALUES(unit), unit)
+    ''', [material, unit] + values)
+
+def adjust_many(cursor, column, deltas):
+    """adjust() one column for many materials with a single executemany; ``deltas`` maps material -> delta."""
+    if column not in LEDGER_COLUMNS:
+        raise ValueError(f"Unknown stock ledger column: {column}")
+    rows = {}
+    for material, delta in deltas.items():
+        material = (material or "").strip()
+        if material and _qty(delta):
+            rows[material] = rows.get(material, 0.0) + _qty(delta)
+    if not rows:
+        return
+    cursor.executemany(f'''
+        INSERT INTO stock_ledger (material, {column}) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE {column} = {column} + VALUES({column})
+    ''', sorted(rows.items()))
+
+def stock_levels(cursor):
+    """Every material's totals plus in-stock and pending quantities, largest stock first.
+
+    in_stock_qty leaves out weighbridge_qty, which measures the same
+    deliveries as received_qty (see the module docstring).
+    """
+    cursor.execute(f'''
+        SELECT material, unit, {", ".join(LEDGER_COLUMNS)}, updated_at
+        FROM stock_ledger
+        ORDER BY received_qty - consumed_qty DESC, material
+    ''')
+    columns = [c[0] for c in cursor.description]
+    levels = []
+    for row in cursor.fetchall():
+        row = row if isinstance(row, dict) else dict(zip(columns, row))
+        entry = {"material": row["material"], "unit": row["unit"], "updated_at": row["updated_at"]}
+        entry.update({column: float(row[column]) for column in LEDGER_COLUMNS})
+        entry["in_stock_qty"] = entry["received_qty"] - entry["consumed_qty"]
+        entry["pending_qty"] = max(entry["ordered_qty"] - entry["received_qty"], 0.0)
+        levels.append(entry)
+    return levels
+
+def rebuild_stock_ledger(cursor):
+    """Recompute every material's totals from the history tables; returns the row count."""
+    cursor.execute("DELETE FROM stock_ledger")
+    cursor.execute('''
+        INSERT INTO stock_ledger (material, unit, ordered_qty, received_qty, weighbridge_qty, consumed_qty)
+        SELECT m.material,
+               MAX(m.unit),
+               SUM(m.ordered_qty), SUM(m.received_qty), SUM(m.weighbridge_qty), SUM(m.consumed_qty)
+        FROM (
+            SELECT TRIM(material) AS material, NULL AS unit,
+                   quantity AS ordered_qty, 0 AS received_qty, 0 AS weighbridge_qty, 0 AS consumed_qty
+            FROM po_details
+            UNION ALL
+            SELECT TRIM(material), uom, 0, COALESCE(receivedQty, 0), 0, 0
+            FROM supplier
+            UNION ALL
+            SELECT TRIM(Materialname), NULL, 0, 0, COALESCE(NetWeight, 0), 0
+            FROM weighbridge_data
+            UNION ALL
+            SELECT TRIM(description), unit, 0, 0, 0, COALESCE(quantity, 0)
+            FROM batch_slips
+        ) m
+        WHERE m.material IS NOT NULL AND m.material <> ''
+        GROUP BY m.material
+    ''')
+    return cursor.rowcount
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        print("usage: python stock_ledger.py rebuild")
+        sys.exit(2)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        count = rebuild_stock_ledger(cursor)
+        conn.commit()
+        print(f"Rebuilt stock_ledger: {count} materials")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,184 @@
+"""Outbox for supplier details created from vehicle entries.
+
+create_vehicle writes a supplier_outbox row in the same transaction as the
+vehicle, so the gate operator's request no longer waits on the PO lookup
+and supplier insert.  A background worker claims due rows in batches with
+SELECT ... FOR UPDATE SKIP LOCKED (several app processes can run workers
+without handing out a row twice), runs the handler for each inside a
+savepoint, and commits the supplier rows together with the outbox status.
+A failing row is retried with exponential backoff and marked 'failed'
+after OUTBOX_MAX_ATTEMPTS; status() summarises the queue.
+
+    start_worker(get_db_connection, handler, after_commit)
+    ...
+    enqueue(cursor, vehicle_data)
+    conn.commit()
+    notify()
+"""
+import threading
+import time
+
+OUTBOX_BATCH_SIZE = 20
+OUTBOX_POLL_INTERVAL = 2       # seconds between polls when the queue is idle
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_BASE = 5          # seconds before the first retry, doubled per attempt
+OUTBOX_RETRY_MAX = 600
+OUTBOX_RETENTION_DAYS = 7      # processed rows older than this are purged
+OUTBOX_PURGE_INTERVAL = 3600
+
+_wakeup = threading.Event()
+_worker = None
+
+def enqueue(cursor, vehicle_data):
+    """Queue supplier-detail creation for a vehicle entry; commit with the caller's transaction."""
+    cursor.execute('''
+        INSERT INTO supplier_outbox (inward_no, vehicle_number, supplier_name, material, entry_time)
+        VALUES (%s, %s, %s, %s, %s)
+    ''', (
+        vehicle_data['inward_no'],
+        vehicle_data['vehicle_number'],
+        vehicle_data['supplier_name'],
+        vehicle_data['material'],
+        vehicle_data.get('entry_time')
+    ))
+
+def notify():
+    """Wake the worker so a freshly committed entry is picked up without waiting for the poll."""
+    _wakeup.set()
+
+def retry_delay(attempts):
+    return min(OUTBOX_RETRY_BASE * 2 ** (attempts - 1), OUTBOX_RETRY_MAX)
+
+def process_batch(conn, handler, limit=OUTBOX_BATCH_SIZE):
+    """Claim up to ``limit`` due rows and run ``handler(cursor, row)`` for each.
+
+    Returns (number of rows claimed, handler results for the rows that
+    succeeded); the results are only meaningful once this has committed.
+    """
+    cursor = conn.cursor(dictionary=True)
+    results = []
+    try:
+        cursor.execute('''
+            SELECT id, inward_no, vehicle_number, supplier_name, material, entry_time, attempts
+            FROM supplier_outbox
+            WHERE status = 'pending' AND next_attempt_at <= NOW()
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        ''', (limit,))
+        rows = cursor.fetchall()
+        for row in rows:
+            cursor.execute("SAVEPOINT outbox_row")
+            try:
+                results.append(handler(cursor, row))
+                cursor.execute('''
+                    UPDATE supplier_outbox
+                    SET status = 'done', attempts = attempts + 1, last_error = NULL, processed_at = NOW()
+                    WHERE id = %s
+                ''', (row['id'],))
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT outbox_row")
+                attempts = row['attempts'] + 1
+                print(f"Supplier outbox entry {row['id']} failed (attempt {attempts}): {str(e)}")
+                cursor.execute('''
+                    UPDATE supplier_outbox
+                    SET status = %s, attempts = %s, last_error = %s,
+                        next_attempt_at = NOW() + INTERVAL %s SECOND
+                    WHERE id = %s
+                ''', (
+                    'failed' if attempts >= OUTBOX_MAX_ATTEMPTS else 'pending',
+                    attempts, str(e)[:2000], retry_delay(attempts), row['id']
+                ))
+        conn.commit()
+        return len(rows), results
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def purge_processed(conn, days=OUTBOX_RETENTION_DAYS):
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            DELETE FROM supplier_outbox
+            WHERE status = 'done' AND processed_at < NOW() - INTERVAL %s DAY
+        ''', (days,))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+def retry_failed(cursor, entry_id=None):
+    """Put failed rows (or one row) back in the queue; returns the number requeued."""
+    query = '''
+        UPDATE supplier_outbox
+        SET status = 'pending', attempts = 0, next_attempt_at = NOW()
+        WHERE status = 'failed'
+    '''
+    params = ()
+    if entry_id is not None:
+        query += " AND id = %s"
+        params = (entry_id,)
+    cursor.execute(query, params)
+    return cursor.rowcount
+
+def status(cursor, recent_failures=20):
+    """Queue counts by status, the oldest due entry, and the latest failures."""
+    cursor.execute("SELECT status, COUNT(*) AS count FROM supplier_outbox GROUP BY status")
+    counts = {'pending': 0, 'done': 0, 'failed': 0}
+    counts.update({row['status']: row['count'] for row in cursor.fetchall()})
+    cursor.execute('''
+        SELECT MIN(created_at) AS oldest_pending
+        FROM supplier_outbox
+        WHERE status = 'pending'
+    ''')
+    oldest = cursor.fetchone()['oldest_pending']
+    cursor.execute('''
+        SELECT id, inward_no, vehicle_number, attempts, last_error, next_attempt_at, created_at
+        FROM supplier_outbox
+        WHERE status = 'failed' OR (status = 'pending' AND attempts > 0)
+        ORDER BY id DESC
+        LIMIT %s
+    ''', (recent_failures,))
+    return {
+        'counts': counts,
+        'oldest_pending': oldest,
+        'failures': cursor.fetchall(),
+        'worker_running': _worker is not None and _worker.is_alive()
+    }
+
+def _run(connect, handler, after_commit):
+    conn = None
+    last_purge = 0
+    while True:
+        _wakeup.clear()
+        try:
+            if conn is None or not conn.is_connected():
+                conn = connect()
+            claimed, results = process_batch(conn, handler)
+            if after_commit is not None and results:
+                after_commit(results)
+            if claimed == OUTBOX_BATCH_SIZE:
+                continue  # more may be due; don't wait for the next poll
+            if time.monotonic() - last_purge > OUTBOX_PURGE_INTERVAL:
+                purge_processed(conn)
+                last_purge = time.monotonic()
+        except Exception as e:
+            print(f"Supplier outbox worker error: {str(e)}")
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            conn = None
+        _wakeup.wait(OUTBOX_POLL_INTERVAL)
+
+def start_worker(connect, handler, after_commit=None):
+    """Start the background consumer once per process; returns the thread."""
+    global _worker
+    if _worker is None or not _worker.is_alive():
+        _worker = threading.Thread(target=_run, args=(connect, handler, after_commit),
+                                   name="supplier-outbox", daemon=True)
+        _worker.start()
+    return _worker
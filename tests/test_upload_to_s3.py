@@ -0,0 +1,101 @@
+"""upload_to_s3.py against a local S3 stand-in.
+
+Set S3_ENDPOINT_URL (and the usual AWS_* credentials) to run against MinIO
+or another S3-compatible server; otherwise moto's in-process mock is used.
+Skipped when neither is available.
+"""
+import gzip
+import os
+import uuid
+from datetime import datetime
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+
+import upload_to_s3
+
+HEADER = b"TicketNumber,VehicleNumber,Date\n"
+
+@pytest.fixture
+def s3(monkeypatch):
+    if upload_to_s3.S3_ENDPOINT_URL:
+        yield upload_to_s3.get_client()
+        return
+    moto = pytest.importorskip("moto")
+    mock = getattr(moto, "mock_aws", None) or moto.mock_s3
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        monkeypatch.setenv(name, "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock():
+        yield upload_to_s3.get_client()
+
+@pytest.fixture
+def bucket(s3):
+    name = f"upload-test-{uuid.uuid4().hex[:12]}"
+    s3.create_bucket(Bucket=name)
+    yield name
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=name):
+        for obj in page.get("Contents", []):
+            s3.delete_object(Bucket=name, Key=obj["Key"])
+    s3.delete_bucket(Bucket=name)
+
+def segment_body(s3, bucket, key):
+    return gzip.decompress(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+
+def test_upload_skips_unchanged_file(s3, bucket, tmp_path):
+    path = tmp_path / "tickets_data.csv"
+    path.write_bytes(HEADER + b"1,KA01AB1234,2024-01-01\n")
+
+    assert upload_to_s3.upload_to_s3(str(path), bucket, "tickets_data.csv", s3=s3) is True
+    assert upload_to_s3.upload_to_s3(str(path), bucket, "tickets_data.csv", s3=s3) is False
+    assert upload_to_s3.upload_to_s3(str(path), bucket, "tickets_data.csv", s3=s3, force=True) is True
+
+    path.write_bytes(path.read_bytes() + b"2,KA01AB1234,2024-01-01\n")
+    assert upload_to_s3.upload_to_s3(str(path), bucket, "tickets_data.csv", s3=s3) is True
+    head = s3.head_object(Bucket=bucket, Key="tickets_data.csv")
+    assert head["Metadata"]["sha256"] == upload_to_s3.file_sha256(str(path))
+    assert s3.get_object(Bucket=bucket, Key="tickets_data.csv")["Body"].read() == path.read_bytes()
+
+def test_segments_follow_appended_rows(s3, bucket, tmp_path):
+    path = tmp_path / "tickets_data.csv"
+    first_rows = b"1,KA01AB1234,2024-01-01\n2,KA02CD5678,2024-01-01\n"
+    path.write_bytes(HEADER + first_rows)
+    now = datetime(2024, 1, 2, 3, 4, 5)
+
+    key = upload_to_s3.upload_new_rows(str(path), bucket, "segments/", s3=s3, now=now)
+    start, end = len(HEADER), len(HEADER) + len(first_rows)
+    assert key == f"segments/2024/01/02/030405-{start:012d}-{end:012d}.csv.gz"
+    assert segment_body(s3, bucket, key) == HEADER + first_rows
+    assert upload_to_s3.load_segment_state(str(path))["offset"] == end
+
+    # Nothing appended: no segment
+    assert upload_to_s3.upload_new_rows(str(path), bucket, "segments/", s3=s3, now=now) is None
+
+    # A trailing partial line waits for the next run
+    new_row = b"3,KA03EF9012,2024-01-02\n"
+    with open(path, "ab") as f:
+        f.write(new_row + b"4,KA04")
+    key = upload_to_s3.upload_new_rows(str(path), bucket, "segments/", s3=s3, now=now)
+    assert key.endswith(f"-{end:012d}-{end + len(new_row):012d}.csv.gz")
+    assert segment_body(s3, bucket, key) == HEADER + new_row
+    head = s3.head_object(Bucket=bucket, Key=key)
+    assert head["Metadata"] == {"start-offset": str(end), "end-offset": str(end + len(new_row))}
+    end += len(new_row)
+
+    with open(path, "ab") as f:
+        f.write(b"GH3456,2024-01-02\n")
+    key = upload_to_s3.upload_new_rows(str(path), bucket, "segments/", s3=s3, now=now)
+    assert segment_body(s3, bucket, key) == HEADER + b"4,KA04GH3456,2024-01-02\n"
+
+def test_rewritten_file_segments_from_first_row(s3, bucket, tmp_path):
+    path = tmp_path / "tickets_data.csv"
+    path.write_bytes(HEADER + b"1,KA01AB1234,2024-01-01\n")
+    assert upload_to_s3.upload_new_rows(str(path), bucket, "segments/", s3=s3)
+
+    rewritten = b"7,MH12XY0001,2024-02-01\n8,MH12XY0002,2024-02-01\n"
+    path.write_bytes(HEADER + rewritten)
+    key = upload_to_s3.upload_new_rows(str(path), bucket, "segments/", s3=s3)
+    assert f"-{len(HEADER):012d}-" in key
+    assert segment_body(s3, bucket, key) == HEADER + rewritten
+    assert os.path.exists(upload_to_s3.segment_state_path(str(path)))
@@ -0,0 +1,61 @@
+"""GET /api/vouchers/{vch_no}/summary routing and its response cache.
+
+Needs the extractor service importable (FastAPI, the OCR and Gemini
+clients, a Tesseract install); skipped otherwise.  The database is
+replaced by stubs.
+"""
+import pytest
+
+@pytest.fixture
+def extractor(tmp_path, monkeypatch):
+    # Importing the service creates its upload/output folders in the working directory
+    monkeypatch.chdir(tmp_path)
+    pytest.importorskip("fastapi.testclient")
+    try:
+        import extractor1
+    except Exception as e:
+        pytest.skip(f"extractor service not importable: {e}")
+    extractor1.summary_cache.clear()
+    extractor1.grn_cache.clear()
+    yield extractor1
+    extractor1.summary_cache.clear()
+    extractor1.grn_cache.clear()
+
+class StubConnection:
+    def cursor(self, **kwargs):
+        return self
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def client(extractor, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(extractor, "get_db_connection", StubConnection)
+    monkeypatch.setattr(extractor, "fetch_voucher_summary", lambda cursor, vch_no: {"vch_no": vch_no})
+    monkeypatch.setattr(extractor, "search_vouchers",
+                        lambda cursor, prefix, limit: [{"vch_no": prefix + "001", "customer_name": ""}])
+    return TestClient(extractor.app)
+
+def test_summary_accepts_vch_no_with_slashes(client):
+    response = client.get("/api/vouchers/PO%2F2024%2F001/summary")
+    assert response.status_code == 200
+    assert response.json()["vch_no"] == "PO/2024/001"
+
+def test_prefix_search_accepts_vch_no_with_slashes(client):
+    response = client.get("/api/vouchers/PO%2F2024%2F/summary", params={"mode": "prefix"})
+    assert response.status_code == 200
+    assert response.json()["matches"] == [{"vch_no": "PO/2024/001", "customer_name": ""}]
+
+def test_invalidation_drops_matching_prefix_searches(extractor):
+    extractor.cache_put(extractor.summary_cache, "PO/2024/001", {"vch_no": "PO/2024/001"})
+    extractor.cache_put(extractor.summary_cache, ("prefix", "PO/2024", 10), {"matches": []})
+    extractor.cache_put(extractor.summary_cache, ("prefix", "PO/2023", 10), {"matches": []})
+
+    extractor.invalidate_voucher_caches("PO/2024/001")
+
+    assert list(extractor.summary_cache) == [("prefix", "PO/2023", 10)]
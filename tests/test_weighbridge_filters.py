@@ -0,0 +1,78 @@
+"""The /weighbridge-data filter queries and the indexes that serve them.
+
+The EXPLAIN tests need the application database (db_config) with the
+migrations applied and are skipped when it cannot be reached.  They run
+against a session-local TEMPORARY copy of weighbridge_data (same columns
+and indexes, SAMPLE_ROWS known rows), which shadows the real table for the
+connection, so the plans do not depend on how much data the database
+holds and nothing is written to it.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from weighbridge_filters import weighbridge_data_query
+
+SAMPLE_ROWS = 5000
+SAMPLE_STATES = ("KA", "MH", "TN", "AP", "TS", "KL", "GJ", "RJ", "DL", "UP")
+
+def test_date_filters_are_half_open_ranges():
+    query, params = weighbridge_data_query({'dateFrom': '2024-01-01', 'dateTo': '2024-01-31'})
+    assert 'Date >= %s' in query and 'Date < %s' in query
+    assert 'DATE(' not in query
+    assert params == [datetime(2024, 1, 1), datetime(2024, 2, 1)]
+
+def test_vehicle_filter_is_an_escaped_key_prefix():
+    query, params = weighbridge_data_query({'vehicleNumber': 'ka-01 a_b'})
+    assert 'VehicleNumberKey LIKE %s' in query
+    assert params == ['KA01A\\_B%']
+
+def test_malformed_date_is_rejected():
+    with pytest.raises(ValueError, match='dateTo'):
+        weighbridge_data_query({'dateTo': '31/01/2024'})
+
+def sample_row(i, start=datetime(2023, 1, 1)):
+    """Row i of the sample: one weighing every 3 hours from 2023, 500 distinct plates."""
+    plate = f"{SAMPLE_STATES[i % 10]}-{(i // 10) % 50:02d}-AB-{i % 500:04d}"
+    return (i, plate, start + timedelta(hours=3 * i), "ABC"[i % 3], f"Material {i % 20}", f"Supplier {i % 40}")
+
+@pytest.fixture(scope='module')
+def cursor():
+    mysql_connector = pytest.importorskip('mysql.connector')
+    from db_config import get_db_connection
+    try:
+        conn = get_db_connection()
+    except mysql_connector.Error as e:
+        pytest.skip(f'no database configured: {e}')
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute('CREATE TEMPORARY TABLE weighbridge_data LIKE weighbridge_data')
+    cursor.executemany('''
+        INSERT INTO weighbridge_data (TicketNumber, VehicleNumber, Date, Shift, MaterialName, SupplierName)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    ''', [sample_row(i) for i in range(SAMPLE_ROWS)])
+    cursor.execute('ANALYZE TABLE weighbridge_data')
+    cursor.fetchall()
+    yield cursor
+    cursor.execute('DROP TEMPORARY TABLE weighbridge_data')
+    cursor.close()
+    conn.close()
+
+DATE_INDEX = {'idx_weighbridge_date_shift'}
+VEHICLE_INDEXES = {'idx_weighbridge_vehicle_date', 'idx_weighbridge_vehicle_event'}
+
+@pytest.mark.parametrize('args, index, chosen', [
+    ({'dateFrom': '2024-01-01', 'dateTo': '2024-01-31'}, 'idx_weighbridge_date_shift', DATE_INDEX),
+    ({'dateFrom': '2024-01-01', 'dateTo': '2024-01-01', 'shift': 'A'}, 'idx_weighbridge_date_shift', DATE_INDEX),
+    ({'vehicleNumber': 'KA 01'}, 'idx_weighbridge_vehicle_date', VEHICLE_INDEXES),
+    ({'vehicleNumber': 'KA-01-AB', 'dateFrom': '2024-01-01'}, 'idx_weighbridge_vehicle_date', VEHICLE_INDEXES),
+    ({'dateFrom': '2024-01-01', 'dateTo': '2024-01-31', 'materialName': 'Material 1', 'supplierName': 'Supplier'},
+     'idx_weighbridge_date_shift', DATE_INDEX),
+])
+def test_filters_use_an_index(cursor, args, index, chosen):
+    query, params = weighbridge_data_query(args)
+    cursor.execute('EXPLAIN ' + query, params)
+    plan = [row for row in cursor.fetchall() if row['table'] == 'weighbridge_data']
+    assert plan, 'weighbridge_data missing from the plan'
+    assert index in (plan[0]['possible_keys'] or '').split(',')
+    assert plan[0]['type'] != 'ALL', f"full scan for {args}: {plan[0]}"
+    assert plan[0]['key'] in chosen, f"{args} used {plan[0]['key']}, expected one of {sorted(chosen)}"
@@ -0,0 +1,241 @@
+"""Link weighbridge weighings to gate entries and supplier rows.
+
+A delivery leaves three records: the gate entry (vehicles, from
+create_vehicle), one or two weighings (weighbridge_data) and the supplier
+row created for the entry (supplier, sharing its inwardNo).  All of them
+carry a plate typed or read differently, so plates are compared by their
+normalized key (separators stripped, upper-cased) through stored generated
+columns: weighbridge_data.VehicleNumberKey, vehicles.vehicle_number_key and
+supplier.vehicleNoKey.
+
+match_pending() takes the weighings not yet in weighbridge_matches, oldest
+id first, and for each batch loads the unlinked gate entries and supplier
+rows for the same plates and time span.  One sorted pass over gate
+entries and weighings, by time, keeps the open gate entries of each plate
+in a queue; a weighing takes the oldest entry of its plate no older than
+MATCH_WINDOW.  Gate clocks may run a little ahead of the weighbridge's, so
+entries are placed GATE_CLOCK_SKEW earlier in the pass.  The supplier row
+is the one created for the matched entry (same inwardNo), else the oldest
+open supplier row of the plate in the window.  The second weighing of a
+ticket reuses the first weighing's links.  Unmatched weighings are
+recorded with no links; rematch() retries them.  app.py runs
+match_pending() every MATCH_INTERVAL seconds, and runs are serialised by a
+named lock, so a run started while another holds it returns 'busy'.
+
+Only weighbridge_data is matched.  The trips weighbridge_pairing.py writes
+to ticket_details are built from the same weighbridge export, so matching
+them as well would link each delivery twice and let one trip use up two
+gate entries.
+"""
+import threading
+from collections import defaultdict, deque
+from datetime import timedelta
+
+from db_config import get_db_connection
+
+MATCH_WINDOW = timedelta(hours=6)
+GATE_CLOCK_SKEW = timedelta(minutes=15)
+MATCH_BATCH_SIZE = 1000
+MATCH_INTERVAL = 300
+MATCH_LOCK_NAME = "vehicle_matching"
+
+def _in_list(values):
+    return ", ".join(["%s"] * len(values))
+
+def _pending_weighings(cursor, after_id, limit):
+    cursor.execute('''
+        SELECT w.id, w.TicketNumber, w.VehicleNumberKey, w.event_ts
+        FROM weighbridge_data w
+        LEFT JOIN weighbridge_matches m ON m.weighbridge_id = w.id
+        WHERE w.id > %s AND m.weighbridge_id IS NULL
+        ORDER BY w.id
+        LIMIT %s
+    ''', (after_id, limit))
+    return cursor.fetchall()
+
+def _prior_links(cursor, weighings):
+    """(plate_key, ticket_number) -> (vehicle_id, supplier_id) already recorded for these tickets."""
+    tickets = sorted({w["TicketNumber"] for w in weighings if w["TicketNumber"] is not None})
+    if not tickets:
+        return {}
+    cursor.execute(f'''
+        SELECT plate_key, ticket_number, vehicle_id, supplier_id
+        FROM weighbridge_matches
+        WHERE ticket_number IN ({_in_list(tickets)}) AND vehicle_id IS NOT NULL
+    ''', tickets)
+    return {(r["plate_key"], r["ticket_number"]): (r["vehicle_id"], r["supplier_id"]) for r in cursor.fetchall()}
+
+def _open_gate_entries(cursor, plates, start, end):
+    cursor.execute(f'''
+        SELECT v.id, v.vehicle_number_key, v.entry_time, v.inward_no
+        FROM vehicles v
+        LEFT JOIN weighbridge_matches m ON m.vehicle_id = v.id
+        WHERE v.vehicle_number_key IN ({_in_list(plates)})
+          AND v.entry_time >= %s AND v.entry_time < %s
+          AND m.vehicle_id IS NULL
+    ''', list(plates) + [start, end])
+    return cursor.fetchall()
+
+def _open_supplier_rows(cursor, plates, start, end):
+    cursor.execute(f'''
+        SELECT s.id, s.vehicleNoKey, s.dateTime, s.inwardNo
+        FROM supplier s
+        LEFT JOIN weighbridge_matches m ON m.supplier_id = s.id
+        WHERE s.vehicleNoKey IN ({_in_list(plates)})
+          AND s.dateTime >= %s AND s.dateTime < %s
+          AND m.supplier_id IS NULL
+    ''', list(plates) + [start, end])
+    return cursor.fetchall()
+
+def _take_open(queue, cutoff, taken):
+    """Pop expired and already-taken rows off the front of ``queue``, then pop and return the next one."""
+    while queue and (queue[0][0] < cutoff or queue[0][1]["id"] in taken):
+        queue.popleft()
+    return queue.popleft()[1] if queue else None
+
+def match_weighings(weighings, gate_entries, supplier_rows, prior_links=None,
+                    window=MATCH_WINDOW, skew=GATE_CLOCK_SKEW):
+    """Links for each weighing as {weighbridge_id: (vehicle_id, supplier_id, gap_seconds)} in one sorted pass."""
+    links = dict(prior_links or {})
+    suppliers_by_inward = {s["inwardNo"]: s for s in supplier_rows if s["inwardNo"]}
+    events = [(g["entry_time"] - skew, 0, g) for g in gate_entries]
+    events += [(s["dateTime"] - skew, 1, s) for s in supplier_rows]
+    events += [(w["event_ts"], 2, w) for w in weighings if w["event_ts"] is not None]
+    events.sort(key=lambda e: (e[0], e[1], e[2]["id"]))
+
+    open_gates = defaultdict(deque)
+    open_suppliers = defaultdict(deque)
+    taken_suppliers = set()
+    matches = {w["id"]: (None, None, None) for w in weighings}
+    for at, kind, row in events:
+        if kind == 0:
+            open_gates[row["vehicle_number_key"]].append((at, row))
+            continue
+        if kind == 1:
+            open_suppliers[row["vehicleNoKey"]].append((at, row))
+            continue
+        plate = row["VehicleNumberKey"]
+        ticket = (plate, row["TicketNumber"])
+        if row["TicketNumber"] is not None and ticket in links:
+            vehicle_id, supplier_id = links[ticket]
+            matches[row["id"]] = (vehicle_id, supplier_id, None)
+            continue
+        gate = _take_open(open_gates[plate], at - window, ())
+        supplier = suppliers_by_inward.get(gate["inward_no"]) if gate else None
+        if supplier is None or supplier["id"] in taken_suppliers:
+            supplier = _take_open(open_suppliers[plate], at - window, taken_suppliers)
+        if supplier is not None:
+            taken_suppliers.add(supplier["id"])
+        vehicle_id = gate["id"] if gate else None
+        supplier_id = supplier["id"] if supplier else None
+        gap = int((row["event_ts"] - gate["entry_time"]).total_seconds()) if gate else None
+        matches[row["id"]] = (vehicle_id, supplier_id, gap)
+        if vehicle_id is not None and row["TicketNumber"] is not None:
+            links[ticket] = (vehicle_id, supplier_id)
+    return matches
+
+def match_batch(cursor, weighings, window=MATCH_WINDOW, skew=GATE_CLOCK_SKEW):
+    """Match one batch of weighings and record the results; returns the number linked to a gate entry."""
+    timed = [w for w in weighings if w["event_ts"] is not None and w["VehicleNumberKey"]]
+    gate_entries, supplier_rows = [], []
+    if timed:
+        plates = sorted({w["VehicleNumberKey"] for w in timed})
+        start = min(w["event_ts"] for w in timed) - window
+        end = max(w["event_ts"] for w in timed) + skew
+        gate_entries = _open_gate_entries(cursor, plates, start, end)
+        supplier_rows = _open_supplier_rows(cursor, plates, start, end)
+    matches = match_weighings(timed, gate_entries, supplier_rows, _prior_links(cursor, weighings), window, skew)
+    cursor.executemany('''
+        INSERT INTO weighbridge_matches
+            (weighbridge_id, ticket_number, plate_key, event_ts, vehicle_id, supplier_id, gate_gap_seconds)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE vehicle_id = VALUES(vehicle_id), supplier_id = VALUES(supplier_id),
+            gate_gap_seconds = VALUES(gate_gap_seconds), matched_at = CURRENT_TIMESTAMP
+    ''', [
+        (w["id"], w["TicketNumber"], w["VehicleNumberKey"], w["event_ts"]) + matches.get(w["id"], (None, None, None))
+        for w in weighings
+    ])
+    return sum(1 for vehicle_id, _, _ in matches.values() if vehicle_id is not None)
+
+def _match_pending(conn, after_id, batch_size):
+    cursor = conn.cursor(dictionary=True)
+    counts = {"weighings": 0, "linked": 0}
+    try:
+        if after_id is None:
+            cursor.execute("SELECT COALESCE(MAX(weighbridge_id), 0) AS last_id FROM weighbridge_matches")
+            after_id = cursor.fetchone()["last_id"]
+        while True:
+            weighings = _pending_weighings(cursor, after_id, batch_size)
+            if not weighings:
+                return counts
+            counts["linked"] += match_batch(cursor, weighings)
+            counts["weighings"] += len(weighings)
+            conn.commit()
+            after_id = weighings[-1]["id"]
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def _rematch(conn, batch_size):
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT MIN(weighbridge_id) AS first_id FROM weighbridge_matches WHERE vehicle_id IS NULL")
+        first_id = cursor.fetchone()["first_id"]
+        if first_id is None:
+            return {"weighings": 0, "linked": 0}
+        cursor.execute("DELETE FROM weighbridge_matches WHERE vehicle_id IS NULL")
+        conn.commit()
+    finally:
+        cursor.close()
+    return _match_pending(conn, first_id - 1, batch_size)
+
+def _locked(conn, run, *args):
+    """run(conn, *args) under the matcher's named lock; status 'busy' if another run holds it.
+
+    Each run sees open gate entries and supplier rows through its own
+    snapshot, so two overlapping runs could link one entry to two weighings.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (MATCH_LOCK_NAME,))
+        if cursor.fetchone()[0] != 1:
+            return {"weighings": 0, "linked": 0, "status": "busy"}
+        try:
+            return dict(run(conn, *args), status="matched")
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MATCH_LOCK_NAME,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
+
+def match_pending(conn, after_id=None, batch_size=MATCH_BATCH_SIZE):
+    """Match every weighing not yet recorded; returns {'weighings': n, 'linked': n, 'status': ...}."""
+    return _locked(conn, _match_pending, after_id, batch_size)
+
+def rematch(conn, batch_size=MATCH_BATCH_SIZE):
+    """Forget the weighings that found no gate entry and match them again."""
+    return _locked(conn, _rematch, batch_size)
+
+def _run_periodically(stop):
+    while True:
+        conn = None
+        try:
+            conn = get_db_connection()
+            counts = match_pending(conn)
+            if counts["weighings"]:
+                print(f"Matched {counts['linked']} of {counts['weighings']} weighbridge weighings to gate entries")
+        except Exception as e:
+            print(f"Error matching weighbridge weighings: {str(e)}")
+        finally:
+            if conn is not None:
+                conn.close()
+        if stop.wait(MATCH_INTERVAL):
+            return
+
+def start_matching():
+    """Run match_pending() now and then every MATCH_INTERVAL on a daemon thread."""
+    stop = threading.Event()
+    threading.Thread(target=_run_periodically, args=(stop,), name="vehicle-matching", daemon=True).start()
+    return stop
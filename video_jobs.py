@@ -0,0 +1,69 @@
+"""Background jobs for /vehicles/process-video.
+
+An upload is saved to its own temp file and handed to a small thread pool;
+the request returns a job id straight away and the client polls
+get_job() until the job is done, so a camera clip no longer holds a web
+worker for the whole decode.  Jobs live in memory for JOB_TTL seconds
+after they finish, which assumes a single app process (as app.py runs).
+The temp file is removed when its job ends.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+VIDEO_WORKERS = 2
+JOB_TTL = 3600
+
+_executor = ThreadPoolExecutor(max_workers=VIDEO_WORKERS, thread_name_prefix="video-job")
+_jobs = {}
+_lock = threading.Lock()
+
+def _update(job_id, **fields):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job.update(fields)
+
+def _purge_expired():
+    cutoff = time.time() - JOB_TTL
+    with _lock:
+        for job_id in [j for j, job in _jobs.items() if job['finished_at'] and job['finished_at'] < cutoff]:
+            del _jobs[job_id]
+
+def _run(job_id, path, process):
+    _update(job_id, status='running', started_at=time.time())
+    try:
+        result = process(path)
+        _update(job_id, status='done', result=result, finished_at=time.time())
+    except Exception as e:
+        print(f"Video job {job_id} failed: {str(e)}")
+        _update(job_id, status='error', error=str(e), finished_at=time.time())
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+def submit(path, process):
+    """Queue ``process(path)`` and return the new job id; ``path`` is deleted afterwards."""
+    _purge_expired()
+    job_id = uuid.uuid4().hex
+    with _lock:
+        _jobs[job_id] = {
+            'job_id': job_id,
+            'status': 'queued',
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'error': None
+        }
+    _executor.submit(_run, job_id, path, process)
+    return job_id
+
+def get_job(job_id):
+    """A snapshot of the job, or None if it is unknown or has expired."""
+    _purge_expired()
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job is not None else None
@@ -0,0 +1,626 @@
+"""Tally voucher JSON ingestion shared by extractor1.py and json_converter.py.
+
+The upload is parsed incrementally with ijson and vouchers are grouped into
+chunks of INGEST_CHUNK_SIZE.  Each chunk's rows are built in memory with keys
+reserved from id_sequences (see sequences.py) and written with one
+executemany per table in a single transaction.  Flattened rows for the CSV
+exports are spilled to a per-type temporary file once their chunk commits,
+and each file becomes one new segment of that type's CSV store
+(segment_store.py) at the end of the upload.
+
+Ingest is idempotent: vouchers are keyed on (vch_no, voucher_type_name) and
+carry a content hash.  A re-uploaded voucher whose hash is unchanged is
+skipped; a changed one keeps its id, has its child rows and po_details rows
+replaced, and is upserted in place.
+"""
+import csv
+import hashlib
+import json
+import logging
+import tempfile
+import re
+from datetime import datetime
+
+import dateutil.parser
+import ijson
+
+import dashboard_stats
+import segment_store
+import stock_ledger
+from db_config import get_db_connection
+from po_balance import refresh_ordered_qtys
+from sequences import allocate_ids
+
+logger = logging.getLogger(__name__)
+
+VOUCHER_CSV_KEYS = ("SupplierDetail", "PURCHASE ORDER", "INDENT")
+INGEST_CHUNK_SIZE = 500
+
+INSERT_VOUCHER_QUERY = '''
+    INSERT INTO vouchers (
+        id, sal_time, voucher_type_name, vch_no, date, effective_date, narration, state_buyer, cancel, refund,
+        customer_name, mailing_name, customer_web_id, customer_tally_id, billing_address, consignee_name,
+        shipping_address, billing_pin_code, shipping_pin_code, billing_phone_no, shipping_phone_no,
+        total_amount, sales_tally_id, web_id, action, billing_state, billing_country, shipping_state,
+        shipping_country, created_at, updated_at, content_hash
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        sal_time = VALUES(sal_time), date = VALUES(date), effective_date = VALUES(effective_date),
+        narration = VALUES(narration), state_buyer = VALUES(state_buyer), cancel = VALUES(cancel),
+        refund = VALUES(refund), customer_name = VALUES(customer_name), mailing_name = VALUES(mailing_name),
+        customer_web_id = VALUES(customer_web_id), customer_tally_id = VALUES(customer_tally_id),
+        billing_address = VALUES(billing_address), consignee_name = VALUES(consignee_name),
+        shipping_address = VALUES(shipping_address), billing_pin_code = VALUES(billing_pin_code),
+        shipping_pin_code = VALUES(shipping_pin_code), billing_phone_no = VALUES(billing_phone_no),
+        shipping_phone_no = VALUES(shipping_phone_no), total_amount = VALUES(total_amount),
+        sales_tally_id = VALUES(sales_tally_id), web_id = VALUES(web_id), action = VALUES(action),
+        billing_state = VALUES(billing_state), billing_country = VALUES(billing_country),
+        shipping_state = VALUES(shipping_state), shipping_country = VALUES(shipping_country),
+        updated_at = VALUES(updated_at), content_hash = VALUES(content_hash)
+'''
+
+INSERT_INVENTORY_QUERY = '''
+    INSERT INTO inventory_entries (
+        id, voucher_id, vch_no, stock_item, debitor_credit, billed_qty, actual_qty, rate, discount, amount
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+'''
+
+INSERT_BATCH_QUERY = '''
+    INSERT INTO batch_allocations (
+        inventory_id, batch_name, godown_name, batch_billed_qty, batch_actual_qty, batch_rate, batch_discount, amount
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+'''
+
+INSERT_ACCOUNTING_QUERY = '''
+    INSERT INTO accounting_allocations (
+        inventory_id, ledger_name, amount
+    ) VALUES (%s, %s, %s)
+'''
+
+INSERT_LEDGER_QUERY = '''
+    INSERT INTO ledger_details (
+        id, voucher_id, ledger_name, debitor_credit, amount
+    ) VALUES (%s, %s, %s, %s, %s)
+'''
+
+INSERT_BILL_WISE_QUERY = '''
+    INSERT INTO bill_wise_details (
+        ledger_id, bill_type, bill_amount
+    ) VALUES (%s, %s, %s)
+'''
+
+INSERT_PO_QUERY = '''
+    INSERT INTO po_details (
+        poNumber, material, supplier, quantity, rate, totalAmount, poType, deliveryDate, narration, status, createdAt, updatedAt
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+'''
+
+class VoucherFormatError(ValueError):
+    """The upload is not a Tally export with a top-level 'Voucher' list."""
+
+def clean_value(value):
+    """Convert 'NULL' strings to None, handle numeric conversions, and return cleaned value."""
+    if value == "NULL" or value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+def parse_quantity(quantity_str):
+    """Extract numeric quantity from strings like '14.000 Ton'."""
+    if not quantity_str or quantity_str == "NULL":
+        return 0.0
+    try:
+        match = re.match(r"(\d+\.\d+|\d+)", quantity_str)
+        if match:
+            return float(match.group(0))
+        return float(quantity_str.split()[0])
+    except (ValueError, IndexError):
+        return 0.0
+
+def parse_rate(rate_str):
+    """Extract numeric rate from strings like '59700.00/Ton'."""
+    if not rate_str or rate_str == "NULL":
+        return 0.0
+    try:
+        return float(rate_str.split('/')[0])
+    except (ValueError, IndexError):
+        return 0.0
+
+def parse_date(date_str):
+    """Parse various date formats and return YYYY-MM-DD."""
+    if not date_str or date_str == "NULL":
+        return None
+    try:
+        parsed = dateutil.parser.parse(date_str, dayfirst=False)
+        return parsed.strftime('%Y-%m-%d')
+    except (ValueError, TypeError):
+        return None
+
+def iter_vouchers(fileobj):
+    """Yield the items of the top-level 'Voucher' array one at a time.
+
+    Raises VoucherFormatError once the document has been read if it had no
+    'Voucher' key, and ijson.JSONError for malformed JSON.
+    """
+    saw_voucher_key = False
+    builder = None
+    for prefix, event, value in ijson.parse(fileobj, use_float=True):
+        if prefix == "" and event == "map_key" and value == "Voucher":
+            saw_voucher_key = True
+        elif prefix == "Voucher.item" and event == "start_map":
+            builder = ijson.ObjectBuilder()
+        if builder is None:
+            continue
+        builder.event(event, value)
+        if prefix == "Voucher.item" and event == "end_map":
+            yield builder.value
+            builder = None
+    if not saw_voucher_key:
+        raise VoucherFormatError("'Voucher' key missing in JSON")
+
+def voucher_csv_key(voucher):
+    """Map a voucher's VoucherTypeName to its CSV export key, or None if unknown."""
+    vtype = clean_value(voucher.get("VoucherTypeName", "")).upper()
+    if "SUPPLIERDETAIL" in vtype:
+        return "SupplierDetail"
+    if "PURCHASE ORDER" in vtype or "PO" in vtype:
+        return "PURCHASE ORDER"
+    if "INDENT" in vtype:
+        return "INDENT"
+    return None
+
+class CsvRowSpool:
+    """Spills the flattened CSV rows for one voucher type to a temporary NDJSON file."""
+
+    def __init__(self):
+        self.columns = {}  # insertion-ordered set of column names
+        self.count = 0
+        self._file = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+
+    def append(self, row):
+        for column in row:
+            self.columns.setdefault(column, None)
+        self._file.write(json.dumps({k: str(v) for k, v in row.items()}) + "\n")
+        self.count += 1
+
+    def write_csv(self, fileobj):
+        """Write the spooled rows as CSV under the union of their columns."""
+        columns = list(self.columns)
+        writer = csv.DictWriter(fileobj, fieldnames=columns, restval="")
+        writer.writeheader()
+        self._file.seek(0)
+        for line in self._file:
+            writer.writerow(json.loads(line))
+
+    def close(self):
+        self._file.close()
+
+class IngestResult:
+    def __init__(self):
+        self.purchase_order_count = 0
+        self.voucher_count = 0
+        self.updated_count = 0
+        self.unchanged_count = 0
+        self.errors = []
+        self.spools = {key: CsvRowSpool() for key in VOUCHER_CSV_KEYS}
+
+    def close(self):
+        for spool in self.spools.values():
+            spool.close()
+
+class VoucherRows:
+    """Rows built from a run of vouchers, ready for one bulk write.
+
+    Child rows reference their parent by its index in the parent list; the
+    indexes are turned into real keys once an id block has been allocated.
+    """
+
+    def __init__(self):
+        self.vouchers = []    # (existing id or None, row)
+        self.replaced = []    # (id, vch_no, voucher_type_name) of changed vouchers
+        self.inventory = []   # (voucher index, row)
+        self.batches = []     # (inventory index, row)
+        self.accounting = []  # (inventory index, row)
+        self.ledgers = []     # (voucher index, row)
+        self.bills = []       # (ledger index, row)
+        self.purchase_orders = []
+        self.csv_rows = []    # (csv key, flattened row)
+        self.errors = []
+
+def _add_purchase_order(rows, po_values, label):
+    if not po_values[0] or not po_values[7]:
+        rows.errors.append(f"Error inserting purchase order ({label}): "
+                           f"Missing required fields: poNumber={po_values[0]}, deliveryDate={po_values[7]}")
+        return
+    rows.purchase_orders.append(po_values)
+
+def voucher_content_hash(voucher):
+    """sha256 of the voucher's canonical JSON, used to skip unchanged re-uploads."""
+    canonical = json.dumps(voucher, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def voucher_natural_key(voucher):
+    """(vch_no, voucher_type_name) as the strings stored in the vouchers table."""
+    return (str(clean_value(voucher.get("VchNo", ""))), str(clean_value(voucher.get("VoucherTypeName", ""))))
+
+def find_existing_vouchers(cursor, keys):
+    """Map natural key -> (id, content_hash) for the vouchers already stored."""
+    existing = {}
+    vch_nos = list({vch_no for vch_no, _ in keys})
+    if not vch_nos:
+        return existing
+    placeholders = ", ".join(["%s"] * len(vch_nos))
+    cursor.execute(f"""
+        SELECT id, vch_no, voucher_type_name, content_hash
+        FROM vouchers
+        WHERE vch_no IN ({placeholders})
+    """, vch_nos)
+    for voucher_id, vch_no, voucher_type_name, content_hash in cursor.fetchall():
+        existing[(vch_no, voucher_type_name)] = (voucher_id, content_hash)
+    return existing
+
+def build_voucher_rows(rows, voucher, existing_id=None, content_hash=None):
+    """Add one voucher's table rows and CSV rows to ``rows``.
+
+    ``existing_id`` is the id of the stored voucher this one replaces.
+    """
+    key = voucher_csv_key(voucher)
+    if key is None:
+        vtype = clean_value(voucher.get("VoucherTypeName", "")).upper()
+        rows.errors.append(f"Unknown VoucherTypeName: {vtype} for VchNo: {voucher.get('VchNo', 'Unknown')}")
+        return
+
+    base_info = {k: clean_value(v) for k, v in voucher.items() if k not in ["Inventory Entries", "Ledgerdetails"]}
+    try:
+        voucher_type_name = base_info.get('VoucherTypeName', '')
+        vch_no = base_info.get('VchNo', '')
+        date = parse_date(base_info.get('Date'))
+        narration = base_info.get('Narration', '')
+        customer_name = base_info.get('CustomerName', '')
+        total_amount = float(base_info.get('TotalAmount', 0.0))
+        created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        rows.vouchers.append((existing_id, (
+            base_info.get('SalTime'), voucher_type_name, vch_no, date, parse_date(base_info.get('EffectiveDate')),
+            narration, base_info.get('StateBuyer'), base_info.get('Cancel'), base_info.get('Refund', ''),
+            customer_name, base_info.get('MailingName', ''), base_info.get('CustomerWebID'),
+            base_info.get('CustomerTallyID'), base_info.get('BillingAddress', ''), base_info.get('ConsigneeName', ''),
+            base_info.get('ShippingAddress', ''), base_info.get('BillingPinCode', ''), base_info.get('ShippingPinCode', ''),
+            base_info.get('BillingPhoneNo'), base_info.get('ShippingPhoneNo'), total_amount,
+            base_info.get('SalesTallyID', ''), base_info.get('WebID'), base_info.get('Action'),
+            base_info.get('BillingState', ''), base_info.get('BillingCountry', ''), base_info.get('ShippingState', ''),
+            base_info.get('ShippingCountry', ''), created_at, created_at, content_hash
+        )))
+        if existing_id is not None:
+            rows.replaced.append((existing_id, str(vch_no), str(voucher_type_name)))
+        voucher_index = len(rows.vouchers) - 1
+    except Exception as e:
+        rows.errors.append(f"Error inserting voucher (VchNo: {voucher.get('VchNo', 'Unknown')}): {str(e)}")
+        return
+
+    def po_values(material, quantity, rate, amount):
+        return (vch_no, material, customer_name, quantity, rate, amount,
+                voucher_type_name, date, narration, 'Active', created_at, created_at)
+
+    if voucher.get("Inventory Entries"):
+        for inventory in voucher["Inventory Entries"]:
+            inv_info = {k: clean_value(v) for k, v in inventory.items() if k not in ["BatchAllocations", "AccountingAllocations"]}
+            try:
+                stock_item = inv_info.get('StockItem', '')
+                billed_qty = parse_quantity(inv_info.get('BilledQty'))
+                rate = parse_rate(inv_info.get('Rate'))
+                amount = float(inv_info.get('Amount', 0.0))
+                rows.inventory.append((voucher_index, (
+                    vch_no, stock_item, inv_info.get('DebitorCredit', ''), billed_qty,
+                    parse_quantity(inv_info.get('AcutalQty')), rate, float(inv_info.get('Discount', 0)), amount
+                )))
+                inventory_index = len(rows.inventory) - 1
+            except Exception as e:
+                rows.errors.append(f"Error inserting inventory entry for VchNo: {vch_no}: {str(e)}")
+                continue
+
+            if inventory.get("BatchAllocations"):
+                for batch in inventory["BatchAllocations"]:
+                    batch_info = {k: clean_value(v) for k, v in batch.items()}
+                    rows.csv_rows.append((key, {**base_info, **inv_info, **batch_info}))
+                    try:
+                        rows.batches.append((inventory_index, (
+                            batch_info.get('BatchName', ''), batch_info.get('GodownName', ''),
+                            parse_quantity(batch_info.get('BatchBilledQty')), parse_quantity(batch_info.get('BatchActualQty')),
+                            parse_rate(batch_info.get('BatchRate')), float(batch_info.get('BatchDiscount', 0)),
+                            float(batch_info.get('Amount', 0.0))
+                        )))
+                    except Exception as e:
+                        rows.errors.append(f"Error inserting batch allocation for VchNo: {vch_no}: {str(e)}")
+                        continue
+                    if key == "PURCHASE ORDER":
+                        _add_purchase_order(rows, po_values(stock_item, billed_qty, rate, amount),
+                                            f"VchNo: {vch_no}, StockItem: {stock_item}")
+            else:
+                rows.csv_rows.append((key, {**base_info, **inv_info}))
+                for accounting in inventory.get("AccountingAllocations") or []:
+                    try:
+                        rows.accounting.append((inventory_index, (
+                            clean_value(accounting.get('LedgerName', '')),
+                            float(clean_value(accounting.get('Amount', 0.0)))
+                        )))
+                    except Exception as e:
+                        rows.errors.append(f"Error inserting accounting allocation for VchNo: {vch_no}: {str(e)}")
+                if key == "PURCHASE ORDER":
+                    _add_purchase_order(rows, po_values(stock_item, billed_qty, rate, amount),
+                                        f"VchNo: {vch_no}, StockItem: {stock_item}")
+    else:
+        rows.csv_rows.append((key, base_info))
+        if key == "PURCHASE ORDER":
+            _add_purchase_order(rows, po_values('', 0.0, 0.0, total_amount), f"VchNo: {vch_no}")
+
+    for ledger in voucher.get("Ledgerdetails") or []:
+        try:
+            rows.ledgers.append((voucher_index, (
+                clean_value(ledger.get('Ledgername', '')), clean_value(ledger.get('DebitorCredit', '')),
+                float(clean_value(ledger.get('Amount', 0.0)))
+            )))
+            ledger_index = len(rows.ledgers) - 1
+        except Exception as e:
+            rows.errors.append(f"Error inserting ledger detail for VchNo: {vch_no}: {str(e)}")
+            continue
+        for bill in ledger.get("BillWiseDetails") or []:
+            try:
+                rows.bills.append((ledger_index, (
+                    clean_value(bill.get('BillType', '')), float(clean_value(bill.get('Amount', 0.0)))
+                )))
+            except Exception as e:
+                rows.errors.append(f"Error inserting bill wise detail for VchNo: {vch_no}: {str(e)}")
+
+def write_voucher_rows(conn, id_cursor, rows):
+    """Write ``rows`` with one executemany per table and commit.
+
+    Keys for new vouchers, inventory_entries and ledger_details are reserved
+    up front through ``id_cursor``, which should belong to a separate
+    autocommit connection.  Replaced vouchers keep their id and lose their
+    old child rows in the same transaction.  A new voucher that a concurrent
+    upload stored first is upserted onto that row, so it is handled as a
+    replacement of it.  The po_balance rows of the purchase orders touched,
+    the stock ledger's ordered quantities and the active-PO dashboard
+    counter are updated with one statement each before the commit.  Rolls
+    back and re-raises on any database error.
+    """
+    cursor = conn.cursor()
+    try:
+        removed_pos = delete_voucher_children(cursor, rows.replaced) if rows.replaced else []
+
+        new_count = sum(1 for existing_id, _ in rows.vouchers if existing_id is None)
+        next_id = allocate_ids(id_cursor, "vouchers", new_count)
+        voucher_ids = []
+        for existing_id, _ in rows.vouchers:
+            if existing_id is None:
+                existing_id = next_id
+                next_id += 1
+            voucher_ids.append(existing_id)
+        inventory_base = allocate_ids(id_cursor, "inventory_entries", len(rows.inventory))
+        ledger_base = allocate_ids(id_cursor, "ledger_details", len(rows.ledgers))
+
+        if rows.vouchers:
+            cursor.executemany(INSERT_VOUCHER_QUERY,
+                               [(voucher_ids[i],) + row for i, (_, row) in enumerate(rows.vouchers)])
+        raced = claim_raced_vouchers(cursor, rows, voucher_ids)
+        if raced:
+            removed_pos += delete_voucher_children(cursor, raced)
+
+        batches = [
+            (INSERT_INVENTORY_QUERY, [(inventory_base + i, voucher_ids[v]) + row
+                                      for i, (v, row) in enumerate(rows.inventory)]),
+            (INSERT_BATCH_QUERY, [(inventory_base + i,) + row for i, row in rows.batches]),
+            (INSERT_ACCOUNTING_QUERY, [(inventory_base + i,) + row for i, row in rows.accounting]),
+            (INSERT_LEDGER_QUERY, [(ledger_base + i, voucher_ids[v]) + row
+                                   for i, (v, row) in enumerate(rows.ledgers)]),
+            (INSERT_BILL_WISE_QUERY, [(ledger_base + i,) + row for i, row in rows.bills]),
+            (INSERT_PO_QUERY, rows.purchase_orders),
+        ]
+        for query, params in batches:
+            if params:
+                cursor.executemany(query, params)
+
+        # Keep po_balance's ordered side in step with the po_details rows just replaced
+        refresh_ordered_qtys(cursor, [vch_no for _, vch_no, _ in rows.replaced + raced]
+                                     + [po[0] for po in rows.purchase_orders])
+
+        # Net ordered quantity per material: replaced rows out, new rows in
+        ordered = {}
+        for material, quantity, _ in removed_pos:
+            ordered[material] = ordered.get(material, 0.0) - float(quantity or 0)
+        for po in rows.purchase_orders:
+            ordered[po[1]] = ordered.get(po[1], 0.0) + float(po[3] or 0)
+        stock_ledger.adjust_many(cursor, 'ordered_qty', ordered)
+        dashboard_stats.record_status_changes(cursor, 'po_details', [status for _, _, status in removed_pos],
+                                              [po[9] for po in rows.purchase_orders])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def claim_raced_vouchers(cursor, rows, voucher_ids):
+    """Point new vouchers at the id their natural key actually has after the upsert.
+
+    A concurrent upload can store a voucher between find_existing_vouchers()
+    and the upsert, which then updates that row instead of inserting the
+    reserved id.  Such vouchers get the surviving id in ``voucher_ids`` and
+    are returned as (id, vch_no, voucher_type_name) so their old child rows
+    can be replaced.
+    """
+    new = {(str(row[2]), str(row[1])): index
+           for index, (existing_id, row) in enumerate(rows.vouchers) if existing_id is None}
+    if not new:
+        return []
+    vch_nos = sorted({vch_no for vch_no, _ in new})
+    cursor.execute(f"""
+        SELECT id, vch_no, voucher_type_name
+        FROM vouchers
+        WHERE vch_no IN ({", ".join(["%s"] * len(vch_nos))})
+        FOR UPDATE
+    """, vch_nos)
+    raced = []
+    for voucher_id, vch_no, voucher_type_name in cursor.fetchall():
+        index = new.get((vch_no, voucher_type_name))
+        if index is not None and voucher_ids[index] != voucher_id:
+            voucher_ids[index] = voucher_id
+            raced.append((voucher_id, vch_no, voucher_type_name))
+    return raced
+
+def delete_voucher_children(cursor, replaced):
+    """Delete the child rows and po_details rows of vouchers about to be upserted.
+
+    Returns the (material, quantity, status) of the po_details rows removed.
+    """
+    ids = [voucher_id for voucher_id, _, _ in replaced]
+    placeholders = ", ".join(["%s"] * len(ids))
+    cursor.execute(f"""
+        DELETE bw FROM bill_wise_details bw
+        JOIN ledger_details ld ON ld.id = bw.ledger_id
+        WHERE ld.voucher_id IN ({placeholders})
+    """, ids)
+    cursor.execute(f"DELETE FROM ledger_details WHERE voucher_id IN ({placeholders})", ids)
+    for child in ("batch_allocations", "accounting_allocations"):
+        cursor.execute(f"""
+            DELETE c FROM {child} c
+            JOIN inventory_entries ie ON ie.id = c.inventory_id
+            WHERE ie.voucher_id IN ({placeholders})
+        """, ids)
+    cursor.execute(f"DELETE FROM inventory_entries WHERE voucher_id IN ({placeholders})", ids)
+    keys = ", ".join(["(%s, %s)"] * len(replaced))
+    key_params = [value for _, vch_no, voucher_type_name in replaced for value in (vch_no, voucher_type_name)]
+    cursor.execute(
+        f"SELECT material, quantity, status FROM po_details WHERE (poNumber, poType) IN ({keys}) FOR UPDATE",
+        key_params
+    )
+    removed_pos = cursor.fetchall()
+    cursor.execute(f"DELETE FROM po_details WHERE (poNumber, poType) IN ({keys})", key_params)
+    return removed_pos
+
+def _record_rows(result, rows):
+    result.voucher_count += len(rows.vouchers) - len(rows.replaced)
+    result.updated_count += len(rows.replaced)
+    result.purchase_order_count += len(rows.purchase_orders)
+    result.errors.extend(rows.errors)
+    for key, row in rows.csv_rows:
+        result.spools[key].append(row)
+
+def ingest_chunk(conn, id_cursor, vouchers, result):
+    """Write a chunk of vouchers in one transaction.
+
+    Vouchers already stored with the same content hash are skipped.  If the
+    bulk write fails the chunk is retried one voucher per transaction, so a
+    single bad voucher only loses its own rows.
+    """
+    cursor = conn.cursor(buffered=True)
+    try:
+        existing = find_existing_vouchers(cursor, [voucher_natural_key(v) for v in vouchers])
+        conn.commit()
+    finally:
+        cursor.close()
+
+    # A key repeated within the chunk is taken from its last occurrence.
+    latest = {}
+    for voucher in vouchers:
+        latest[voucher_natural_key(voucher)] = voucher
+    rows = VoucherRows()
+    changed = []
+    for voucher in vouchers:
+        key = voucher_natural_key(voucher)
+        if latest[key] is not voucher:
+            continue
+        content_hash = voucher_content_hash(voucher)
+        existing_id, existing_hash = existing.get(key, (None, None))
+        if existing_hash == content_hash:
+            result.unchanged_count += 1
+            continue
+        build_voucher_rows(rows, voucher, existing_id, content_hash)
+        changed.append(voucher)
+    try:
+        write_voucher_rows(conn, id_cursor, rows)
+        _record_rows(result, rows)
+        return
+    except Exception as e:
+        if len(changed) <= 1:
+            vch_no = changed[0].get('VchNo', 'Unknown') if changed else 'Unknown'
+            result.errors.append(f"Error inserting voucher (VchNo: {vch_no}): {str(e)}")
+            return
+        logger.warning(f"Bulk insert of {len(changed)} vouchers failed, retrying one by one: {str(e)}")
+
+    # Only the vouchers that went into the failed write; unchanged ones and
+    # earlier duplicates were already accounted for above.
+    for voucher in changed:
+        ingest_chunk(conn, id_cursor, [voucher], result)
+
+def ingest_vouchers(conn, fileobj, chunk_size=INGEST_CHUNK_SIZE):
+    """Stream vouchers from fileobj into the database; returns an IngestResult.
+
+    Vouchers are committed in chunks of ``chunk_size``.  The caller owns the
+    result and must close() it once the CSV spools have been saved.
+    """
+    result = IngestResult()
+    id_conn = get_db_connection()
+    id_conn.autocommit = True
+    id_cursor = id_conn.cursor(buffered=True)
+    try:
+        chunk = []
+        for voucher in iter_vouchers(fileobj):
+            chunk.append(voucher)
+            if len(chunk) >= chunk_size:
+                ingest_chunk(conn, id_cursor, chunk, result)
+                chunk = []
+        if chunk:
+            ingest_chunk(conn, id_cursor, chunk, result)
+
+        if result.purchase_order_count > 0:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    '''
+                    INSERT INTO system_logs (branch_name, module_name, action_performed, action_by, action_on, ip_address, timestamp)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ''',
+                    (
+                        'Main Branch', 'Purchase Orders', 'Insert', 'System',
+                        f'Uploaded {result.purchase_order_count} records to po_details', '127.0.0.1', datetime.now()
+                    )
+                )
+                conn.commit()
+            except Exception as e:
+                result.errors.append(f"Error inserting system log: {str(e)}")
+            finally:
+                cursor.close()
+        return result
+    except Exception:
+        result.close()
+        raise
+    finally:
+        id_cursor.close()
+        id_conn.close()
+
+def save_csv_spools(result, csv_paths):
+    """Append each voucher type's spooled rows as a new segment of its CSV store; returns per-type details."""
+    details = []
+    for vtype_key, spool in result.spools.items():
+        if not spool.count:
+            continue
+        try:
+            csv_path = csv_paths[vtype_key]
+            manifest = segment_store.append_segment(csv_path, spool.columns, spool.write_csv, spool.count)
+            details.append({
+                "voucher_type": vtype_key,
+                "file": csv_path,
+                "rows_added": spool.count,
+                "total_rows": sum(s["rows"] for s in manifest["segments"])
+            })
+            logger.info(f"Appended {spool.count} rows to CSV store for {vtype_key}: {csv_path}")
+        except Exception as e:
+            result.errors.append(f"Error saving CSV for {vtype_key}: {str(e)}")
+    return details
@@ -0,0 +1,77 @@
+"""SQL for the /weighbridge-data filters.
+
+The filters are written so the migration 9 indexes serve them: dates as
+half-open ranges on the bare Date column (idx_weighbridge_date_shift) and
+vehicle numbers as a prefix of the normalized VehicleNumberKey
+(idx_weighbridge_vehicle_date).  Material and supplier names stay
+substring matches applied within that range.  Kept free of Flask so
+tests/test_weighbridge_filters.py can EXPLAIN the generated queries.
+"""
+import re
+from datetime import datetime, timedelta
+
+# Separators stripped from vehicle numbers; keep in step with the
+# weighbridge_data.VehicleNumberKey generated column (migration 9).
+# weighbridge_pairing.py keys trips with the same function.
+VEHICLE_NUMBER_SEPARATORS = re.compile(r'[ \-./]')
+
+WEIGHBRIDGE_DATA_COLUMNS = '''
+    id, TicketNumber, VehicleNumber, Date, Time, EmptyWeight, LoadedWeight,
+    EmptyWeightDate, EmptyWeightTime, LoadWeightDate, LoadWeightTime,
+    NetWeight, Pending, Closed, Exported, Shift, Materialname, SupplierName,
+    State, Blank, event_ts, created_at
+'''
+
+def vehicle_number_key(value):
+    """Normalized vehicle number used for prefix matching, e.g. 'ka-01 ab' -> 'KA01AB'."""
+    return VEHICLE_NUMBER_SEPARATORS.sub('', value or '').upper()
+
+def parse_date_param(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+
+def like_prefix(value):
+    """LIKE pattern matching values that start with ``value`` literally."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def weighbridge_data_query(args):
+    """(query, params) for the filters in ``args``; ValueError for a malformed date."""
+    query = f'''
+        SELECT {WEIGHBRIDGE_DATA_COLUMNS}
+        FROM weighbridge_data
+        WHERE 1=1
+    '''
+    params = []
+    
+    date_from = args.get('dateFrom')
+    date_to = args.get('dateTo')
+    if date_from:
+        query += ' AND Date >= %s'
+        params.append(parse_date_param(date_from, 'dateFrom'))
+    
+    if date_to:
+        query += ' AND Date < %s'
+        params.append(parse_date_param(date_to, 'dateTo') + timedelta(days=1))
+    
+    vehicle_number = args.get('vehicleNumber')
+    vehicle_key = vehicle_number_key(vehicle_number) if vehicle_number else ''
+    if vehicle_key:
+        query += ' AND VehicleNumberKey LIKE %s'
+        params.append(like_prefix(vehicle_key))
+    
+    if args.get('materialName'):
+        query += ' AND Materialname LIKE %s'
+        params.append(f"%{args['materialName']}%")
+    
+    if args.get('supplierName'):
+        query += ' AND SupplierName LIKE %s'
+        params.append(f"%{args['supplierName']}%")
+    
+    if args.get('shift'):
+        query += ' AND Shift = %s'
+        params.append(args['shift'])
+    
+    query += ' ORDER BY created_at DESC'
+    return query, params
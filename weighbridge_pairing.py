@@ -0,0 +1,211 @@
+"""Pair first and second weighbridge weighings into completed trips.
+
+The weighbridge export (downloaded_tickets_data.csv, one row per weighing,
+oldest first) records a trip as two rows: a "First Transaction" with only
+EmptyWeight or LoadedWeight set and NetWeight blank, and a later "Second
+Transaction" for the same vehicle.  pair_weighings() walks the rows once,
+keeping the open first weighing of each vehicle in a dict, and yields a
+trip with NetWeight computed as soon as its second weighing arrives; a
+first weighing left open longer than TRIP_WINDOW is dropped as expired,
+and weighings carrying different ticket numbers are never paired.
+write_trips() inserts the trips into ticket_details in batches as they are
+produced, skipping tickets already loaded, so the file is never held in
+memory and a re-run is harmless:
+
+    python weighbridge_pairing.py [downloaded_tickets_data.csv] [--dry-run]
+"""
+import csv
+import sys
+from datetime import timedelta
+
+from db_config import get_db_connection
+from weighbridge_filters import vehicle_number_key
+from weighbridge_timestamps import parse_timestamp
+
+TRIP_WINDOW = timedelta(hours=24)
+WRITE_BATCH_SIZE = 500
+DEFAULT_CSV_PATH = "downloaded_tickets_data.csv"
+
+def _text(value):
+    value = "" if value is None else str(value).strip()
+    return "" if value.lower() in ("nan", "none", "nat") else value
+
+def _weight(value):
+    try:
+        return float(_text(value)) or None
+    except ValueError:
+        return None
+
+def parse_weighing(row):
+    """One export row as a weighing dict, or None if it has no vehicle or time."""
+    vehicle_number = _text(row.get("VehicleNumber"))
+    at = parse_timestamp(row.get("Date"), row.get("Time"))
+    if not vehicle_number or at is None:
+        return None
+    return {
+        "ticket_number": _text(row.get("TicketNumber")),
+        "vehicle_number": vehicle_number,
+        "vehicle_key": vehicle_number_key(vehicle_number),
+        "at": at,
+        "second": "second" in _text(row.get("State")).lower(),
+        "empty_weight": _weight(row.get("EmptyWeight")),
+        "loaded_weight": _weight(row.get("LoadedWeight")),
+        "empty_at": parse_timestamp(row.get("EmptyWeightDate"), row.get("EmptyWeightTime")),
+        "loaded_at": parse_timestamp(row.get("LoadWeightDate"), row.get("LoadWeightTime")),
+        "row": row,
+    }
+
+def complete_trip(first, second):
+    """A ticket_details row from the two weighings, or None if a weight is still missing."""
+    first = first or {}
+    empty_weight = second["empty_weight"] or first.get("empty_weight")
+    loaded_weight = second["loaded_weight"] or first.get("loaded_weight")
+    if not empty_weight or not loaded_weight:
+        return None
+    empty_at = second["empty_at"] or first.get("empty_at")
+    loaded_at = second["loaded_at"] or first.get("loaded_at")
+    row = second["row"]
+    return {
+        "TicketNumber": second["ticket_number"] or first.get("ticket_number"),
+        "VehicleNumber": second["vehicle_number"],
+        "Date": second["at"].strftime("%Y-%m-%d"),
+        "Time": second["at"].strftime("%H:%M:%S"),
+        "LoadedWeight": loaded_weight,
+        "EmptyWeight": empty_weight,
+        "LoadWeightDate": loaded_at.strftime("%Y-%m-%d") if loaded_at else None,
+        "LoadWeightTime": loaded_at.strftime("%H:%M:%S") if loaded_at else None,
+        "EmptyWeightDate": empty_at.strftime("%Y-%m-%d") if empty_at else None,
+        "EmptyWeightTime": empty_at.strftime("%H:%M:%S") if empty_at else None,
+        # Inward trips weigh loaded first, outward trips empty first
+        "NetWeight": abs(loaded_weight - empty_weight),
+        "Pending": _text(row.get("Pending")) or None,
+        "Shift": _text(row.get("Shift")) or None,
+        "Materialname": _text(row.get("Materialname")) or _text(first.get("row", {}).get("Materialname")) or None,
+        "SupplierName": _text(row.get("SupplierName")) or _text(first.get("row", {}).get("SupplierName")) or None,
+        "State": _text(row.get("State")) or None,
+        "Closed": _text(row.get("Closed")) or None,
+        "event_ts": second["at"],
+        "load_ts": loaded_at,
+        "empty_ts": empty_at,
+    }
+
+def pair_weighings(rows, window=TRIP_WINDOW, stats=None):
+    """Yield completed trips from export rows in time order, in a single pass.
+
+    ``stats``, if given, is a dict that receives counts of skipped rows,
+    expired and superseded first weighings, unmatched second weighings and
+    weighings still open at the end.
+    """
+    stats = stats if stats is not None else {}
+    for name in ("trips", "skipped", "expired", "superseded", "unmatched", "open"):
+        stats.setdefault(name, 0)
+    open_weighings = {}
+    for row in rows:
+        weighing = parse_weighing(row)
+        if weighing is None:
+            stats["skipped"] += 1
+            continue
+        first = open_weighings.pop(weighing["vehicle_key"], None)
+        if first is not None and weighing["at"] - first["at"] > window:
+            stats["expired"] += 1
+            first = None
+        if first is not None and first["ticket_number"] and weighing["ticket_number"] \
+                and first["ticket_number"] != weighing["ticket_number"]:
+            stats["superseded"] += 1
+            first = None
+        complementary = first is not None and (
+            (first["empty_weight"] and weighing["loaded_weight"] and not weighing["empty_weight"])
+            or (first["loaded_weight"] and weighing["empty_weight"] and not weighing["loaded_weight"])
+        )
+        if weighing["second"] or complementary:
+            trip = complete_trip(first, weighing)
+            if trip is None:
+                stats["unmatched"] += 1
+                continue
+            stats["trips"] += 1
+            yield trip
+            continue
+        if first is not None:
+            stats["superseded"] += 1
+        open_weighings[weighing["vehicle_key"]] = weighing
+    stats["open"] = len(open_weighings)
+
+TICKET_COLUMNS = (
+    "TicketNumber", "VehicleNumber", "Date", "Time", "LoadedWeight", "EmptyWeight",
+    "LoadWeightDate", "LoadWeightTime", "EmptyWeightDate", "EmptyWeightTime",
+    "NetWeight", "Pending", "Shift", "Materialname", "SupplierName", "State", "Closed",
+    "event_ts", "load_ts", "empty_ts"
+)
+
+def _existing_tickets(cursor, batch):
+    cursor.execute(f'''
+        SELECT TicketNumber, VehicleNumber, `Date`
+        FROM ticket_details
+        WHERE TicketNumber IN ({", ".join(["%s"] * len(batch))})
+    ''', [trip["TicketNumber"] for trip in batch])
+    existing = set()
+    for row in cursor.fetchall():
+        if isinstance(row, dict):
+            row = (row["TicketNumber"], row["VehicleNumber"], row["Date"])
+        existing.add((str(row[0]), row[1], str(row[2])))
+    return existing
+
+def _flush(conn, cursor, batch):
+    existing = _existing_tickets(cursor, batch)
+    new_trips = [t for t in batch if (t["TicketNumber"], t["VehicleNumber"], t["Date"]) not in existing]
+    if new_trips:
+        columns = ", ".join(f"`{c}`" for c in TICKET_COLUMNS)
+        cursor.executemany(
+            f"INSERT INTO ticket_details ({columns}) VALUES ({', '.join(['%s'] * len(TICKET_COLUMNS))})",
+            [tuple(trip[c] for c in TICKET_COLUMNS) for trip in new_trips]
+        )
+    conn.commit()
+    return len(new_trips)
+
+def write_trips(conn, trips, batch_size=WRITE_BATCH_SIZE):
+    """Insert trips into ticket_details, committing every ``batch_size``; returns the count inserted."""
+    cursor = conn.cursor()
+    inserted = 0
+    batch = []
+    try:
+        for trip in trips:
+            batch.append(trip)
+            if len(batch) >= batch_size:
+                inserted += _flush(conn, cursor, batch)
+                batch = []
+        if batch:
+            inserted += _flush(conn, cursor, batch)
+        return inserted
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def pair_csv(path, conn=None, dry_run=False):
+    """Pair an export file and load its trips; returns the stats dict (with 'inserted')."""
+    stats = {}
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        trips = pair_weighings(csv.DictReader(f), stats=stats)
+        if dry_run:
+            stats["inserted"] = 0
+            for _ in trips:
+                pass
+            return stats
+        own_conn = conn is None
+        if own_conn:
+            conn = get_db_connection()
+        try:
+            stats["inserted"] = write_trips(conn, trips)
+        finally:
+            if own_conn:
+                conn.close()
+    return stats
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != "--dry-run"]
+    if len(args) > 1:
+        print("usage: python weighbridge_pairing.py [export.csv] [--dry-run]")
+        sys.exit(2)
+    stats = pair_csv(args[0] if args else DEFAULT_CSV_PATH, dry_run="--dry-run" in sys.argv[1:])
+    print(", ".join(f"{name}: {count}" for name, count in stats.items()))
@@ -0,0 +1,93 @@
+"""Combined event timestamps for weighbridge rows.
+
+The weighbridge software exports each date and clock time separately, with
+the clock stored as a datetime on Access's 1899-12-30 epoch, so a time-range
+query over Date + Time cannot use an index.  Ingest paths store the
+combination once, in indexed DATETIME columns on weighbridge_data and
+ticket_details:
+
+    event_ts  Date + Time                      (the weighing itself)
+    load_ts   LoadWeightDate + LoadWeightTime
+    empty_ts  EmptyWeightDate + EmptyWeightTime
+
+Rows written before the columns existed, or by a writer that does not set
+them, are filled in by:
+
+    python weighbridge_timestamps.py backfill
+"""
+import sys
+from datetime import datetime
+
+from db_config import get_db_connection
+
+BACKFILL_BATCH_SIZE = 5000
+
+# table -> (event, load, empty) SQL expressions over the table's own columns
+TIMESTAMP_EXPRESSIONS = {
+    "weighbridge_data": (
+        "TIMESTAMP(DATE(`Date`), TIME(`Time`))",
+        "TIMESTAMP(DATE(LoadWeightDate), TIME(LoadWeightTime))",
+        "TIMESTAMP(DATE(EmptyWeightDate), TIME(EmptyWeightTime))",
+    ),
+    "ticket_details": (
+        "TIMESTAMP(`Date`, `Time`)",
+        "TIMESTAMP(LoadWeightDate, LoadWeightTime)",
+        "TIMESTAMP(EmptyWeightDate, EmptyWeightTime)",
+    ),
+}
+
+def _text(value):
+    value = "" if value is None else str(value).strip()
+    return "" if value.lower() in ("nan", "none", "nat") else value
+
+def parse_timestamp(date_value, time_value):
+    """Combine an export date and clock time (either may carry a dummy part) into a datetime."""
+    day, clock = _text(date_value), _text(time_value)
+    if not day:
+        return None
+    day = day.split(" ")[0]
+    clock = clock.split(" ")[-1].split(".")[0] if clock else "00:00:00"
+    try:
+        return datetime.strptime(f"{day} {clock}", "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+
+def row_timestamps(row):
+    """(event_ts, load_ts, empty_ts) for a Tickets row keyed by the export's column names."""
+    return (
+        parse_timestamp(row.get("Date"), row.get("Time")),
+        parse_timestamp(row.get("LoadWeightDate"), row.get("LoadWeightTime")),
+        parse_timestamp(row.get("EmptyWeightDate"), row.get("EmptyWeightTime")),
+    )
+
+def backfill(conn, batch_size=BACKFILL_BATCH_SIZE):
+    """Set the timestamps on rows missing them, one id range per commit; returns {table: rows}."""
+    cursor = conn.cursor()
+    updated = {}
+    try:
+        for table, (event_sql, load_sql, empty_sql) in TIMESTAMP_EXPRESSIONS.items():
+            cursor.execute(f"SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM {table} WHERE event_ts IS NULL")
+            low, high = cursor.fetchone()
+            updated[table] = 0
+            for start in range(low, high + 1, batch_size):
+                cursor.execute(f'''
+                    UPDATE {table}
+                    SET event_ts = {event_sql}, load_ts = {load_sql}, empty_ts = {empty_sql}
+                    WHERE id >= %s AND id < %s AND event_ts IS NULL
+                ''', (start, start + batch_size))
+                updated[table] += cursor.rowcount
+                conn.commit()
+        return updated
+    finally:
+        cursor.close()
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["backfill"]:
+        print("usage: python weighbridge_timestamps.py backfill")
+        sys.exit(2)
+    conn = get_db_connection()
+    try:
+        for table, count in backfill(conn).items():
+            print(f"{table}: {count} rows backfilled")
+    finally:
+        conn.close()